@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import exists, func, select
+
+from database import SessionLocal, engine
+import models
+from pdf_actas import PDF_READY
+
+# Archivo frio: mueve a las tablas archived_* (misma base, mismas columnas e ids) las entregas
+# viejas y los ciclos de lavanderia cerrados, para que las tablas calientes solo tengan lo
+# abierto y lo reciente. Los reportes leen ambas cuando el rango de fechas llega al archivo.
+#   python archive.py --days 365
+# Un ciclo cerrado es un conjunto de envios devueltos por completo y de devoluciones asignadas
+# enteras a esos mismos envios (ver laundry_allocation): al moverlos juntos los saldos no
+# cambian y la asignacion FIFO de lo que queda en caliente es la misma.
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ROPERIA_ARCHIVE_AFTER_DAYS", "365"))
+BATCH_SIZE = 500  # trabajadores (lavanderia) o entregas por transaccion
+CHUNK_SIZE = 1000
+
+def reaches(db, model, start):
+    """True si un rango que empieza en `start` (None = sin limite) puede incluir filas de `model` (tabla archived_*)."""
+    newest = db.query(func.max(model.date)).scalar()
+    return newest is not None and (start is None or start <= newest)
+
+def _newest_id(db, model):
+    return db.query(func.max(model.id)).scalar() or 0
+
+def _move(db, hot, cold, column, ids):
+    """Copia a `cold` las filas de `hot` con `column` en `ids` y las borra de `hot`."""
+    names = [c.name for c in hot.__table__.columns]
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        db.execute(cold.__table__.insert().from_select(names, select(*hot.__table__.columns).where(column.in_(chunk))))
+        db.execute(hot.__table__.delete().where(column.in_(chunk)))
+
+# SQLite asigna max(id) + 1 a las filas nuevas: si se archivara la fila mas nueva de una tabla,
+# el id se reutilizaria y chocaria con el archivo. Por eso la ultima fila de cada tabla no se mueve.
+
+def archive_deliveries(db, before):
+    newest, newest_item = _newest_id(db, models.Delivery), _newest_id(db, models.DeliveryItem)
+    candidates = (
+        db.query(models.Delivery.id)
+        .filter(models.Delivery.date < before, models.Delivery.pdf_status == PDF_READY, models.Delivery.id < newest)
+        .filter(~exists().where(models.DeliveryItem.delivery_id == models.Delivery.id, models.DeliveryItem.id >= newest_item))
+        .order_by(models.Delivery.id)
+    )
+    moved = 0
+    while True:
+        ids = [i for (i,) in candidates.limit(BATCH_SIZE)]
+        if not ids:
+            return moved
+        _move(db, models.DeliveryItem, models.ArchivedDeliveryItem, models.DeliveryItem.delivery_id, ids)
+        _move(db, models.Delivery, models.ArchivedDelivery, models.Delivery.id, ids)
+        db.commit()
+        moved += len(ids)
+
+def closed_cycles(db, dnis, before):
+    """(envios, devoluciones) de `dnis` anteriores a `before` que forman ciclos cerrados."""
+    newest = {m: _newest_id(db, m) for m in (models.Laundry, models.LaundryItem, models.LaundryReturn,
+                                             models.LaundryReturnItem, models.LaundryAllocation)}
+    sends = {i for (i,) in db.query(models.Laundry.id).filter(
+        models.Laundry.dni.in_(dnis), models.Laundry.date < before, models.Laundry.id < newest[models.Laundry],
+        ~exists().where(models.LaundryItem.laundry_id == models.Laundry.id,
+                        (models.LaundryItem.returned < models.LaundryItem.qty) | (models.LaundryItem.id >= newest[models.LaundryItem])))}
+    returns = {i for (i,) in db.query(models.LaundryReturn.id).filter(
+        models.LaundryReturn.dni.in_(dnis), models.LaundryReturn.date < before, models.LaundryReturn.id < newest[models.LaundryReturn],
+        ~exists().where(models.LaundryReturnItem.return_id == models.LaundryReturn.id,
+                        models.LaundryReturnItem.id >= newest[models.LaundryReturnItem]))}
+
+    links = []
+    allocated = {}
+    allocations = (
+        db.query(models.LaundryAllocation.id, models.LaundryAllocation.return_item_id, models.LaundryAllocation.return_id,
+                 models.LaundryAllocation.laundry_id, models.LaundryAllocation.qty)
+        .join(models.LaundryReturn, models.LaundryReturn.id == models.LaundryAllocation.return_id)
+        .filter(models.LaundryReturn.dni.in_(dnis))
+    )
+    for alloc_id, return_item_id, return_id, laundry_id, qty in allocations:
+        allocated[return_item_id] = allocated.get(return_item_id, 0) + qty
+        links.append((return_id, laundry_id))
+        if alloc_id >= newest[models.LaundryAllocation]:
+            returns.discard(return_id)
+    # Devoluciones con prendas de mas (sin envio al que asignarlas) quedan en caliente
+    for item_id, return_id, qty in db.query(models.LaundryReturnItem.id, models.LaundryReturnItem.return_id, models.LaundryReturnItem.qty).filter(
+            models.LaundryReturnItem.dni.in_(dnis)):
+        if qty > allocated.get(item_id, 0):
+            returns.discard(return_id)
+
+    # Cada asignacion une un envio y una devolucion: se archivan los dos o ninguno
+    changed = True
+    while changed:
+        changed = False
+        for return_id, laundry_id in links:
+            if (return_id in returns) != (laundry_id in sends):
+                returns.discard(return_id)
+                sends.discard(laundry_id)
+                changed = True
+    return sorted(sends), sorted(returns)
+
+def archive_laundry(db, before):
+    dnis = [d for (d,) in db.query(models.Laundry.dni).filter(models.Laundry.date < before).distinct().order_by(models.Laundry.dni)]
+    sends_moved = returns_moved = 0
+    for start in range(0, len(dnis), BATCH_SIZE):
+        sends, returns = closed_cycles(db, dnis[start:start + BATCH_SIZE], before)
+        _move(db, models.LaundryAllocation, models.ArchivedLaundryAllocation, models.LaundryAllocation.return_id, returns)
+        _move(db, models.LaundryReturnItem, models.ArchivedLaundryReturnItem, models.LaundryReturnItem.return_id, returns)
+        _move(db, models.LaundryReturn, models.ArchivedLaundryReturn, models.LaundryReturn.id, returns)
+        _move(db, models.LaundryItem, models.ArchivedLaundryItem, models.LaundryItem.laundry_id, sends)
+        _move(db, models.Laundry, models.ArchivedLaundry, models.Laundry.id, sends)
+        db.commit()
+        sends_moved += len(sends)
+        returns_moved += len(returns)
+    return sends_moved, returns_moved
+
+def archive(db, before=None):
+    """Mueve al archivo lo anterior a `before` (por defecto ARCHIVE_AFTER_DAYS atras). Devuelve los conteos."""
+    before = before or datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    deliveries = archive_deliveries(db, before)
+    sends, returns = archive_laundry(db, before)
+    return {"before": before.isoformat(), "deliveries": deliveries, "laundry": sends, "laundry_returns": returns}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mueve entregas viejas y ciclos de lavanderia cerrados a las tablas de archivo.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="antiguedad minima en dias")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(json.dumps(archive(db, datetime.now() - timedelta(days=args.days)), indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Prueba de carga de los endpoints de lectura: version async (main.app) contra una copia
+# congelada de los mismos endpoints en `def` sobre SessionLocal (legacy_app). Cada app corre
+# en su propio proceso uvicorn sobre la misma base sintetica.
+#   python bench_async.py --users 2000 --requests 2000 --concurrency 64
+
+# La base temporal se fija antes de importar main (database lee la URL al importarse)
+if __name__ == "__main__":
+    WORKDIR = tempfile.mkdtemp(prefix="roperia-bench-async-")
+    os.environ.update(ROPERIA_DATABASE_URL=f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}",
+                      ROPERIA_PDF_DIR=os.path.join(WORKDIR, "pdf"), ROPERIA_PDF_WORKERS="0")
+elif "ROPERIA_DATABASE_URL" not in os.environ:
+    raise RuntimeError("bench_async solo se importa desde los procesos uvicorn que lanza el benchmark")
+
+from fastapi import Depends, FastAPI, Response
+from sqlalchemy import distinct, func
+from sqlalchemy.orm import Session
+
+import models
+from main import delivery_report_page, get_db, laundry_report_page
+
+PATHS = ["/api/stats", "/api/laundry", "/api/laundry/report?limit=100", "/api/delivery/report?limit=100"]
+
+# --- VERSION SINCRONA (solo referencia) ---
+legacy_app = FastAPI()
+
+@legacy_app.get("/api/stats")
+def legacy_stats(db: Session = Depends(get_db)):
+    return {
+        "users_count": db.query(models.User).count(),
+        "deliveries_count": db.query(models.Delivery).count(),
+        "laundry_total_count": db.query(models.Laundry).count(),
+        "laundry_active_count": db.query(func.count(distinct(models.LaundryBalance.dni))).filter(models.LaundryBalance.sent > models.LaundryBalance.returned).scalar(),
+    }
+
+@legacy_app.get("/api/laundry")
+def legacy_laundry(db: Session = Depends(get_db)):
+    rows = (
+        db.query(models.LaundryBalance, models.User)
+        .join(models.User, models.User.dni == models.LaundryBalance.dni)
+        .filter(models.LaundryBalance.sent > models.LaundryBalance.returned)
+        .order_by(models.LaundryBalance.dni, models.LaundryBalance.id)
+        .all()
+    )
+    user_data = {}
+    for balance, user in rows:
+        if balance.dni not in user_data:
+            user_data[balance.dni] = {"dni": balance.dni, "user_name": user.name, "user_surname": user.surname, "pending_items": []}
+        user_data[balance.dni]["pending_items"].append({"name": balance.item_name, "qty": balance.sent - balance.returned})
+    return list(user_data.values())
+
+@legacy_app.get("/api/laundry/report")
+def legacy_laundry_report(response: Response, limit: int = None, after: str = None, db: Session = Depends(get_db)):
+    rows, next_cursor = laundry_report_page(db, limit=limit, after=after)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@legacy_app.get("/api/delivery/report")
+def legacy_delivery_report(response: Response, limit: int = None, after: str = None, db: Session = Depends(get_db)):
+    rows, next_cursor = delivery_report_page(db, limit=limit, after=after)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+# --- DATOS Y CARGA ---
+def seed(n_users):
+    from database import SessionLocal
+    import laundry_allocation
+    import laundry_balance
+
+    db = SessionLocal()
+    start = datetime(2025, 1, 1)
+    db.execute(models.User.__table__.insert(), [
+        {"dni": f"{20000000 + i}", "name": f"Nombre{i}", "surname": f"Apellido{i}", "contract_type": "Regular Otro sindicato"} for i in range(n_users)
+    ])
+    for i in range(n_users):
+        dni = f"{20000000 + i}"
+        day = start + timedelta(days=i % 365, minutes=i)
+        db.add(models.Delivery(dni=dni, date=day, items_json='[{"name": "Toallas", "qty": 2}]', pdf_path="", pdf_status="ready",
+                               items=[models.DeliveryItem(dni=dni, name="Toallas", qty=2, date=day)]))
+        db.add(models.Laundry(dni=dni, date=day, items_json='[{"name": "Polo", "qty": 2}]',
+                              items=[models.LaundryItem(dni=dni, name="Polo", qty=2, date=day)]))
+        if i % 2:
+            db.add(models.LaundryReturn(dni=dni, date=day + timedelta(days=2), items_json='[{"name": "Polo", "qty": 1}]',
+                                        items=[models.LaundryReturnItem(dni=dni, name="Polo", qty=1, date=day + timedelta(days=2))]))
+    db.commit()
+    laundry_allocation.backfill_allocations(db)
+    laundry_balance.rebuild_balances(db)
+    db.close()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(app_path, env):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", app_path, "--port", str(port), "--log-level", "warning"],
+                            env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{app_path} no arranco")
+
+async def load(base_url, paths, n_requests, concurrency):
+    import httpx
+
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(n_requests):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            path = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=httpx.Limits(max_connections=concurrency)) as client:
+        for path in paths:  # calentamiento
+            await client.get(path)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+    return {"requests": len(latencies), "errors": errors, "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(pct(0.50), 1), "p99_ms": round(pct(0.99), 1)}
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Compara latencia p99 bajo concurrencia: endpoints async contra sync.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--path", action="append", help="endpoint a medir (repetible); por defecto todos los de lectura")
+    args = parser.parse_args()
+
+    seed(args.users)
+    env = dict(os.environ)
+
+    results = {}
+    for label, app_path in (("sync", "bench_async:legacy_app"), ("async", "main:app")):
+        proc, base_url = start_server(app_path, env)
+        try:
+            results[label] = asyncio.run(load(base_url, args.path or PATHS, args.requests, args.concurrency))
+        finally:
+            proc.terminate()
+            proc.wait()
+    print(json.dumps(results, indent=2))
+    print(f"p99: sync {results['sync']['p99_ms']} ms -> async {results['async']['p99_ms']} ms")
+
+if __name__ == "__main__":
+    main_cli()
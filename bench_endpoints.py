@@ -0,0 +1,151 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Benchmark de todos los endpoints en proceso (TestClient, sin red). Guarda throughput y
+# percentiles de latencia por endpoint en un JSON que sirve de linea base:
+#   python bench_endpoints.py --output bench_baseline.json
+#   python bench_endpoints.py --compare bench_baseline.json     # falla si el p99 empeora
+# Sin ROPERIA_DATABASE_URL usa una base temporal llena con synthetic_data. Los endpoints de
+# escritura agregan filas: para medir sobre una base grande, usar una copia.
+
+if __name__ == "__main__" and "ROPERIA_DATABASE_URL" not in os.environ:
+    WORKDIR = tempfile.mkdtemp(prefix="roperia-bench-")
+    os.environ.update(ROPERIA_DATABASE_URL=f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}",
+                      ROPERIA_PDF_DIR=os.path.join(WORKDIR, "pdf"), ROPERIA_PDF_WORKERS="0")
+
+from fastapi.testclient import TestClient
+
+from database import SessionLocal
+import main
+import models
+import synthetic_data
+
+def _sample_dnis(db, contract_type=None, size=200):
+    query = db.query(models.User.dni)
+    if contract_type:
+        query = query.filter(models.User.contract_type == contract_type)
+    return [dni for (dni,) in query.order_by(models.User.id).limit(size * 10)][::10] or [None]
+
+def scenarios(db, rng):
+    """(nombre, funcion(client, i) -> response). Cada llamada usa datos distintos si escribe."""
+    dnis = _sample_dnis(db)
+    laundry_dnis = _sample_dnis(db, "Regular Otro sindicato")
+    delivery_ids = [i for (i,) in db.query(models.Delivery.id).order_by(models.Delivery.id.desc()).limit(2000)]
+    year = (db.query(models.Laundry.date).order_by(models.Laundry.id.desc()).limit(1).scalar() or datetime.now()).year
+    run = f"{int(time.time()) % 100000:05d}"  # DNIs nuevos que no choquen entre corridas
+
+    def new_user(i):
+        return {"dni": f"9{run}{i:04d}", "name": "Bench", "surname": "Usuario", "contract_type": "Temporal"}
+
+    def import_csv(i):
+        rows = "\n".join(f"8{run}{i:03d}{j:02d},Bench,Import,Regular PYA" for j in range(50))
+        return {"file": ("bench.csv", io.BytesIO(f"dni,name,surname,contract_type\n{rows}\n".encode()), "text/csv")}
+
+    # Entregas con un item fuera del catalogo de cupos: repetirlas no da 409
+    return [
+        ("GET /api/users/{dni}/entitlements", lambda c, i: c.get(f"/api/users/{rng.choice(dnis)}/entitlements")),
+        ("GET /api/users/{dni}", lambda c, i: c.get(f"/api/users/{rng.choice(dnis)}")),
+        ("GET /api/users/search", lambda c, i: c.get("/api/users/search", params={"q": rng.choice(dnis)[2:6]})),
+        ("POST /api/users", lambda c, i: c.post("/api/users", json=new_user(i))),
+        ("POST /api/users/import (50 filas)", lambda c, i: c.post("/api/users/import", files=import_csv(i))),
+        ("POST /api/deliveries", lambda c, i: c.post("/api/deliveries", json={"dni": rng.choice(dnis), "items": [{"name": "Guantes", "qty": 1}],
+                                                                            "date": datetime.now().isoformat()})),
+        ("POST /api/deliveries/batch (10, zip)", lambda c, i: c.post("/api/deliveries/batch", json={"deliveries": [{"dni": d, "items": [{"name": "Guantes", "qty": 1}]} for d in rng.sample(dnis, min(10, len(dnis)))]})),
+        ("GET /api/deliveries/{id}/pdf (frio)", lambda c, i: c.get(f"/api/deliveries/{delivery_ids[i % len(delivery_ids)]}/pdf")),
+        ("GET /api/deliveries/{id}/pdf (cache)", lambda c, i: c.get(f"/api/deliveries/{delivery_ids[0]}/pdf")),
+        ("GET /api/pdf/status", lambda c, i: c.get("/api/pdf/status")),
+        ("POST /api/laundry", lambda c, i: c.post("/api/laundry", json={"dni": rng.choice(laundry_dnis), "items": [{"name": "Polo", "qty": 2}]})),
+        ("POST /api/laundry/return", lambda c, i: c.post("/api/laundry/return", json={"dni": rng.choice(laundry_dnis), "items": [{"name": "Polo", "qty": 1}]})),
+        ("GET /api/stats", lambda c, i: c.get("/api/stats")),
+        ("GET /api/changes?limit=100", lambda c, i: c.get("/api/changes", params={"since": max(0, c.get("/api/changes").json()["cursor"] - 100), "limit": 100})),
+        ("GET /api/analytics (anio)", lambda c, i: c.get("/api/analytics", params={"date_from": f"{year}-01-01", "date_to": f"{year}-12-31"})),
+        ("GET /api/laundry", lambda c, i: c.get("/api/laundry")),
+        ("GET /api/laundry/turnaround", lambda c, i: c.get("/api/laundry/turnaround")),
+        ("GET /api/laundry/{dni}/status", lambda c, i: c.get(f"/api/laundry/{rng.choice(laundry_dnis)}/status")),
+        ("GET /api/laundry/report?limit=100", lambda c, i: c.get("/api/laundry/report", params={"limit": 100})),
+        ("GET /api/laundry/report (mes)", lambda c, i: c.get("/api/laundry/report", params={"year": year, "month": i % 12 + 1})),
+        ("GET /api/laundry/report csv (mes)", lambda c, i: c.get("/api/laundry/report", params={"year": year, "month": i % 12 + 1, "format": "csv"})),
+        ("GET /api/delivery/report?limit=100", lambda c, i: c.get("/api/delivery/report", params={"limit": 100})),
+        ("GET /api/delivery/report csv (anio)", lambda c, i: c.get("/api/delivery/report", params={"year": year, "format": "csv"})),
+    ]
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+def measure(client, request, iterations):
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        response = request(client, i)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - start
+    return {"requests": iterations, "errors": errors, "rps": round(iterations / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 2), "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2)}
+
+def compare(results, baseline, tolerance):
+    """Lista de endpoints cuyo p99 empeoro mas que `tolerance` (fraccion) respecto a la base."""
+    regressions = []
+    for name, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(name)
+        if not previous:
+            continue
+        change = (current["p99_ms"] - previous["p99_ms"]) / max(previous["p99_ms"], 0.01)
+        print(f"{name:42s} p99 {previous['p99_ms']:9.2f} -> {current['p99_ms']:9.2f} ms ({change:+.0%})")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Mide throughput y latencia de cada endpoint en proceso.")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000, help="trabajadores a generar si la base esta vacia")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", action="append", help="mide solo los endpoints que contienen este texto (repetible)")
+    parser.add_argument("--output", help="guarda los resultados como JSON (linea base)")
+    parser.add_argument("--compare", help="JSON de una corrida anterior: falla si algun p99 empeora")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if db.query(models.User.id).first() is None:
+            print(f"Base vacia: generando {args.users} trabajadores sinteticos...")
+            synthetic_data.generate(db, users=args.users, seed=args.seed)
+        volumes = {m.__tablename__: db.query(m).count() for m in (models.User, models.Delivery, models.Laundry, models.LaundryReturn)}
+        cases = scenarios(db, random.Random(args.seed))
+
+    results = {"created": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+               "iterations": args.iterations, "volumes": volumes, "endpoints": {}}
+    with TestClient(main.app) as client:
+        for name, request in cases:
+            if args.only and not any(text in name for text in args.only):
+                continue
+            request(client, args.iterations)  # calentamiento (indice fuera de la corrida medida)
+            results["endpoints"][name] = stats = measure(client, request, args.iterations)
+            print(f"{name:42s} {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms"
+                  + (f"  ({stats['errors']} errores)" if stats["errors"] else ""))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regresiones de p99 > {args.tolerance:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,140 @@
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+import pdf_actas
+
+# Benchmark del render de actas: implementacion anterior (logo y estilos rehechos en cada
+# llamada, streams ASCII85) contra la plantilla precompilada de pdf_actas.
+#   python bench_pdf.py --count 200 [--logo frontend/logo.png]
+
+def legacy_generate_pdf(filepath, logo_path, delivery_id, user, items, delivery_date):
+    """Copia congelada de generate_pdf antes de la plantilla precompilada (solo referencia)."""
+    c = canvas.Canvas(filepath, pagesize=letter)
+    width, height = letter
+
+    if os.path.exists(logo_path):
+        try:
+            logo = ImageReader(logo_path)
+            iw, ih = logo.getSize()
+            aspect = ih / float(iw)
+            draw_width = 120
+            draw_height = draw_width * aspect
+            c.drawImage(logo, 40, height - 50 - draw_height, width=draw_width, height=draw_height, mask='auto', preserveAspectRatio=True)
+        except Exception as e:
+            c.drawString(40, height - 100, "SODEXO")
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width / 2, height - 120, "ACTA DE ENTREGA DE UNIFORMES Y EPP")
+
+    c.setFont("Helvetica", 10)
+    c.drawRightString(width - 50, height - 60, f"Acta N°: {delivery_id:06d}")
+    c.drawRightString(width - 50, height - 75, f"Fecha: {delivery_date.strftime('%Y-%m-%d')}")
+
+    y_info = height - 180
+    c.setLineWidth(1)
+    c.setStrokeColor(colors.lightgrey)
+    c.rect(50, y_info - 60, width - 100, 70, fill=0)
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(60, y_info - 20, "DATOS DEL TRABAJADOR:")
+
+    c.setFont("Helvetica", 10)
+    c.drawString(60, y_info - 40, f"Nombre Completo: {user.name} {user.surname}")
+    c.drawString(300, y_info - 40, f"DNI: {user.dni}")
+    c.drawString(60, y_info - 55, f"Contratación: {user.contract_type}    Talla: {user.size if hasattr(user, 'size') else '-'}")
+
+    y_table = y_info - 100
+    data = [["Item / Descripción", "Cantidad"]]
+    for item in items:
+        data.append([item['name'], str(item['qty'])])
+
+    table = Table(data, colWidths=[350, 100])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.navy),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    w, h = table.wrap(width, height)
+    table.drawOn(c, 80, y_table - h)
+
+    y_sig = 150
+    c.setFont("Helvetica", 9)
+    c.drawString(50, y_sig + 60, "Declaro haber recibido a mi entera satisfacción los bienes arriba descritos.")
+    c.line(100, y_sig, 250, y_sig)
+    c.drawCentredString(175, y_sig - 15, "ENTREGADO POR")
+    c.drawCentredString(175, y_sig - 30, "LOGÍSTICA / ROPERÍA")
+
+    c.line(350, y_sig, 500, y_sig)
+    c.drawCentredString(425, y_sig - 15, "RECIBIDO POR")
+    c.drawCentredString(425, y_sig - 30, f"{user.name} {user.surname}")
+    c.drawCentredString(425, y_sig - 45, f"DNI: {user.dni}")
+
+    c.save()
+    return filepath
+
+def sample_logo(directory):
+    path = os.path.join(directory, "logo.png")
+    image = Image.new("RGBA", (800, 300), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+    for i in range(0, 800, 8):
+        draw.line([(i, 0), (800 - i, 300)], fill=(20, 40, 160, 255), width=3)
+    image.save(path)
+    return path
+
+def measure(render, count):
+    start = time.perf_counter()
+    for i in range(count):
+        render(i)
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide actas por segundo antes y despues de la plantilla precompilada.")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--logo", default=pdf_actas.LOGO_PATH)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="roperia-bench-pdf-")
+    logo_path = args.logo if os.path.exists(args.logo) else sample_logo(workdir)
+    pdf_actas.LOGO_PATH = logo_path
+    pdf_actas.PDF_DIR = workdir
+
+    user = SimpleNamespace(dni="46544993", name="Andres", surname="Bedoya", contract_type="Temporal")
+    items = [
+        {"name": "Juego de Uniforme (Chaqueta, Pantalon, Polo, Polera)", "qty": 3},
+        {"name": "Par de zapatos", "qty": 1},
+        {"name": "Candado", "qty": 1},
+        {"name": "Casillero", "qty": 1},
+        {"name": "Jabones Bolivar", "qty": 2},
+    ]
+    delivery_date = datetime(2026, 3, 1)
+
+    rl_config.useA85 = 1
+    before = measure(lambda i: legacy_generate_pdf(os.path.join(workdir, f"legacy_{i}.pdf"), logo_path, i, user, items, delivery_date), args.count)
+    rl_config.useA85 = 0
+    after = measure(lambda i: pdf_actas.generate_pdf(i, user, items, delivery_date), args.count)
+
+    print(f"logo: {logo_path}")
+    print(f"antes:   {before:8.1f} actas/s")
+    print(f"despues: {after:8.1f} actas/s  (x{after / before:.1f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+
+# Benchmark de la asignacion FIFO para tiempos de vuelta: bucle por prenda (referencia) contra
+# la version vectorizada de laundry_turnaround, sobre el mismo historial cargado en memoria.
+#   python bench_turnaround.py --users 5000
+# Sin ROPERIA_DATABASE_URL usa una base temporal llena con synthetic_data.
+
+if __name__ == "__main__" and "ROPERIA_DATABASE_URL" not in os.environ:
+    WORKDIR = tempfile.mkdtemp(prefix="roperia-bench-turnaround-")
+    os.environ["ROPERIA_DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'bench.db')}"
+
+from database import SessionLocal, engine
+import laundry_turnaround
+import models
+import synthetic_data
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la asignacion FIFO en bucle y vectorizada.")
+    parser.add_argument("--users", type=int, default=5000, help="trabajadores a generar si la base esta vacia")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        if db.query(models.User.id).first() is None:
+            print(f"Base vacia: generando {args.users} trabajadores sinteticos...")
+            synthetic_data.generate(db, users=args.users, seed=args.seed)
+        (sends, returns), load_seconds = timed(laundry_turnaround.load_history, db)
+
+    loop, loop_seconds = timed(laundry_turnaround.match_loop, sends, returns)
+    vectorized, vectorized_seconds = timed(laundry_turnaround.match, sends, returns)
+    key = ["send_id", "return_id"]
+    assert loop.groupby(key)["qty"].sum().equals(vectorized.groupby(key)["qty"].sum()), "las asignaciones no coinciden"
+    turnaround, stats_seconds = timed(laundry_turnaround.Turnaround, sends, vectorized)
+    _, percentile_seconds = timed(turnaround.percentiles, "name")
+
+    print(f"historial: {len(sends)} envios, {len(returns)} devoluciones ({load_seconds:.2f}s de carga)")
+    print(f"bucle:       {loop_seconds * 1000:9.1f} ms")
+    print(f"vectorizado: {vectorized_seconds * 1000:9.1f} ms  (x{loop_seconds / vectorized_seconds:.1f})")
+    print(f"pendientes + percentiles: {(stats_seconds + percentile_seconds) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
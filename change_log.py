@@ -0,0 +1,89 @@
+import argparse
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from database import SessionLocal, engine
+import models
+
+# Registro de cambios para sincronizacion por deltas: cada endpoint de escritura agrega sus
+# eventos en la misma transaccion, asi que el id del evento es un cursor monotono. Un cliente
+# (frontend, kiosko sin red) guarda el ultimo id visto y pide /api/changes?since=<id> en vez
+# de volver a descargar la lista de pendientes y los reportes. Para podar eventos viejos:
+#   python change_log.py --prune-days 90
+
+USER = "user"
+DELIVERY = "delivery"
+LAUNDRY = "laundry"
+LAUNDRY_RETURN = "laundry_return"
+BALANCE_KINDS = (LAUNDRY, LAUNDRY_RETURN)  # eventos que cambian los saldos de lavanderia
+
+MAX_EVENTS = 1000
+
+class CursorExpired(Exception):
+    """El cursor es anterior a los eventos podados: el cliente debe volver a descargar todo."""
+
+def event(kind, dni, entity_id=None, payload=None):
+    return {"kind": kind, "dni": dni, "entity_id": entity_id, "date": datetime.now(), "payload": json.dumps(payload or {}, default=str)}
+
+def record(db, *events):
+    if events:
+        db.execute(models.ChangeLog.__table__.insert(), list(events))
+
+def changes_query(since, limit):
+    return select(models.ChangeLog).where(models.ChangeLog.id > since).order_by(models.ChangeLog.id).limit(limit + 1)
+
+def balances_query(dnis):
+    return (select(models.LaundryBalance.dni, models.LaundryBalance.item_name, models.LaundryBalance.sent, models.LaundryBalance.returned)
+            .where(models.LaundryBalance.dni.in_(dnis)).order_by(models.LaundryBalance.dni, models.LaundryBalance.id))
+
+def latest_query():
+    return select(func.max(models.ChangeLog.id))
+
+def check_cursor(since, events):
+    # Los ids no tienen huecos (AUTOINCREMENT y un solo escritor a la vez: un rollback no deja
+    # id usado). Si el primer evento posterior no es since + 1, lo que falta fue podado.
+    if events and events[0].id != since + 1:
+        raise CursorExpired()
+
+def shape(since, events, limit, balance_rows):
+    """Respuesta de /api/changes: eventos en orden, cursor para la proxima llamada y el saldo
+    actual de los trabajadores con eventos de lavanderia (una prenda sin pendiente vale 0)."""
+    has_more = len(events) > limit
+    events = events[:limit]
+    balances = {}
+    for dni, item_name, sent, returned in balance_rows:
+        balances.setdefault(dni, []).append({"name": item_name, "sent": sent, "returned": returned, "pending": sent - returned})
+    return {
+        "cursor": events[-1].id if events else since,
+        "has_more": has_more,
+        "events": [{"id": e.id, "kind": e.kind, "dni": e.dni, "entity_id": e.entity_id, "date": e.date.isoformat(), "data": json.loads(e.payload or "{}")}
+                   for e in events],
+        "balances": balances,
+    }
+
+def prune(db, before):
+    """Borra los eventos anteriores a `before`. El ultimo se deja siempre: asi un cursor al dia
+    nunca ve un hueco y solo los cursores anteriores a lo podado reciben CursorExpired."""
+    newest = db.query(func.max(models.ChangeLog.id)).scalar()
+    if newest is None:
+        return 0
+    deleted = db.query(models.ChangeLog).filter(models.ChangeLog.date < before, models.ChangeLog.id < newest).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def main():
+    parser = argparse.ArgumentParser(description="Poda el registro de cambios de /api/changes.")
+    parser.add_argument("--prune-days", type=int, required=True, help="borra los eventos con mas de estos dias")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(f"Eventos borrados: {prune(db, datetime.now() - timedelta(days=args.prune_days))}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from datetime import datetime
+import json
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Los tests usan una base SQLite temporal, nunca roperia.db
+_TEST_DIR = tempfile.mkdtemp(prefix="roperia-test-")
+os.environ["ROPERIA_DATABASE_URL"] = f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}"
+os.environ["ROPERIA_PDF_DIR"] = os.path.join(_TEST_DIR, "pdf")
+os.environ["ROPERIA_PDF_WORKERS"] = "0"
+
+from fastapi.testclient import TestClient
+
+from database import SessionLocal, engine
+import main
+import migrations
+import models
+
+@pytest.fixture
+def client():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        migrations.run_migrations(db)
+    shutil.rmtree(os.environ["ROPERIA_PDF_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["ROPERIA_PDF_DIR"])
+    return TestClient(main.app)
+
+def seed(client, n_users, start=0):
+    db = SessionLocal()
+    for i in range(start, start + n_users):
+        dni = f"{10000000 + i}"
+        db.add(models.User(dni=dni, name=f"Nombre{i}", surname=f"Apellido{i}", contract_type="Regular Otro sindicato"))
+        items = [{"name": "Toallas", "qty": 2}]
+        delivered = datetime(2025 + i // 12 % 2, i % 12 + 1, 15)
+        db.add(models.Delivery(dni=dni, date=delivered, items_json=json.dumps(items), pdf_path="",
+                               items=[models.DeliveryItem(dni=dni, name="Toallas", qty=2, date=delivered)]))
+    db.commit()
+    db.close()
+    for i in range(start, start + n_users):
+        dni = f"{10000000 + i}"
+        client.post("/api/laundry", json={"dni": dni, "items": [{"name": "Polo", "qty": 2}, {"name": "Pantalon", "qty": 1}]})
+        client.post("/api/laundry/return", json={"dni": dni, "items": [{"name": "Polo", "qty": 1}]})
@@ -0,0 +1,29 @@
+# Items que corresponden a cada tipo de contrato (entrega de uniformes y EPP)
+
+UNIFORM_SET = "Juego de Uniforme (Chaqueta, Pantalon, Polo, Polera)"
+
+CONTRACT_ITEMS = {
+    "Regular Otro sindicato": [
+        {"name": UNIFORM_SET, "qty": 2},
+        {"name": "Jabones de tocador", "qty": 24},
+        {"name": "Toallas", "qty": 2}
+    ],
+    "Regular PYA": [
+        {"name": UNIFORM_SET, "qty": 3},
+        {"name": "Jabones Bolivar", "qty": 24},
+        {"name": "Jabones de tocador", "qty": 22},
+        {"name": "Toallas", "qty": 2}
+    ],
+    "Temporal": [
+        {"name": UNIFORM_SET, "qty": 3},
+        {"name": "Par de zapatos", "qty": 1},
+        {"name": "Candado", "qty": 1},
+        {"name": "Casillero", "qty": 1},
+        {"name": "Jabones Bolivar", "qty": 2}
+    ],
+}
+
+CONTRACT_TYPES = tuple(CONTRACT_ITEMS)
+
+def determine_items(contract_type: str):
+    return [dict(item) for item in CONTRACT_ITEMS.get(contract_type, [])]
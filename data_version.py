@@ -0,0 +1,26 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+import models
+
+# Contador de version de los datos. Cada endpoint de escritura lo incrementa en su misma
+# transaccion, asi que todos los workers ven el cambio al mismo tiempo que los datos y las
+# caches (p.ej. /api/stats) se pueden indexar por version sin invalidacion explicita.
+
+STATS = "stats"
+USERS = "users"  # nombres y contratos que aparecen en los reportes
+
+def bump(db, *names):
+    table = models.DataVersion.__table__
+    for name in names or (STATS,):
+        stmt = insert(table).values(name=name, version=1)
+        db.execute(stmt.on_conflict_do_update(index_elements=[table.c.name], set_={"version": table.c.version + 1}))
+
+def version_query(name=STATS):
+    return select(models.DataVersion.version).where(models.DataVersion.name == name).scalar_subquery()
+
+def current(db, name=STATS):
+    return db.query(models.DataVersion.version).filter(models.DataVersion.name == name).scalar() or 0
+
+async def current_async(db, name=STATS):
+    return await db.scalar(select(models.DataVersion.version).where(models.DataVersion.name == name)) or 0
@@ -1,12 +1,187 @@
-from sqlalchemy import create_engine
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./roperia.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("ROPERIA_DATABASE_URL", "sqlite:///./roperia.db")
+
+# --- SQLITE CON VARIOS WORKERS ---
+# Con gunicorn cada worker tiene su propio pool contra el mismo archivo. WAL deja leer
+# mientras otro proceso escribe, busy_timeout hace esperar en vez de fallar con
+# "database is locked" y las escrituras usan BEGIN IMMEDIATE (toman el lock al empezar,
+# asi la espera la resuelve SQLite) con reintentos acotados por si el lock no se libera.
+SQLITE_WAL = os.environ.get("ROPERIA_SQLITE_WAL", "1") != "0"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("ROPERIA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+DB_POOL_SIZE = int(os.environ.get("ROPERIA_DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.environ.get("ROPERIA_DB_MAX_OVERFLOW", "8"))
+WRITE_RETRIES = int(os.environ.get("ROPERIA_DB_WRITE_RETRIES", "5"))
+# Cola de group commit: junta escrituras pequeñas de varios hilos en una sola transaccion
+GROUP_COMMIT = os.environ.get("ROPERIA_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX = int(os.environ.get("ROPERIA_GROUP_COMMIT_MAX", "64"))
+GROUP_COMMIT_WAIT_MS = int(os.environ.get("ROPERIA_GROUP_COMMIT_WAIT_MS", "5"))
+
+_sqlite_file = SQLALCHEMY_DATABASE_URL.startswith("sqlite") and ":memory:" not in SQLALCHEMY_DATABASE_URL
+
+def _sqlite_pragmas(dbapi_conn):
+    cursor = dbapi_conn.cursor()
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+def _create_engine(immediate=False):
+    if not _sqlite_file:
+        return create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {})
+    new_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+    )
+
+    @event.listens_for(new_engine, "connect")
+    def _on_connect(dbapi_conn, record):
+        if immediate:
+            dbapi_conn.isolation_level = None  # SQLAlchemy emite el BEGIN (ver _on_begin)
+        _sqlite_pragmas(dbapi_conn)
+
+    if immediate:
+        @event.listens_for(new_engine, "begin")
+        def _on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+    return new_engine
+
+engine = _create_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sesiones de escritura: los objetos siguen legibles despues del commit para la respuesta
+write_engine = _create_engine(immediate=True) if _sqlite_file else engine
+WriteSession = sessionmaker(autocommit=False, autoflush=False, bind=write_engine, expire_on_commit=False)
+
+# --- SESIONES ASYNC ---
+# Endpoints de lectura en `async def`: aiosqlite hace la E/S en su propio hilo y el event loop
+# queda libre, en vez de ocupar un hilo del threadpool de FastAPI por peticion.
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+if _sqlite_file:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+                                       pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_async_connect(dbapi_conn, record):
+        _sqlite_pragmas(dbapi_conn)
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and "locked" in str(error.orig).lower()
+
+def _backoff(attempt):
+    time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.0))
+
+def _write_with_retry(work):
+    for attempt in range(1, WRITE_RETRIES + 1):
+        db = WriteSession()
+        try:
+            result = work(db)
+            db.commit()
+            return result
+        except OperationalError as e:
+            db.rollback()
+            if not is_locked(e) or attempt == WRITE_RETRIES:
+                raise
+        finally:
+            db.close()
+        _backoff(attempt)
+
+class GroupCommitQueue:
+    """Un hilo escritor que ejecuta los trabajos encolados en una misma transaccion.
+
+    Cada trabajo corre dentro de un SAVEPOINT: si falla (p.ej. HTTPException) solo se deshace
+    el suyo y el error vuelve a quien lo encolo; el resto se confirma con un unico commit.
+    """
+
+    def __init__(self, max_batch=GROUP_COMMIT_MAX, wait_ms=GROUP_COMMIT_WAIT_MS):
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, work):
+        future = Future()
+        self._queue.put((work, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="roperia-group-commit", daemon=True)
+                self._thread.start()
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        for attempt in range(1, WRITE_RETRIES + 1):
+            db = WriteSession()
+            outcomes = []
+            try:
+                for work, future in batch:
+                    try:
+                        with db.begin_nested():
+                            outcomes.append((future, work(db), None))
+                    except OperationalError as e:
+                        if is_locked(e):
+                            raise
+                        outcomes.append((future, None, e))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                if is_locked(e) and attempt < WRITE_RETRIES:
+                    _backoff(attempt)
+                    continue
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            finally:
+                db.close()
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            return
+
+group_commit = GroupCommitQueue() if GROUP_COMMIT else None
+
+def run_write(work):
+    """Ejecuta work(db) en una transaccion de escritura y devuelve su resultado.
+
+    Reintenta si SQLite sigue bloqueado tras busy_timeout; con ROPERIA_GROUP_COMMIT=1 el
+    trabajo se encola y comparte el commit con otras escrituras concurrentes.
+    """
+    if group_commit is not None:
+        return group_commit.submit(work)
+    return _write_with_retry(work)
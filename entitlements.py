@@ -0,0 +1,125 @@
+import argparse
+import json
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from contracts import CONTRACT_ITEMS
+from database import SessionLocal, engine
+import models
+
+# Cupos de entrega por tipo de contrato (tabla entitlement_catalog) y lo ya entregado a cada
+# trabajador por periodo (entitlement_ledger). El catalogo se carga una vez por proceso; el
+# ledger se actualiza en la misma transaccion que la entrega, asi que validar un pedido es
+# una busqueda por (dni, periodo) en el indice unico, sin recorrer el historial.
+
+class QuotaExceeded(Exception):
+    def __init__(self, dni, period, items):
+        super().__init__(f"Cupo excedido para {dni} en {period}")
+        self.dni = dni
+        self.period = period
+        self.items = items
+
+_catalog = None
+
+def period_for(value):
+    """Los cupos son anuales."""
+    return str(value.year)
+
+def seed_catalog(db):
+    """Llena el catalogo desde contracts.CONTRACT_ITEMS si esta vacio."""
+    if db.query(models.EntitlementCatalog.id).first() is not None:
+        return 0
+    rows = [{"contract_type": contract_type, "item_name": item["name"], "qty": item["qty"]}
+            for contract_type, items in CONTRACT_ITEMS.items() for item in items]
+    db.execute(models.EntitlementCatalog.__table__.insert(), rows)
+    db.commit()
+    reload_catalog()
+    return len(rows)
+
+def catalog(db):
+    """{tipo de contrato: {prenda: cantidad por periodo}}, en el orden del catalogo."""
+    global _catalog
+    if _catalog is None:
+        loaded = {}
+        for row in db.query(models.EntitlementCatalog).order_by(models.EntitlementCatalog.id):
+            loaded.setdefault(row.contract_type, {})[row.item_name] = row.qty
+        _catalog = loaded
+    return _catalog
+
+def reload_catalog():
+    global _catalog
+    _catalog = None
+
+def default_items(db, contract_type):
+    """Items de una entrega completa segun el contrato (reemplaza a determine_items)."""
+    return [{"name": name, "qty": qty} for name, qty in catalog(db).get(contract_type, {}).items()]
+
+def _issued(db, dni, period):
+    rows = db.query(models.EntitlementLedger.item_name, models.EntitlementLedger.issued).filter(
+        models.EntitlementLedger.dni == dni, models.EntitlementLedger.period == period)
+    return dict(rows.all())
+
+def remaining(db, user, period):
+    issued = _issued(db, user.dni, period)
+    return [{"name": name, "allowance": qty, "issued": issued.get(name, 0), "remaining": max(qty - issued.get(name, 0), 0)}
+            for name, qty in catalog(db).get(user.contract_type, {}).items()]
+
+def issue(db, user, items, delivery_date):
+    """Suma la entrega al ledger y la rechaza (QuotaExceeded) si pasa el cupo del periodo.
+
+    Primero se escribe y despues se verifica: el upsert toma el lock de escritura de SQLite,
+    asi que dos entregas simultaneas del mismo trabajador no pueden pasar las dos. Quien
+    captura QuotaExceeded debe hacer rollback.
+    """
+    period = period_for(delivery_date)
+    table = models.EntitlementLedger.__table__
+    for item in items:
+        stmt = insert(table).values(dni=user.dni, period=period, item_name=item['name'], issued=item['qty'])
+        db.execute(stmt.on_conflict_do_update(index_elements=[table.c.dni, table.c.period, table.c.item_name],
+                                              set_={"issued": table.c.issued + stmt.excluded.issued}))
+    allowance = catalog(db).get(user.contract_type, {})
+    requested = {item['name'] for item in items}
+    exceeded = [{"name": name, "allowance": allowance[name], "issued": issued}
+                for name, issued in _issued(db, user.dni, period).items() if name in requested and name in allowance and issued > allowance[name]]
+    if exceeded:
+        raise QuotaExceeded(user.dni, period, exceeded)
+
+def rebuild_ledger(db):
+    """Recalcula el ledger desde las filas de detalle de las entregas (incluidas las archivadas)."""
+    db.query(models.EntitlementLedger).delete(synchronize_session=False)
+    issued = {}
+    for model in (models.DeliveryItem, models.ArchivedDeliveryItem):
+        period = func.strftime('%Y', model.date)
+        for dni, year, name, qty in db.query(model.dni, period, model.name, func.sum(model.qty)).group_by(model.dni, period, model.name):
+            issued[dni, year, name] = issued.get((dni, year, name), 0) + qty
+    rows = [{"dni": dni, "period": year, "item_name": name, "issued": qty} for (dni, year, name), qty in issued.items()]
+    if rows:
+        db.execute(models.EntitlementLedger.__table__.insert(), rows)
+    db.commit()
+    return len(rows)
+
+def ensure_entitlements(db):
+    """Primer arranque: catalogo desde contracts.py y ledger desde el historial de entregas."""
+    seed_catalog(db)
+    if db.query(models.EntitlementLedger.id).first() is None and db.query(models.DeliveryItem.id).first() is not None:
+        rebuild_ledger(db)
+
+def main():
+    parser = argparse.ArgumentParser(description="Muestra el catalogo de cupos o reconstruye el ledger de entregas.")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruye el ledger desde el historial")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_catalog(db)
+        if args.rebuild:
+            print(f"Ledger reconstruido: {rebuild_ledger(db)} filas")
+        else:
+            print(json.dumps(catalog(db), ensure_ascii=False, indent=2))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import logging
+import os
+
+from database import AsyncSessionLocal
+import change_log
+
+# Push por Server-Sent Events (/api/events) de los cambios de lavanderia, entregas y usuarios
+# y de los contadores de /api/stats. No hay broker: el change_log de la base es el canal.
+# Cada worker de gunicorn tiene un Broadcaster que, mientras tenga suscriptores, lee los
+# eventos nuevos con una consulta por clave primaria cada ROPERIA_EVENTS_POLL_MS y los
+# reparte a sus conexiones. El costo es por worker, no por pestaña abierta.
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.environ.get("ROPERIA_EVENTS_POLL_MS", "500")) / 1000
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+QUEUE_SIZE = 100  # mensajes pendientes por conexion antes de cortarla (el cliente reconecta)
+
+def sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+async def read_changes(db, since):
+    """Mensaje de change_log.shape con los eventos posteriores a `since`."""
+    events = (await db.execute(change_log.changes_query(since, change_log.MAX_EVENTS))).scalars().all()
+    change_log.check_cursor(since, events)
+    dnis = {e.dni for e in events[:change_log.MAX_EVENTS] if e.kind in change_log.BALANCE_KINDS}
+    balance_rows = (await db.execute(change_log.balances_query(dnis))).all() if dnis else []
+    return change_log.shape(since, events, change_log.MAX_EVENTS, balance_rows)
+
+class Broadcaster:
+    def __init__(self, stats, poll_seconds=POLL_SECONDS):
+        self.stats = stats  # async (db) -> (version, stats)
+        self.poll_seconds = poll_seconds
+        self.cursor = None
+        self._subscribers = set()
+        self._task = None
+
+    async def subscribe(self):
+        # El cursor del broadcaster se fija antes de que la conexion lea su historial: todo
+        # evento posterior llega por la cola o por esa lectura, sin huecos entre ambas
+        if self.cursor is None:
+            async with AsyncSessionLocal() as db:
+                latest = await db.scalar(change_log.latest_query()) or 0
+            if self.cursor is None:
+                self.cursor = latest
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def _disconnect(self, queue):
+        """Corta una conexion: el navegador reconecta solo con Last-Event-ID y retoma desde ahi."""
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                while await self.poll():
+                    pass
+            except Exception:
+                logger.exception("Error leyendo el change_log para /api/events")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def poll(self):
+        """Lee y reparte los eventos nuevos. True si quedaron mas por leer."""
+        async with AsyncSessionLocal() as db:
+            if self.cursor is None:
+                self.cursor = await db.scalar(change_log.latest_query()) or 0
+            try:
+                changes = await read_changes(db, self.cursor)
+            except change_log.CursorExpired:
+                # Poda mientras el worker estaba atrasado: cada cliente reconecta y su cursor decide
+                self.cursor = None
+                for queue in list(self._subscribers):
+                    self._disconnect(queue)
+                return False
+            if not changes["events"]:
+                return False
+            _, stats = await self.stats(db)
+        self.cursor = changes["cursor"]
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait((changes, stats))
+            except asyncio.QueueFull:
+                self._disconnect(queue)  # conexion lenta
+        return changes["has_more"]
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+async def stream(broadcaster, since=None):
+    """Generador SSE de una conexion: reenvia lo posterior a `since` desde el change_log y
+    luego lo que reparte el broadcaster. Sin `since` empieza desde el ultimo evento."""
+    queue = await broadcaster.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        async with AsyncSessionLocal() as db:
+            if since is None:
+                since = await db.scalar(change_log.latest_query()) or 0
+                yield sse("ready", {"cursor": since}, since)
+            else:
+                while True:
+                    try:
+                        changes = await read_changes(db, since)
+                    except change_log.CursorExpired:
+                        yield sse("reset", {"detail": "Cursor expired, download the full data again"})
+                        return
+                    if not changes["events"]:
+                        break
+                    since = changes["cursor"]
+                    yield sse("changes", changes, since)
+                    if not changes["has_more"]:
+                        yield sse("stats", (await broadcaster.stats(db))[1])
+                        break
+
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            changes, stats = message
+            # Lo ya reenviado al conectar puede volver a llegar por el broadcaster
+            events = [e for e in changes["events"] if e["id"] > since]
+            if events:
+                since = changes["cursor"]
+                yield sse("changes", {**changes, "events": events}, since)
+                yield sse("stats", stats)
+    finally:
+        broadcaster.unsubscribe(queue)
@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+
+from database import AsyncSessionLocal, run_write
+import models
+
+# Claves de idempotencia: un kiosko que reintenta un POST con el mismo header Idempotency-Key
+# recibe la respuesta guardada de la primera vez, sin repetir la escritura ni el render del
+# acta. La clave se reserva en la base (tabla idempotency_keys) antes de ejecutar el endpoint,
+# asi un duplicado concurrente, en este u otro worker, espera esa respuesta en vez de competir.
+# Solo se guardan las respuestas 2xx: con un error la clave se libera y el reintento (quiza
+# corregido) vuelve a ejecutarse. Las respuestas sin Content-Length (ZIP/PDF del lote, que se
+# transmiten) o mas grandes que ROPERIA_IDEMPOTENCY_MAX_BYTES pasan sin guardarse en memoria:
+# la clave queda cerrada sin cuerpo y un reintento recibe 409 con los headers X-* originales
+# (p.ej. X-Delivery-Ids, para pedir las actas una por una) en vez de repetir el lote.
+# Los uploads multipart (/api/users/import) no pasan por aqui: no se leen enteros a memoria y
+# la importacion ya es idempotente (actualiza por DNI).
+# Las filas vencidas (ROPERIA_IDEMPOTENCY_TTL_HOURS) se borran al reservar una clave nueva.
+
+HEADER = "Idempotency-Key"
+METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+TTL = timedelta(hours=float(os.environ.get("ROPERIA_IDEMPOTENCY_TTL_HOURS", "24")))
+WAIT_SECONDS = float(os.environ.get("ROPERIA_IDEMPOTENCY_WAIT_SECONDS", "30"))
+# Una reserva pendiente mas vieja que esto es de un worker que murio a mitad de la peticion
+LEASE = timedelta(seconds=float(os.environ.get("ROPERIA_IDEMPOTENCY_LEASE_SECONDS", "300")))
+MAX_STORED_BYTES = int(os.environ.get("ROPERIA_IDEMPOTENCY_MAX_BYTES", str(1024 * 1024)))
+POLL_SECONDS = 0.05
+MAX_KEY_LENGTH = 255
+PENDING = "pending"
+DONE = "done"
+SKIP_HEADERS = {"content-length", "date", "server"}
+
+def fingerprint(method, path, query, body):
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def _row_query(key):
+    table = models.IdempotencyKey.__table__
+    return select(table.c.key, table.c.fingerprint, table.c.status, table.c.status_code, table.c.headers, table.c.body).where(table.c.key == key)
+
+def claim(db, key, request_fingerprint, now=None):
+    """Reserva `key` para esta peticion: None si la reserva es nuestra, si no la fila existente."""
+    now = now or datetime.now()
+    table = models.IdempotencyKey.__table__
+    db.execute(table.delete().where(table.c.expires_at <= now))
+    db.execute(table.delete().where(table.c.key == key, table.c.status == PENDING, table.c.created_at <= now - LEASE))
+    inserted = db.execute(insert(table).values(key=key, fingerprint=request_fingerprint, status=PENDING, created_at=now, expires_at=now + TTL)
+                          .on_conflict_do_nothing(index_elements=[table.c.key])).rowcount
+    return None if inserted else db.execute(_row_query(key)).first()
+
+def save(db, key, status_code, headers, body):
+    table = models.IdempotencyKey.__table__
+    db.execute(table.update().where(table.c.key == key, table.c.status == PENDING).values(
+        status=DONE, status_code=status_code, headers=json.dumps(headers), body=body))
+
+def release(db, key):
+    table = models.IdempotencyKey.__table__
+    db.execute(table.delete().where(table.c.key == key, table.c.status == PENDING))
+
+def _replay(row):
+    headers = json.loads(row.headers)
+    if row.body is None:
+        return JSONResponse(status_code=409, content={"detail": f"The request with this {HEADER} already completed; its response was not stored"},
+                            headers={name: value for name, value in headers if name.lower().startswith("x-")})
+    return _response(row.status_code, headers, row.body, replayed=True)
+
+def _response(status_code, headers, body, replayed=False):
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers += [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+async def _claim(key, request_fingerprint):
+    return await run_in_threadpool(run_write, partial(claim, key=key, request_fingerprint=request_fingerprint))
+
+async def middleware(request, call_next):
+    key = request.headers.get(HEADER)
+    if key is None or request.method not in METHODS or request.headers.get("content-type", "").startswith("multipart/"):
+        return await call_next(request)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return JSONResponse(status_code=400, content={"detail": f"{HEADER} must have between 1 and {MAX_KEY_LENGTH} characters"})
+
+    request_fingerprint = fingerprint(request.method, request.url.path, request.url.query, await request.body())
+    deadline = asyncio.get_running_loop().time() + WAIT_SECONDS
+    row = await _claim(key, request_fingerprint)
+    while row is not None:
+        if row.fingerprint != request_fingerprint:
+            return JSONResponse(status_code=422, content={"detail": f"{HEADER} already used for a different request"})
+        if row.status == DONE:
+            return _replay(row)
+        # La primera peticion sigue en curso: se espera su respuesta leyendo la fila
+        if asyncio.get_running_loop().time() >= deadline:
+            return JSONResponse(status_code=409, content={"detail": f"A request with this {HEADER} is still in progress"}, headers={"Retry-After": "1"})
+        await asyncio.sleep(POLL_SECONDS)
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(_row_query(key))).first()
+        if row is None:
+            # La primera fallo y libero la clave: esta peticion la toma
+            row = await _claim(key, request_fingerprint)
+
+    try:
+        response = await call_next(request)
+    except BaseException:
+        await run_in_threadpool(run_write, partial(release, key=key))
+        raise
+    if not 200 <= response.status_code < 300:
+        await run_in_threadpool(run_write, partial(release, key=key))
+        return response
+    headers = [(name, value) for name, value in response.headers.items() if name.lower() not in SKIP_HEADERS]
+    length = response.headers.get("content-length")
+    if length is None or int(length) > MAX_STORED_BYTES:
+        # La escritura ya se confirmo: se cierra la clave y el cuerpo se transmite tal cual
+        await run_in_threadpool(run_write, partial(save, key=key, status_code=response.status_code, headers=headers, body=None))
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    await run_in_threadpool(run_write, partial(save, key=key, status_code=response.status_code, headers=headers, body=body))
+    return _response(response.status_code, headers, body)
@@ -0,0 +1,104 @@
+import argparse
+
+from sqlalchemy import bindparam
+
+from database import SessionLocal, engine
+import models
+
+# Asignacion FIFO de las devoluciones de lavanderia a los envios. Se calcula una vez al
+# registrar la devolucion (en la misma transaccion) y queda guardada en laundry_allocations
+# y en laundry_items.returned / last_return_date, de modo que el reporte solo lee.
+
+CHUNK_SIZE = 1000
+
+def allocate_return(db, return_items):
+    """Reparte cada item devuelto entre los envios abiertos mas antiguos del mismo trabajador y prenda."""
+    for r_item in return_items:
+        remaining = r_item.qty
+        if remaining <= 0:
+            continue
+        open_sends = (
+            db.query(models.LaundryItem)
+            .filter(models.LaundryItem.dni == r_item.dni, models.LaundryItem.name == r_item.name,
+                    models.LaundryItem.returned < models.LaundryItem.qty, models.LaundryItem.qty > 0)
+            .order_by(models.LaundryItem.date, models.LaundryItem.id)
+        )
+        for send in open_sends:
+            # Sin autoflush la consulta aun trae envios que un item anterior de esta misma
+            # devolucion (la prenda repetida) ya completo en memoria: se saltean
+            take = min(remaining, send.qty - send.returned)
+            if take <= 0:
+                continue
+            send.returned += take
+            send.last_return_date = r_item.date
+            db.add(models.LaundryAllocation(return_item_id=r_item.id, laundry_item_id=send.id, laundry_id=send.laundry_id,
+                                            return_id=r_item.return_id, qty=take, date=r_item.date))
+            remaining -= take
+            if remaining <= 0:
+                break
+
+def backfill_allocations(db):
+    """Recalcula todas las asignaciones desde el historial (envios y devoluciones por fecha)."""
+    db.query(models.LaundryAllocation).delete(synchronize_session=False)
+
+    open_sends = {}
+    sends = {}
+    send_query = (
+        db.query(models.LaundryItem.id, models.LaundryItem.laundry_id, models.LaundryItem.dni, models.LaundryItem.name,
+                 models.LaundryItem.qty, models.LaundryItem.date)
+        .filter(models.LaundryItem.qty > 0)
+        .order_by(models.LaundryItem.date, models.LaundryItem.id)
+    )
+    for item_id, laundry_id, dni, name, qty, send_date in send_query.yield_per(CHUNK_SIZE):
+        state = {"id": item_id, "laundry_id": laundry_id, "qty": qty, "date": send_date, "returned": 0, "last_return_date": None}
+        sends[item_id] = state
+        open_sends.setdefault((dni, name), []).append(state)
+
+    allocations = []
+    return_query = (
+        db.query(models.LaundryReturnItem.id, models.LaundryReturnItem.return_id, models.LaundryReturnItem.dni,
+                 models.LaundryReturnItem.name, models.LaundryReturnItem.qty, models.LaundryReturnItem.date)
+        .filter(models.LaundryReturnItem.qty > 0)
+        .order_by(models.LaundryReturnItem.date, models.LaundryReturnItem.id)
+    )
+    for r_id, return_id, dni, name, remaining, r_date in return_query.all():
+        queue = open_sends.get((dni, name), [])
+        # Igual que al registrar: una devolucion solo cubre envios anteriores a ella
+        while remaining > 0 and queue and queue[0]["date"] <= r_date:
+            state = queue[0]
+            take = min(remaining, state["qty"] - state["returned"])
+            state["returned"] += take
+            state["last_return_date"] = r_date
+            allocations.append({"return_item_id": r_id, "laundry_item_id": state["id"], "laundry_id": state["laundry_id"],
+                                "return_id": return_id, "qty": take, "date": r_date})
+            remaining -= take
+            if state["returned"] >= state["qty"]:
+                queue.pop(0)
+
+    db.query(models.LaundryItem).update({"returned": 0, "last_return_date": None}, synchronize_session=False)
+    updates = [{"id": s["id"], "returned": s["returned"], "last_return_date": s["last_return_date"]} for s in sends.values() if s["returned"]]
+    for start in range(0, len(updates), CHUNK_SIZE):
+        db.execute(models.LaundryItem.__table__.update().where(models.LaundryItem.__table__.c.id == bindparam("item_id"))
+                   .values(returned=bindparam("returned"), last_return_date=bindparam("last_return_date")),
+                   [{"item_id": u["id"], "returned": u["returned"], "last_return_date": u["last_return_date"]} for u in updates[start:start + CHUNK_SIZE]])
+    for start in range(0, len(allocations), CHUNK_SIZE):
+        db.execute(models.LaundryAllocation.__table__.insert(), allocations[start:start + CHUNK_SIZE])
+    db.commit()
+    return len(allocations)
+
+def ensure_allocations(db):
+    """Primer arranque sobre una base existente: calcula las asignaciones si aun no hay ninguna."""
+    if db.query(models.LaundryAllocation.id).first() is None and db.query(models.LaundryReturnItem.id).first() is not None:
+        backfill_allocations(db)
+
+def main():
+    argparse.ArgumentParser(description="Recalcula la asignacion FIFO de devoluciones de lavanderia.").parse_args()
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        print(f"Asignaciones creadas: {backfill_allocations(db)}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
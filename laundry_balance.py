@@ -0,0 +1,87 @@
+import argparse
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+
+from database import SessionLocal, engine
+import data_version
+import models
+
+# Saldo por (dni, prenda) mantenido en la misma transaccion que los envios y devoluciones
+# de lavanderia, para que las consultas no tengan que recorrer todo el historial.
+
+def apply_items(db, dni, items, field):
+    """Suma las cantidades de `items` a la columna `field` ("sent" o "returned")."""
+    table = models.LaundryBalance.__table__
+    for item in items:
+        values = {"dni": dni, "item_name": item['name'], "sent": 0, "returned": 0}
+        values[field] = item['qty']
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.dni, table.c.item_name],
+            set_={field: table.c[field] + stmt.excluded[field]},
+        )
+        db.execute(stmt)
+
+def compute_balances(db):
+    """Recalcula los saldos desde el historial crudo (caliente y archivado): {(dni, prenda): [enviado, devuelto]}."""
+    totals = {}
+    for model, idx in ((models.LaundryItem, 0), (models.ArchivedLaundryItem, 0), (models.LaundryReturnItem, 1), (models.ArchivedLaundryReturnItem, 1)):
+        for dni, name, qty in db.query(model.dni, model.name, func.sum(model.qty)).group_by(model.dni, model.name):
+            totals.setdefault((dni, name), [0, 0])[idx] += qty
+    return totals
+
+def verify_balances(db):
+    """Devuelve la lista de diferencias entre la tabla de saldos y el historial."""
+    expected = compute_balances(db)
+    stored = {(b.dni, b.item_name): [b.sent, b.returned] for b in db.query(models.LaundryBalance)}
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: (k[0] or "", k[1] or "")):
+        exp = expected.get(key, [0, 0])
+        got = stored.get(key, [0, 0])
+        if exp != got:
+            drift.append({"dni": key[0], "item_name": key[1], "expected_sent": exp[0], "expected_returned": exp[1], "stored_sent": got[0], "stored_returned": got[1]})
+    return drift
+
+def rebuild_balances(db):
+    """Reemplaza por completo la tabla de saldos con los valores recalculados."""
+    totals = compute_balances(db)
+    db.query(models.LaundryBalance).delete(synchronize_session=False)
+    if totals:
+        db.execute(models.LaundryBalance.__table__.insert(), [
+            {"dni": dni, "item_name": name, "sent": sent, "returned": returned}
+            for (dni, name), (sent, returned) in totals.items()
+        ])
+    data_version.bump(db)
+    db.commit()
+    return len(totals)
+
+def ensure_balances(db):
+    """Primer arranque sobre una base existente: llena la tabla si esta vacia."""
+    if db.query(models.LaundryBalance.id).first() is None and db.query(models.Laundry.id).first() is not None:
+        rebuild_balances(db)
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica o reconstruye la tabla de saldos de lavanderia.")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruye los saldos desde el historial")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        drift = verify_balances(db)
+        for d in drift:
+            print(f"DRIFT dni={d['dni']} item={d['item_name']!r} "
+                  f"esperado={d['expected_sent']}/{d['expected_returned']} "
+                  f"guardado={d['stored_sent']}/{d['stored_returned']}")
+        print(f"{len(drift)} diferencias encontradas")
+        if args.rebuild:
+            count = rebuild_balances(db)
+            print(f"Saldos reconstruidos: {count} filas")
+        elif drift:
+            raise SystemExit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, select, type_coerce, union_all
+
+from database import SessionLocal, engine
+import data_version
+import models
+
+# Tiempos de vuelta de la lavanderia (cuanto tarda en volver cada prenda enviada) y lista de
+# trabajadores con prendas vencidas. El historial de envios y devoluciones (caliente y
+# archivado) se carga en bloque en DataFrames y la asignacion FIFO se resuelve vectorizada:
+# por (dni, prenda) los envios ocupan tramos consecutivos de un eje de cantidades y cada
+# devolucion otro tramo; la cantidad asignada es el solapamiento entre tramos.
+#   python laundry_turnaround.py --sla-days 7
+
+SLA_DAYS = float(os.environ.get("ROPERIA_LAUNDRY_SLA_DAYS", "7"))
+PERCENTILES = (0.5, 0.9, 0.99)
+MATCH_COLUMNS = ["send_id", "return_id", "dni", "name", "send_date", "return_date", "qty"]
+
+def load_history(db):
+    """(envios, devoluciones): DataFrames con id, dni, name, qty, date de las filas de detalle."""
+    frames = []
+    for tiers in ((models.LaundryItem, models.ArchivedLaundryItem), (models.LaundryReturnItem, models.ArchivedLaundryReturnItem)):
+        # Fechas como texto: pandas las convierte de una vez, mas rapido que fila por fila en SQLAlchemy
+        stmt = union_all(*(select(m.id, m.dni, m.name, m.qty, type_coerce(m.date, String).label("date")).where(m.qty > 0) for m in tiers))
+        frame = pd.read_sql(stmt, db.connection())
+        # Sin filas read_sql deja las columnas como object y cumsum falla: tipos fijos siempre
+        frames.append(frame.astype({"id": "int64", "qty": "int64", "dni": "str", "name": "str"})
+                      .assign(date=pd.to_datetime(frame["date"], format="ISO8601").astype("datetime64[ns]")))
+    return tuple(frames)
+
+def _group_ids(sends, returns):
+    keys = pd.concat([sends["dni"] + "\x1f" + sends["name"], returns["dni"] + "\x1f" + returns["name"]], ignore_index=True)
+    codes, uniques = pd.factorize(keys)
+    return codes[:len(sends)], codes[len(sends):], len(uniques)
+
+def match(sends, returns):
+    """Asignacion FIFO vectorizada, con la misma regla que laundry_allocation: cada devolucion
+    cubre los envios abiertos mas antiguos del mismo dni y prenda con fecha <= la suya, y lo
+    devuelto de mas se descarta. Una fila por (envio, devolucion) con la cantidad asignada."""
+    sends = sends.sort_values(["dni", "name", "date", "id"], kind="stable", ignore_index=True)
+    returns = returns.sort_values(["dni", "name", "date", "id"], kind="stable", ignore_index=True)
+    send_group, return_group, n_groups = _group_ids(sends, returns)
+
+    # Eje global: los grupos quedan contiguos porque los envios estan ordenados por (dni, prenda)
+    qty = sends["qty"].to_numpy()
+    s_end = np.cumsum(qty)
+    s_start = s_end - qty
+    local_end = sends.assign(group=send_group).groupby("group", sort=False)["qty"].cumsum().to_numpy()
+    base = np.zeros(n_groups, dtype=s_end.dtype)
+    base[send_group] = s_end - local_end
+
+    # Enviado hasta la fecha de cada devolucion (el ultimo envio con fecha <= la suya)
+    sent_so_far = pd.merge_asof(
+        returns.assign(group=return_group, order=np.arange(len(returns))).sort_values("date", kind="stable"),
+        pd.DataFrame({"group": send_group, "date": sends["date"], "sent": local_end}).sort_values("date", kind="stable"),
+        on="date", by="group", direction="backward",
+    ).sort_values("order")["sent"].fillna(0).to_numpy()
+
+    # Asignado acumulado: A_k = min(A_{k-1} + r_k, S_k) = R_k + min(0, min_{j<=k}(S_j - R_j))
+    returned = returns["qty"].groupby(return_group, sort=False).cumsum().to_numpy()
+    slack = pd.Series(np.minimum(sent_so_far - returned, 0)).groupby(return_group, sort=False).cummin().to_numpy()
+    a_end = returned + slack
+    a_start = np.concatenate(([0], a_end[:-1]))
+    a_start[np.r_[True, return_group[1:] != return_group[:-1]]] = 0
+    keep = a_end > a_start
+    a = base[return_group][keep] + a_start[keep]
+    b = base[return_group][keep] + a_end[keep]
+    segments = np.flatnonzero(keep)
+
+    # Cada tramo devuelto puede cubrir varios envios consecutivos
+    first = np.searchsorted(s_end, a, side="right")
+    last = np.searchsorted(s_start, b, side="left") - 1
+    counts = last - first + 1
+    rep = np.repeat(np.arange(len(segments)), counts)
+    send_idx = first[rep] + np.arange(len(rep)) - np.repeat(np.cumsum(counts) - counts, counts)
+    matched = np.minimum(b[rep], s_end[send_idx]) - np.maximum(a[rep], s_start[send_idx])
+
+    return_idx = segments[rep]
+    return pd.DataFrame({
+        "send_id": sends["id"].to_numpy()[send_idx], "return_id": returns["id"].to_numpy()[return_idx],
+        "dni": sends["dni"].to_numpy()[send_idx], "name": sends["name"].to_numpy()[send_idx],
+        "send_date": sends["date"].to_numpy()[send_idx], "return_date": returns["date"].to_numpy()[return_idx],
+        "qty": matched.astype("int64"),
+    }, columns=MATCH_COLUMNS)
+
+def match_loop(sends, returns):
+    """Referencia con un bucle por prenda (como el reporte antes de laundry_allocation)."""
+    queues = {}
+    for send in sends.sort_values(["date", "id"], kind="stable").itertuples(index=False):
+        queues.setdefault((send.dni, send.name), []).append([send, 0])
+    rows = []
+    for ret in returns.sort_values(["date", "id"], kind="stable").itertuples(index=False):
+        remaining = ret.qty
+        queue = queues.get((ret.dni, ret.name), [])
+        while remaining > 0 and queue and queue[0][0].date <= ret.date:
+            send, used = queue[0]
+            take = min(remaining, send.qty - used)
+            rows.append((send.id, ret.id, send.dni, send.name, send.date, ret.date, take))
+            remaining -= take
+            queue[0][1] += take
+            if queue[0][1] >= send.qty:
+                queue.pop(0)
+    frame = pd.DataFrame(rows, columns=MATCH_COLUMNS)
+    return frame.astype({"qty": "int64"}) if rows else frame
+
+class Turnaround:
+    """Historial asignado: `matches` (una fila por tramo devuelto) y `pending` (lo que falta por envio)."""
+
+    def __init__(self, sends, matches):
+        self.matches = matches.assign(days=(matches["return_date"] - matches["send_date"]) / pd.Timedelta(days=1),
+                                      month=matches["send_date"].to_numpy().astype("datetime64[M]").astype(str))
+        returned = matches.groupby("send_id")["qty"].sum()
+        pending = sends.assign(pending=sends["qty"] - sends["id"].map(returned).fillna(0).astype("int64"))
+        self.pending = pending[pending["pending"] > 0]
+
+    @classmethod
+    def load(cls, db):
+        sends, returns = load_history(db)
+        return cls(sends, match(sends, returns))
+
+    def percentiles(self, by, date_from=None, date_to=None, sla_days=SLA_DAYS):
+        """Percentiles de dias de vuelta ponderados por cantidad, por `by` ("name" o "month")."""
+        frame = self.matches
+        if date_from is not None: frame = frame[frame["send_date"] >= pd.Timestamp(date_from)]
+        if date_to is not None: frame = frame[frame["send_date"] < pd.Timestamp(date_to) + pd.Timedelta(days=1)]
+        if frame.empty:
+            return []
+        frame = frame.sort_values([by, "days"], kind="stable")
+        grouped = frame.groupby(by, sort=True)
+        total = grouped["qty"].transform("sum")
+        share = grouped["qty"].cumsum() / total
+        result = pd.DataFrame({"pieces": grouped["qty"].sum(),
+                               "within_sla": frame["qty"].where(frame["days"] <= sla_days, 0).groupby(frame[by]).sum() / grouped["qty"].sum()})
+        for p in PERCENTILES:
+            # Primer valor cuya cantidad acumulada llega al percentil (inverted_cdf ponderado)
+            result[f"p{int(p * 100)}_days"] = frame[share >= p - 1e-12].groupby(by)["days"].first()
+        result = result.round(3).reset_index()
+        return result.rename(columns={"name": "item"}).to_dict("records")
+
+    def overdue(self, sla_days=SLA_DAYS, now=None, limit=100):
+        """Trabajadores con prendas enviadas hace mas de `sla_days` que aun no vuelven."""
+        now = pd.Timestamp(now or datetime.now())
+        late = self.pending[self.pending["date"] < now - pd.Timedelta(days=sla_days)]
+        if late.empty:
+            return []
+        late = late.assign(item=late["pending"].astype(str) + " " + late["name"])
+        per_worker = late.groupby("dni").agg(pending=("pending", "sum"), oldest_send=("date", "min"), items=("item", ", ".join))
+        per_worker = per_worker.sort_values(["oldest_send", "pending"], ascending=[True, False]).head(limit)
+        per_worker["days_outstanding"] = ((now - per_worker["oldest_send"]) / pd.Timedelta(days=1)).round(1)
+        per_worker["oldest_send"] = per_worker["oldest_send"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+        return per_worker.reset_index().to_dict("records")
+
+# Cache por proceso indexada por la version de datos (como /api/stats): el historial se
+# vuelve a cargar y asignar solo despues de una escritura.
+_cache = (None, None)
+_cache_lock = threading.Lock()
+
+def current(db):
+    global _cache
+    version = data_version.current(db)
+    with _cache_lock:
+        cached_version, turnaround = _cache
+        if cached_version != version:
+            turnaround = Turnaround.load(db)
+            _cache = (version, turnaround)
+    return turnaround
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentiles de tiempo de vuelta de la lavanderia y trabajadores con prendas vencidas.")
+    parser.add_argument("--sla-days", type=float, default=SLA_DAYS)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        turnaround = Turnaround.load(db)
+    print(json.dumps({"by_item": turnaround.percentiles("name", sla_days=args.sla_days),
+                      "overdue": turnaround.overdue(args.sla_days, limit=20)}, ensure_ascii=False, indent=2, default=str))
+
+if __name__ == "__main__":
+    main()
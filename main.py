@@ -1,27 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, File, HTTPException, Request, Response, UploadFile, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from sqlalchemy import func, distinct, exists, literal, select, tuple_, union_all, update
+from database import AsyncSessionLocal, SessionLocal, engine, Base, run_write
 import models, schemas
-from datetime import date, datetime
+import archive
+import change_log
+import data_version
+import entitlements
+import event_stream
+import idempotency
+import laundry_allocation
+import laundry_balance
+import laundry_turnaround
+import metrics
+import migrations
+import pdf_actas
+import rollups
+import user_import
+import user_search
+from pdf_actas import pdf_queue, PDF_PENDING, PDF_READY, PDF_FAILED
+from datetime import date, datetime, time, timedelta
+from contextlib import asynccontextmanager
+import csv
+import hashlib
+import io
 import json
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import logging
 import os
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib.utils import ImageReader
-
-# Configuración de directorios para PDFs
-PDF_DIR = "deliveries_pdf"
-os.makedirs(PDF_DIR, exist_ok=True)
+from starlette.concurrency import run_in_threadpool
 
 # Inicialización de Base de Datos
 models.Base.metadata.create_all(bind=engine)
+with SessionLocal() as _db:
+    migrations.run_migrations(_db)
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app):
+    pdf_queue.requeue_pending()
+    yield
+    await broadcaster.close()
+    pdf_queue.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+# Reintentos de POST con Idempotency-Key: respuesta guardada, sin repetir la escritura
+app.middleware("http")(idempotency.middleware)
 
-app = FastAPI()
+# Latencia por ruta y sentencias SQL por peticion (ver /metrics)
+app.middleware("http")(metrics.middleware)
 
 # Configuración de CORS
 app.add_middleware(
@@ -55,18 +87,51 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _etag_matches(request, etag):
+    """True si If-None-Match ya incluye `etag` (el cliente tiene esta version)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
 # --- RUTAS DE LA API ---
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/users", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.dni == user.dni).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="DNI already registered")
-    new_user = models.User(**user.dict())
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+def create_user(user: schemas.UserCreate):
+    def work(db):
+        if db.query(models.User.id).filter(models.User.dni == user.dni).first():
+            raise HTTPException(status_code=400, detail="DNI already registered")
+        new_user = models.User(**user.dict())
+        db.add(new_user)
+        db.flush()
+        change_log.record(db, change_log.event(change_log.USER, new_user.dni, new_user.id, user.dict()))
+        data_version.bump(db, data_version.STATS, data_version.USERS)
+        return new_user
+
+    return run_write(work)
+
+@app.post("/api/users/import")
+def import_users(file: UploadFile = File(...)):
+    try:
+        return user_import.import_users(user_import.iter_rows(file.file, file.filename))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Debe ir antes de /api/users/{dni}, que si no capturaria "search" como DNI
+@app.get("/api/users/search", response_model=list[schemas.User])
+async def search_users(q: str, limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    if not q.strip():
+        return []
+    return (await db.execute(user_search.search_query(q, min(limit, 100)))).scalars().all()
 
 @app.get("/api/users/{dni}", response_model=schemas.User)
 def read_user(dni: str, db: Session = Depends(get_db)):
@@ -75,329 +140,485 @@ def read_user(dni: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-def determine_items(contract_type: str):
-    items = []
-    if contract_type == "Regular Otro sindicato":
-        items = [
-            {"name": "Juego de Uniforme (Chaqueta, Pantalon, Polo, Polera)", "qty": 2},
-            {"name": "Jabones de tocador", "qty": 24},
-            {"name": "Toallas", "qty": 2}
-        ]
-    elif contract_type == "Regular PYA":
-        items = [
-            {"name": "Juego de Uniforme (Chaqueta, Pantalon, Polo, Polera)", "qty": 3},
-            {"name": "Jabones Bolivar", "qty": 24},
-            {"name": "Jabones de tocador", "qty": 22},
-            {"name": "Toallas", "qty": 2}
-        ]
-    elif contract_type == "Temporal":
-        items = [
-            {"name": "Juego de Uniforme (Chaqueta, Pantalon, Polo, Polera)", "qty": 3},
-            {"name": "Par de zapatos", "qty": 1},
-            {"name": "Candado", "qty": 1},
-            {"name": "Casillero", "qty": 1},
-             {"name": "Jabones Bolivar", "qty": 2}
-        ]
-    return items
-
-def generate_pdf(delivery_id, user, items, delivery_date):
-    filename = f"delivery_{delivery_id}.pdf"
-    filepath = os.path.join(PDF_DIR, filename)
-    
-    c = canvas.Canvas(filepath, pagesize=letter)
-    width, height = letter
-    
-    # --- Header ---
-    # Nota: He mantenido tu lógica de logo, pero recuerda que en Render 
-    # la ruta debe ser relativa al servidor, ej: "frontend/logo.png"
-    logo_path = "frontend/logo.png" 
-    
-    if os.path.exists(logo_path):
-        try:
-            logo = ImageReader(logo_path)
-            iw, ih = logo.getSize()
-            aspect = ih / float(iw)
-            draw_width = 120
-            draw_height = draw_width * aspect
-            c.drawImage(logo, 40, height - 50 - draw_height, width=draw_width, height=draw_height, mask='auto', preserveAspectRatio=True)
-        except Exception as e:
-            c.drawString(40, height - 100, "SODEXO")
-        
-    c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(width / 2, height - 120, "ACTA DE ENTREGA DE UNIFORMES Y EPP")
-    
-    c.setFont("Helvetica", 10)
-    c.drawRightString(width - 50, height - 60, f"Acta N°: {delivery_id:06d}")
-    c.drawRightString(width - 50, height - 75, f"Fecha: {delivery_date.strftime('%Y-%m-%d')}")
-    
-    y_info = height - 180
-    c.setLineWidth(1)
-    c.setStrokeColor(colors.lightgrey)
-    c.rect(50, y_info - 60, width - 100, 70, fill=0)
-    
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(60, y_info - 20, "DATOS DEL TRABAJADOR:")
-    
-    c.setFont("Helvetica", 10)
-    c.drawString(60, y_info - 40, f"Nombre Completo: {user.name} {user.surname}")
-    c.drawString(300, y_info - 40, f"DNI: {user.dni}")
-    c.drawString(60, y_info - 55, f"Contratación: {user.contract_type}    Talla: {user.size if hasattr(user, 'size') else '-'}")
-
-    y_table = y_info - 100
-    data = [["Item / Descripción", "Cantidad"]]
-    for item in items:
-        data.append([item['name'], str(item['qty'])])
-
-    table = Table(data, colWidths=[350, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.navy),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    w, h = table.wrap(width, height)
-    table.drawOn(c, 80, y_table - h)
-    
-    y_sig = 150
-    c.setFont("Helvetica", 9)
-    c.drawString(50, y_sig + 60, "Declaro haber recibido a mi entera satisfacción los bienes arriba descritos.")
-    c.line(100, y_sig, 250, y_sig)
-    c.drawCentredString(175, y_sig - 15, "ENTREGADO POR")
-    c.drawCentredString(175, y_sig - 30, "LOGÍSTICA / ROPERÍA")
-    
-    c.line(350, y_sig, 500, y_sig)
-    c.drawCentredString(425, y_sig - 15, "RECIBIDO POR")
-    c.drawCentredString(425, y_sig - 30, f"{user.name} {user.surname}")
-    c.drawCentredString(425, y_sig - 45, f"DNI: {user.dni}")
-    
-    c.save()
-    return filepath
+@app.get("/api/users/{dni}/entitlements")
+def read_entitlements(dni: str, period: str = None, db: Session = Depends(get_db)):
+    user = db.query(models.User).filter(models.User.dni == dni).first()
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    period = period or entitlements.period_for(datetime.now())
+    return {"dni": dni, "contract_type": user.contract_type, "period": period, "items": entitlements.remaining(db, user, period)}
 
 @app.post("/api/deliveries")
-def create_delivery(delivery: schemas.DeliveryCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.dni == delivery.dni).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-        
+def create_delivery(delivery: schemas.DeliveryCreate):
     items_list = [item.dict() for item in delivery.items]
-    
-    try:
+
+    def work(db):
+        user = db.query(models.User).filter(models.User.dni == delivery.dni).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
         new_delivery = models.Delivery(
             dni=delivery.dni,
             date=delivery.date,
             items_json=json.dumps(items_list),
-            pdf_path=""
+            pdf_path="",
+            pdf_status=PDF_PENDING,
+            pdf_claimed_at=datetime.now(),
+            items=[models.DeliveryItem(dni=delivery.dni, name=i['name'], qty=i['qty'], date=delivery.date) for i in items_list]
         )
         db.add(new_delivery)
-        db.commit()
-        db.refresh(new_delivery)
-        
-        pdf_path = generate_pdf(new_delivery.id, user, items_list, delivery.date)
-        new_delivery.pdf_path = pdf_path
-        db.commit()
-        
-        return {"message": "Delivery created", "delivery_id": new_delivery.id, "items": items_list, "pdf_url": f"/api/deliveries/{new_delivery.id}/pdf"}
+        entitlements.issue(db, user, items_list, delivery.date)
+        rollups.apply_deliveries(db, [(user.contract_type, items_list, delivery.date)])
+        db.flush()
+        change_log.record(db, change_log.event(change_log.DELIVERY, delivery.dni, new_delivery.id, {"items": items_list, "date": delivery.date}))
+        data_version.bump(db)
+        return new_delivery.id, pdf_actas.user_data(user)
+
+    try:
+        # run_write deshace la transaccion si algo falla (ver database.run_write)
+        delivery_id, user_data = run_write(work)
+    except HTTPException:
+        raise
+    except entitlements.QuotaExceeded as e:
+        raise HTTPException(status_code=409, detail={"message": "Entitlement exceeded", "dni": e.dni, "period": e.period, "items": e.items})
     except Exception as e:
-        import traceback
-        with open("error_log.txt", "w") as f:
-            f.write(traceback.format_exc())
+        logger.exception("Error registrando la entrega de %s", delivery.dni)
         raise HTTPException(status_code=500, detail=str(e))
 
+    # El acta se renderiza en segundo plano; el cliente consulta pdf_url hasta recibir el PDF
+    pdf_queue.submit(delivery_id, user_data, items_list, delivery.date)
+    with SessionLocal() as db:
+        pdf_status = db.query(models.Delivery.pdf_status).filter(models.Delivery.id == delivery_id).scalar()
+    return {"message": "Delivery created", "delivery_id": delivery_id, "items": items_list, "pdf_url": f"/api/deliveries/{delivery_id}/pdf", "pdf_status": pdf_status}
+
+@app.post("/api/deliveries/batch")
+def create_delivery_batch(batch: schemas.DeliveryBatchCreate):
+    if not batch.deliveries:
+        raise HTTPException(status_code=400, detail="No deliveries")
+
+    def work(db):
+        # Una sola consulta para validar todos los DNIs
+        dnis = {entry.dni for entry in batch.deliveries}
+        users = {u.dni: u for u in db.query(models.User).filter(models.User.dni.in_(dnis))}
+        missing = sorted(dnis - users.keys())
+        if missing:
+            raise HTTPException(status_code=404, detail={"message": "User not found", "dnis": missing})
+
+        new_deliveries = []
+        render_batch = []
+        for entry in batch.deliveries:
+            user = users[entry.dni]
+            items_list = [item.dict() for item in entry.items] if entry.items is not None else entitlements.default_items(db, user.contract_type)
+            if not items_list:
+                raise HTTPException(status_code=400, detail=f"No items for {entry.dni} ({user.contract_type})")
+            delivery_date = entry.date or batch.date or datetime.now()
+            new_deliveries.append(models.Delivery(
+                dni=entry.dni,
+                date=delivery_date,
+                items_json=json.dumps(items_list),
+                pdf_path="",
+                pdf_status=PDF_PENDING,
+                pdf_claimed_at=datetime.now(),
+                items=[models.DeliveryItem(dni=entry.dni, name=i['name'], qty=i['qty'], date=delivery_date) for i in items_list]
+            ))
+            render_batch.append((pdf_actas.user_data(user), items_list, delivery_date))
+
+        db.add_all(new_deliveries)
+        for delivery, (_, items_list, delivery_date) in zip(new_deliveries, render_batch):
+            entitlements.issue(db, users[delivery.dni], items_list, delivery_date)
+        rollups.apply_deliveries(db, [(user_info["contract_type"], items_list, delivery_date) for user_info, items_list, delivery_date in render_batch])
+        db.flush()
+        change_log.record(db, *(change_log.event(change_log.DELIVERY, d.dni, d.id, {"items": items_list, "date": delivery_date})
+                                for d, (_, items_list, delivery_date) in zip(new_deliveries, render_batch)))
+        data_version.bump(db)
+        return [(d.id, *args) for d, args in zip(new_deliveries, render_batch)]
+
+    try:
+        render_batch = run_write(work)
+    except entitlements.QuotaExceeded as e:
+        raise HTTPException(status_code=409, detail={"message": "Entitlement exceeded", "dni": e.dni, "period": e.period, "items": e.items})
+    delivery_ids = ",".join(str(args[0]) for args in render_batch)
+
+    if batch.output == "pdf":
+        # Cada acta se dibuja una sola vez, en el PDF unico. Quedan listas con la ruta de su clave
+        # de cache y el archivo individual se escribe recien si se pide, como un acta desalojada
+        ready = [{"id": args[0], "pdf_path": pdf_actas.acta_path(pdf_actas.render_key(*args)), "pdf_status": PDF_READY} for args in render_batch]
+        run_write(lambda db: db.execute(update(models.Delivery), ready))
+        content = pdf_queue.run(pdf_actas.render_merged, render_batch)
+        return Response(content=content, media_type="application/pdf",
+                        headers={"Content-Disposition": 'attachment; filename="actas.pdf"', "X-Delivery-Ids": delivery_ids})
+
+    results = pdf_queue.render_many(render_batch)
+    rendered = [{"id": delivery_id, "pdf_path": path, "pdf_status": PDF_READY, "pdf_attempts": 1}
+                for delivery_id, path in results.items() if isinstance(path, str)]
+    if rendered:
+        run_write(lambda db: db.execute(update(models.Delivery), rendered))
+    failed = [args for args in render_batch if not isinstance(results[args[0]], str)]
+    for args in failed:
+        # Quedan en la cola con reintentos, igual que en create_delivery
+        pdf_queue.submit(*args, attempt=2)
+
+    files = [(f"acta_{row['id']:06d}.pdf", row["pdf_path"]) for row in rendered]
+    headers = {"Content-Disposition": 'attachment; filename="actas.zip"', "X-Delivery-Ids": delivery_ids}
+    if failed:
+        headers["X-Pending-Deliveries"] = ",".join(str(args[0]) for args in failed)
+    return StreamingResponse(pdf_actas.stream_zip(files), media_type="application/zip", headers=headers)
+
+def _resubmit_pdf(delivery_id):
+    with SessionLocal() as db:
+        pdf_queue.submit_delivery(db, db.get(models.Delivery, delivery_id))
+
+# El contenido de un acta solo cambia si cambian sus datos, y entonces cambia el ETag:
+# el navegador la guarda pero revalida (304 sin leer el archivo). Range lo resuelve FileResponse.
+PDF_CACHE_CONTROL = "private, no-cache"
+
 @app.get("/api/deliveries/{delivery_id}/pdf")
-def get_pdf(delivery_id: int, db: Session = Depends(get_db)):
-    delivery = db.query(models.Delivery).filter(models.Delivery.id == delivery_id).first()
-    if not delivery or not os.path.exists(delivery.pdf_path):
+async def get_pdf(delivery_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    delivery = await db.get(models.Delivery, delivery_id)
+    if delivery is None:
+        # Las entregas archivadas conservan el id y siempre tienen el acta lista
+        delivery = await db.get(models.ArchivedDelivery, delivery_id)
+    if not delivery:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if delivery.pdf_status == PDF_FAILED:
+        # Un nuevo pedido del acta es un buen momento para reintentar (sesion sincrona: en el threadpool)
+        await run_in_threadpool(_resubmit_pdf, delivery.id)
+        await db.refresh(delivery)
+    if delivery.pdf_status == PDF_PENDING:
+        if delivery.pdf_claimed_at is None or delivery.pdf_claimed_at <= datetime.now() - pdf_actas.PDF_LEASE:
+            # Pendiente sin worker que la renderice (p. ej. se cayo antes de terminar): se reclama
+            await run_in_threadpool(pdf_queue.requeue_pending, delivery.id)
+            await db.refresh(delivery)
+    if delivery.pdf_status == PDF_PENDING:
+        return JSONResponse(status_code=202, content={"delivery_id": delivery.id, "pdf_status": delivery.pdf_status, "pdf_attempts": delivery.pdf_attempts},
+                            headers={"Retry-After": "1"})
+    args = await db.run_sync(lambda session: pdf_actas.render_args(session, delivery)) if delivery.pdf_status == PDF_READY else None
+    if args is None:
         raise HTTPException(status_code=404, detail="PDF not found")
-    return FileResponse(delivery.pdf_path, media_type="application/pdf", filename=os.path.basename(delivery.pdf_path))
+    # El ETag es la clave del acta: un 304 no necesita el archivo aunque haya sido desalojado
+    etag = pdf_actas.delivery_etag(delivery, args)
+    headers = {"ETag": etag, "Cache-Control": PDF_CACHE_CONTROL}
+    if etag and _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    # El render (CPU) va al pool de procesos; el event loop solo espera
+    path = await pdf_actas.ensure_delivery_pdf_async(db, delivery, args)
+    if not path:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if etag is None:
+        headers["ETag"] = pdf_actas.pdf_etag(path)
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/pdf", filename=f"acta_{delivery.id:06d}.pdf", headers=headers)
+
+@app.get("/api/pdf/status")
+def get_pdf_status(db: Session = Depends(get_db)):
+    counts = dict(db.query(models.Delivery.pdf_status, func.count(models.Delivery.id)).group_by(models.Delivery.pdf_status).all())
+    failed = db.query(models.Delivery).filter(models.Delivery.pdf_status == PDF_FAILED).order_by(models.Delivery.id.desc()).limit(100).all()
+    return {
+        "pending": counts.get(PDF_PENDING, 0),
+        "ready": counts.get(PDF_READY, 0),
+        "failed": counts.get(PDF_FAILED, 0),
+        "failures": [{"delivery_id": d.id, "dni": d.dni, "attempts": d.pdf_attempts, "error": d.pdf_error} for d in failed],
+    }
 
 @app.post("/api/laundry", response_model=schemas.Laundry)
-def create_laundry(laundry: schemas.LaundryCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.dni == laundry.dni).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if user.contract_type != "Regular Otro sindicato":
-        raise HTTPException(status_code=400, detail="Este usuario no esta habilitado para este servicio")
-
+def create_laundry(laundry: schemas.LaundryCreate):
     items_list = [item.dict() for item in laundry.items]
 
-    new_laundry = models.Laundry(
-        dni=laundry.dni,
-        date=datetime.now(),
-        items_json=json.dumps(items_list)
-    )
-    db.add(new_laundry)
-    db.commit()
-    db.refresh(new_laundry)
-    
-    return new_laundry
+    def work(db):
+        user = db.query(models.User).filter(models.User.dni == laundry.dni).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
 
-@app.get("/api/stats")
-def get_stats(db: Session = Depends(get_db)):
-    users_count = db.query(models.User).count()
-    deliveries_count = db.query(models.Delivery).count()
-    laundry_entries = db.query(models.Laundry).all()
-    laundry_returns = db.query(models.LaundryReturn).all()
-    
-    user_items = {} 
-    
-    for entry in laundry_entries:
-        if entry.dni not in user_items: user_items[entry.dni] = {}
-        items = json.loads(entry.items_json)
-        for item in items:
-            user_items[entry.dni][item['name']] = user_items[entry.dni].get(item['name'], 0) + item['qty']
-            
-    for entry in laundry_returns:
-        if entry.dni in user_items:
-            items = json.loads(entry.items_json)
-            for item in items:
-                user_items[entry.dni][item['name']] = user_items[entry.dni].get(item['name'], 0) - item['qty']
+        if user.contract_type != "Regular Otro sindicato":
+            raise HTTPException(status_code=400, detail="Este usuario no esta habilitado para este servicio")
 
-    active_laundry_users = sum(1 for items in user_items.values() if any(qty > 0 for qty in items.values()))
-    laundry_total_count = db.query(models.Laundry).count()
+        now = datetime.now()
+        new_laundry = models.Laundry(
+            dni=laundry.dni,
+            date=now,
+            items_json=json.dumps(items_list),
+            items=[models.LaundryItem(dni=laundry.dni, name=i['name'], qty=i['qty'], date=now) for i in items_list]
+        )
+        db.add(new_laundry)
+        laundry_balance.apply_items(db, laundry.dni, items_list, "sent")
+        rollups.apply_laundry(db, user.contract_type, items_list, now, rollups.LAUNDRY_SENT)
+        data_version.bump(db)
+        db.flush()
+        change_log.record(db, change_log.event(change_log.LAUNDRY, laundry.dni, new_laundry.id, {"items": items_list, "date": now}))
+        return new_laundry
+
+    # Escritura con reintentos ante "database is locked" (ver database.run_write)
+    return run_write(work)
+
+# Cache de /api/stats indexada por la version de datos: mientras nadie escriba, cada poll
+# del dashboard cuesta una lectura por clave primaria (o un 304 si el cliente trae el ETag).
+_stats_cache = (None, None)
+
+async def current_stats(db, version=None):
+    """(version, stats), recalculados solo si la version de datos cambio."""
+    global _stats_cache
+    if version is None:
+        version = await data_version.current_async(db)
+    cached_version, stats = _stats_cache
+    if cached_version != version:
+        # Un solo viaje a la base: cada await sobre aiosqlite cuesta un salto de hilo. La version
+        # se lee en la misma consulta para que la cache no mezcle datos de dos versiones.
+        counts = select(
+            data_version.version_query(),
+            select(func.count(models.User.id)).scalar_subquery(),
+            select(func.count(models.Delivery.id)).scalar_subquery(),
+            select(func.count(models.ArchivedDelivery.id)).scalar_subquery(),
+            select(func.count(distinct(models.LaundryBalance.dni))).where(models.LaundryBalance.sent > models.LaundryBalance.returned).scalar_subquery(),
+            select(func.count(models.Laundry.id)).scalar_subquery(),
+            select(func.count(models.ArchivedLaundry.id)).scalar_subquery(),
+        )
+        (counted_version, users_count, deliveries_count, archived_deliveries, active_laundry_users,
+         laundry_total_count, archived_laundry) = (await db.execute(counts)).one()
+        stats = {
+            "users_count": users_count,
+            "deliveries_count": deliveries_count + archived_deliveries,
+            "laundry_total_count": laundry_total_count + archived_laundry,
+            "laundry_active_count": active_laundry_users
+        }
+        version = counted_version or 0
+        _stats_cache = (version, stats)
+    return version, stats
 
-    return {
-        "users_count": users_count,
-        "deliveries_count": deliveries_count,
-        "laundry_total_count": laundry_total_count,
-        "laundry_active_count": active_laundry_users
-    }
+@app.get("/api/stats")
+async def get_stats(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    version = await data_version.current_async(db)
+    headers = {"ETag": f'"stats-{version}"', "Cache-Control": "no-cache"}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    version, stats = await current_stats(db, version)
+    headers["ETag"] = f'"stats-{version}"'
+    response.headers.update(headers)
+    return stats
+
+# Push de cambios y contadores por SSE (ver event_stream). Un broadcaster por worker.
+broadcaster = event_stream.Broadcaster(current_stats)
+
+@app.get("/api/events")
+async def get_events(request: Request, since: int = None):
+    # EventSource reconecta solo y manda el id del ultimo mensaje recibido
+    last_event_id = request.headers.get("last-event-id", "")
+    if since is None and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(event_stream.stream(broadcaster, since), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Tendencias desde la tabla rollups (ver rollups.py): el costo depende de los periodos
+# pedidos, no del historial. Misma version de datos que /api/stats para el ETag.
+@app.get("/api/analytics")
+async def get_analytics(request: Request, response: Response, date_from: date = None, date_to: date = None, contract_type: str = None,
+                        db: AsyncSession = Depends(get_async_db)):
+    version = await data_version.current_async(db)
+    headers = {"ETag": f'"analytics-{version}-{hashlib.sha256(request.url.query.encode()).hexdigest()[:16]}"', "Cache-Control": "no-cache"}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    rows = (await db.execute(rollups.analytics_query(date_from, date_to, contract_type))).all()
+    response.headers.update(headers)
+    return {"date_from": date_from, "date_to": date_to, "contract_type": contract_type, **rollups.shape(rows)}
 
 @app.get("/api/laundry", response_model=list[schemas.LaundryPendingUser])
-def get_laundry(db: Session = Depends(get_db)):
-    laundry_entries = db.query(models.Laundry).all()
-    laundry_returns = db.query(models.LaundryReturn).all()
-    
-    user_data = {}
+async def get_laundry(db: AsyncSession = Depends(get_async_db)):
+    rows = (await db.execute(
+        select(models.LaundryBalance, models.User)
+        .join(models.User, models.User.dni == models.LaundryBalance.dni)
+        .where(models.LaundryBalance.sent > models.LaundryBalance.returned)
+        .order_by(models.LaundryBalance.dni, models.LaundryBalance.id)
+    )).all()
 
-    for entry in laundry_entries:
-        if entry.dni not in user_data:
-            user = db.query(models.User).filter(models.User.dni == entry.dni).first()
-            if not user: continue
-            user_data[entry.dni] = {"user": user, "items": {}}
-        items = json.loads(entry.items_json)
-        for item in items:
-            name = item['name']
-            if name not in user_data[entry.dni]["items"]:
-                user_data[entry.dni]["items"][name] = {"sent": 0, "returned": 0}
-            user_data[entry.dni]["items"][name]["sent"] += item['qty']
-
-    for entry in laundry_returns:
-        if entry.dni in user_data:
-             items = json.loads(entry.items_json)
-             for item in items:
-                name = item['name']
-                if name in user_data[entry.dni]["items"]:
-                     user_data[entry.dni]["items"][name]["returned"] += item['qty']
-
-    result_list = []
-    for dni, data in user_data.items():
-        pending_items = [{"name": n, "qty": c["sent"] - c["returned"]} for n, c in data["items"].items() if (c["sent"] - c["returned"]) > 0]
-        if pending_items:
-            result_list.append({
-                "dni": dni,
-                "user_name": data["user"].name,
-                "user_surname": data["user"].surname,
-                "pending_items": pending_items
-            })
-    return result_list
+    user_data = {}
+    for balance, user in rows:
+        if balance.dni not in user_data:
+            user_data[balance.dni] = {"dni": balance.dni, "user_name": user.name, "user_surname": user.surname, "pending_items": []}
+        user_data[balance.dni]["pending_items"].append({"name": balance.item_name, "qty": balance.sent - balance.returned})
+    return list(user_data.values())
 
 @app.get("/api/laundry/{dni}/status")
 def get_laundry_status(dni: str, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.dni == dni).first()
     if not user: raise HTTPException(status_code=404, detail="User not found")
-    laundry_entries = db.query(models.Laundry).filter(models.Laundry.dni == dni).all()
-    laundry_returns = db.query(models.LaundryReturn).filter(models.LaundryReturn.dni == dni).all()
-    item_totals = {}
-    for entry in laundry_entries:
-        for item in json.loads(entry.items_json):
-            name = item['name']
-            if name not in item_totals: item_totals[name] = {"sent": 0, "returned": 0}
-            item_totals[name]["sent"] += item['qty']
-    for entry in laundry_returns:
-        for item in json.loads(entry.items_json):
-            name = item['name']
-            if name not in item_totals: item_totals[name] = {"sent": 0, "returned": 0}
-            item_totals[name]["returned"] += item['qty']
-    return [{"name": n, "sent": c["sent"], "returned": c["returned"], "pending": c["sent"] - c["returned"]} for n, c in item_totals.items()]
+    balances = db.query(models.LaundryBalance).filter(models.LaundryBalance.dni == dni).order_by(models.LaundryBalance.id).all()
+    return [{"name": b.item_name, "sent": b.sent, "returned": b.returned, "pending": b.sent - b.returned} for b in balances]
+
+# Percentiles de dias de vuelta (por prenda y por mes de envio) y trabajadores con prendas
+# vencidas. El historial asignado se cachea por version de datos (ver laundry_turnaround).
+@app.get("/api/laundry/turnaround")
+def get_laundry_turnaround(date_from: date = None, date_to: date = None, sla_days: float = laundry_turnaround.SLA_DAYS, limit: int = 100,
+                           db: Session = Depends(get_db)):
+    turnaround = laundry_turnaround.current(db)
+    overdue = turnaround.overdue(sla_days, limit=max(1, min(limit, MAX_PAGE_SIZE)))
+    users_by_dni = {u.dni: u for u in db.query(models.User).filter(models.User.dni.in_([row["dni"] for row in overdue]))}
+    for row in overdue:
+        user = users_by_dni.get(row["dni"])
+        row["user"] = f"{user.name} {user.surname}" if user else "Desconocido"
+    return {
+        "sla_days": sla_days,
+        "by_item": turnaround.percentiles("name", date_from, date_to, sla_days),
+        "by_month": turnaround.percentiles("month", date_from, date_to, sla_days),
+        "overdue": overdue,
+    }
 
 @app.post("/api/laundry/return", response_model=schemas.LaundryReturn)
-def create_laundry_return(return_data: schemas.LaundryReturnCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.dni == return_data.dni).first()
-    if not user: raise HTTPException(status_code=404, detail="User not found")
+def create_laundry_return(return_data: schemas.LaundryReturnCreate):
     items_list = [item.dict() for item in return_data.items]
-    new_return = models.LaundryReturn(dni=return_data.dni, date=datetime.now(), items_json=json.dumps(items_list))
-    db.add(new_return)
-    db.commit()
-    db.refresh(new_return)
-    return new_return
 
-@app.get("/api/laundry/report")
-def get_laundry_report(dni: str = None, month: int = None, year: int = None, db: Session = Depends(get_db)):
-    laundry_query = db.query(models.Laundry)
-    return_query = db.query(models.LaundryReturn)
-    if dni:
-        laundry_query = laundry_query.filter(models.Laundry.dni.contains(dni))
-        return_query = return_query.filter(models.LaundryReturn.dni.contains(dni))
-    laundry_records = laundry_query.order_by(models.Laundry.date).all()
-    return_records = return_query.order_by(models.LaundryReturn.date).all()
-    
-    user_inventory = {}
-    processed_sends = [] 
-
-    for rec in laundry_records:
-        if rec.dni not in user_inventory: user_inventory[rec.dni] = {}
-        for item in json.loads(rec.items_json):
-            name = item['name']
-            if item['qty'] <= 0: continue
-            if name not in user_inventory[rec.dni]: user_inventory[rec.dni][name] = []
-            tracker = {'id': rec.id, 'dni': rec.dni, 'name': name, 'qty': item['qty'], 'returned': 0, 'return_dates': [], 'send_date': rec.date, 'fully_returned': False}
-            user_inventory[rec.dni][name].append(tracker)
-            processed_sends.append(tracker)
-
-    for ret in return_records:
-        if ret.dni not in user_inventory: continue
-        for r_item in json.loads(ret.items_json):
-            r_name, r_qty = r_item['name'], r_item['qty']
-            if r_name in user_inventory[ret.dni]:
-                for tracker in user_inventory[ret.dni][r_name]:
-                    if tracker['fully_returned']: continue
-                    available = tracker['qty'] - tracker['returned']
-                    if available > 0:
-                        take = min(r_qty, available)
-                        tracker['returned'] += take
-                        tracker['return_dates'].append(ret.date)
-                        r_qty -= take
-                        if tracker['returned'] >= tracker['qty']: tracker['fully_returned'] = True
-                        if r_qty <= 0: break
+    def work(db):
+        user = db.query(models.User).filter(models.User.dni == return_data.dni).first()
+        if not user: raise HTTPException(status_code=404, detail="User not found")
+        now = datetime.now()
+        new_return = models.LaundryReturn(dni=return_data.dni, date=now, items_json=json.dumps(items_list),
+                                          items=[models.LaundryReturnItem(dni=return_data.dni, name=i['name'], qty=i['qty'], date=now) for i in items_list])
+        db.add(new_return)
+        db.flush()
+        laundry_allocation.allocate_return(db, new_return.items)
+        laundry_balance.apply_items(db, return_data.dni, items_list, "returned")
+        rollups.apply_laundry(db, user.contract_type, items_list, now, rollups.LAUNDRY_RETURNED)
+        data_version.bump(db)
+        db.flush()
+        change_log.record(db, change_log.event(change_log.LAUNDRY_RETURN, return_data.dni, new_return.id, {"items": items_list, "date": now}))
+        return new_return
+
+    return run_write(work)
+
+# --- SINCRONIZACION POR DELTAS ---
+# Sin `since` solo devuelve el cursor actual: el cliente lo guarda, descarga los datos
+# completos y desde ahi pide /api/changes?since=<cursor>. 410 si el cursor fue podado.
+
+@app.get("/api/changes")
+async def get_changes(since: int = None, limit: int = change_log.MAX_EVENTS, db: AsyncSession = Depends(get_async_db)):
+    if since is None:
+        return {"cursor": await db.scalar(change_log.latest_query()) or 0, "has_more": False, "events": [], "balances": {}}
+    limit = max(1, min(limit, change_log.MAX_EVENTS))
+    events = (await db.execute(change_log.changes_query(since, limit))).scalars().all()
+    try:
+        change_log.check_cursor(since, events)
+    except change_log.CursorExpired:
+        raise HTTPException(status_code=410, detail="Cursor expired, download the full data again")
+    dnis = {e.dni for e in events[:limit] if e.kind in change_log.BALANCE_KINDS}
+    balance_rows = (await db.execute(change_log.balances_query(dnis))).all() if dnis else []
+    return change_log.shape(since, events, limit, balance_rows)
+
+# --- REPORTES ---
+# Los filtros de fecha se resuelven en SQL y la paginacion es por cursor (keyset) sobre
+# (date, id) descendente: `limit` limita la pagina y `after` recibe el cursor de la cabecera
+# X-Next-Cursor de la respuesta anterior.
+
+MAX_PAGE_SIZE = 1000
+
+def _date_filters(column, month=None, year=None, date_from=None, date_to=None):
+    filters = []
+    if year and month:
+        start = datetime(year, month, 1)
+        filters += [column >= start, column < (datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1))]
+    elif year:
+        filters += [column >= datetime(year, 1, 1), column < datetime(year + 1, 1, 1)]
+    elif month:
+        filters.append(func.strftime('%m', column) == f"{month:02d}")
+    if date_from:
+        filters.append(column >= datetime.combine(date_from, time.min))
+    if date_to:
+        filters.append(column < datetime.combine(date_to + timedelta(days=1), time.min))
+    return filters
+
+def _range_start(month=None, year=None, date_from=None):
+    """Fecha minima que pueden tener las filas del filtro (None si no hay limite inferior)."""
+    starts = [datetime.combine(date_from, time.min)] if date_from else []
+    if year:
+        starts.append(datetime(year, month or 1, 1))
+    return max(starts, default=None)
+
+def _encode_cursor(rec_date, rec_id):
+    return f"{rec_date.isoformat()}|{rec_id}"
+
+def _decode_cursor(after):
+    try:
+        rec_date, rec_id = after.rsplit("|", 1)
+        return datetime.fromisoformat(rec_date), int(rec_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _paginate(query, date_column, id_column, limit=None, after=None):
+    """Ordena por (fecha, id) descendente y aplica el cursor. Devuelve (filas, hay_mas)."""
+    if after:
+        query = query.filter(tuple_(date_column, id_column) < tuple_(*_decode_cursor(after)))
+    query = query.order_by(date_column.desc(), id_column.desc())
+    if limit is None:
+        return query.all(), False
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    rows = query.limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+# Historial caliente y archivado (ver archive.py): cada tier es (padre, items). Las consultas
+# leen el archivo solo si el rango de fechas llega a el, con un UNION ALL de ambos tiers que
+# SQLite recorre por los indices (date, id) de cada tabla.
+LAUNDRY_TIERS = ((models.Laundry, models.LaundryItem), (models.ArchivedLaundry, models.ArchivedLaundryItem))
+DELIVERY_TIERS = ((models.Delivery, models.DeliveryItem), (models.ArchivedDelivery, models.ArchivedDeliveryItem))
+
+def _with_archive(build, tiers, archived):
+    """Subconsulta con las columnas de `build(padre, items)` mas `archived`, sobre uno o ambos tiers."""
+    hot, cold = tiers
+    stmt = build(*hot).add_columns(literal(False).label("archived"))
+    if archived:
+        stmt = union_all(stmt, build(*cold).add_columns(literal(True).label("archived")))
+    return stmt.subquery()
+
+def _items_by_parent(db, rows, tiers, fk_name, *columns):
+    """Items de las filas de una pagina por id del padre; cada tier se consulta solo si aparece."""
+    by_parent = {}
+    for (_, item_model), archived in zip(tiers, (False, True)):
+        ids = [row.id for row in rows if bool(row.archived) == archived]
+        fk = getattr(item_model, fk_name)
+        for start in range(0, len(ids), MAX_PAGE_SIZE):
+            items = (
+                db.query(fk.label("parent_id"), *(getattr(item_model, column) for column in columns))
+                .filter(fk.in_(ids[start:start + MAX_PAGE_SIZE]))
+                .order_by(fk, item_model.id)
+            )
+            for item in items:
+                by_parent.setdefault(item.parent_id, []).append(item)
+    return by_parent
+
+def _laundry_sends(dni=None, month=None, year=None, date_from=None, date_to=None, archived=False):
+    def build(send, item):
+        stmt = (
+            select(send.id, send.dni, send.date)
+            .where(exists().where(item.laundry_id == send.id, item.qty > 0))
+            .where(*_date_filters(send.date, month, year, date_from, date_to))
+        )
+        if dni: stmt = stmt.where(user_search.dni_filter(send.dni, dni))
+        return stmt
+    return _with_archive(build, LAUNDRY_TIERS, archived)
+
+def laundry_report_page(db, dni=None, month=None, year=None, date_from=None, date_to=None, limit=None, after=None, archived=False):
+    sends = _laundry_sends(dni, month, year, date_from, date_to, archived)
+    page, has_more = _paginate(db.query(sends), sends.c.date, sends.c.id, limit, after)
+    if not page:
+        return [], None
+
+    # La asignacion FIFO de devoluciones ya esta guardada en laundry_items (ver laundry_allocation)
+    page_dnis = {row.dni for row in page}
+    items_by_send = _items_by_parent(db, page, LAUNDRY_TIERS, "laundry_id", "name", "qty", "returned", "last_return_date")
+    users_by_dni = {u.dni: u for u in db.query(models.User).filter(models.User.dni.in_(page_dnis))}
 
     report_data = []
-    requests_map = {} 
-    for tracker in processed_sends:
-        rid = tracker['id']
-        if rid not in requests_map: requests_map[rid] = {'dni': tracker['dni'], 'send_date': tracker['send_date'], 'trackers': []}
-        requests_map[rid]['trackers'].append(tracker)
-
-    for rid, data in requests_map.items():
-        if year and data['send_date'].year != year: continue
-        if month and data['send_date'].month != month: continue
-        user = db.query(models.User).filter(models.User.dni == data['dni']).first()
+    for row in page:
+        user = users_by_dni.get(row.dni)
         user_name = f"{user.name} {user.surname}" if user else "Desconocido"
-        
+
         all_return_dates = []
         total_qty = total_returned = 0
         items_summary = []
-        for t in data['trackers']:
-            items_summary.append(f"{t['qty']} {t['name']}")
-            total_qty += t['qty']
-            total_returned += t['returned']
-            all_return_dates.extend(t['return_dates'])
-        
+        for item in items_by_send.get(row.id, []):
+            if item.qty <= 0:
+                continue
+            items_summary.append(f"{item.qty} {item.name}")
+            total_qty += item.qty
+            total_returned += item.returned or 0
+            if item.last_return_date: all_return_dates.append(item.last_return_date)
+
         status = "Pendiente"
         return_date_str = "-"
         if total_returned >= total_qty:
@@ -407,23 +628,140 @@ def get_laundry_report(dni: str = None, month: int = None, year: int = None, db:
             status = "Parcial"
             if all_return_dates: return_date_str = f"Parcial ({max(all_return_dates).strftime('%d/%m')})"
         
-        report_data.append({"id": f"REQ-{rid}", "user": user_name, "dni": data['dni'], "items": ", ".join(items_summary), "request_date": data['send_date'].isoformat(), "return_date": return_date_str, "status": status, "sort_date": data['send_date']})
+        report_data.append({"id": f"REQ-{row.id}", "user": user_name, "dni": row.dni, "items": ", ".join(items_summary), "request_date": row.date.isoformat(), "return_date": return_date_str, "status": status, "sort_date": row.date})
+
+    next_cursor = _encode_cursor(page[-1].date, page[-1].id) if has_more else None
+    return report_data, next_cursor
+
+def _delivery_records(dni=None, month=None, year=None, date_from=None, date_to=None, archived=False):
+    # El join con users va dentro de cada rama para que SQLite pueda aplanar el UNION ALL
+    def build(delivery, _item):
+        stmt = (
+            select(delivery.id, delivery.dni, delivery.date, models.User.name, models.User.surname, models.User.contract_type)
+            .join(models.User, models.User.dni == delivery.dni)
+            .where(*_date_filters(delivery.date, month, year, date_from, date_to))
+        )
+        if dni: stmt = stmt.where(user_search.dni_filter(delivery.dni, dni))
+        return stmt
+    return _with_archive(build, DELIVERY_TIERS, archived)
+
+def _delivery_report_row(rec, items):
+    items_str = ", ".join([f"{i.qty} {i.name}" for i in items])
+    return {"id": rec.id, "user": f"{rec.name} {rec.surname}", "dni": rec.dni, "contract_type": rec.contract_type, "items": items_str, "date": rec.date.isoformat(), "sort_date": rec.date}
+
+def delivery_report_page(db, dni=None, month=None, year=None, date_from=None, date_to=None, limit=None, after=None, archived=False):
+    records = _delivery_records(dni, month, year, date_from, date_to, archived)
+    page, has_more = _paginate(db.query(records), records.c.date, records.c.id, limit, after)
+    items_by_delivery = _items_by_parent(db, page, DELIVERY_TIERS, "delivery_id", "name", "qty")
+    report_data = [_delivery_report_row(rec, items_by_delivery.get(rec.id, [])) for rec in page]
+    next_cursor = _encode_cursor(page[-1].date, page[-1].id) if has_more else None
+    return report_data, next_cursor
+
+# --- VALIDADORES DE REPORTES ---
+# El ETag de un reporte sale de una consulta de agregados sobre el mismo filtro (cantidad,
+# ultimo id y ultima fecha, resuelta con los indices de fecha) mas las versiones de lo que
+# el reporte muestra de otras tablas. Si coincide con If-None-Match el reporte no se arma.
+
+REPORT_CACHE_CONTROL = "private, no-cache"
+
+def report_etag(db, kind, query_string, filters):
+    """(etag, archived): archived indica si el rango del filtro llega a las tablas de archivo."""
+    dni, month, year, date_from, date_to = filters
+    # Sondeo por clave primaria en vez de contar las filas filtradas: el ultimo id de cada tabla
+    # (altas, devoluciones y archivado) y la version de nombres/contratos. Un cambio invalida
+    # el reporte con cualquier filtro, aunque no toque sus filas.
+    if kind == "laundry":
+        archived = archive.reaches(db, models.ArchivedLaundry, _range_start(month, year, date_from))
+        tables = (models.Laundry, models.LaundryReturn, models.ArchivedLaundry)
+    else:
+        archived = archive.reaches(db, models.ArchivedDelivery, _range_start(month, year, date_from))
+        tables = (models.Delivery, models.ArchivedDelivery)
+    fingerprint = db.execute(select(*(select(func.max(m.id)).scalar_subquery() for m in tables),
+                                    data_version.version_query(data_version.USERS))).one()
+    payload = json.dumps([kind, query_string, list(fingerprint)], default=str)
+    return f'"{kind}-{hashlib.sha256(payload.encode()).hexdigest()[:32]}"', archived
+
+# --- EXPORTACION EN STREAMING ---
+# format=csv|ndjson devuelve el reporte completo (desde `after`, sin `limit`) como un
+# StreamingResponse: las filas salen por bloques y la memoria no crece con el historial.
+# Los generadores abren su propia sesion porque se consumen despues de salir del endpoint.
+
+STREAM_CHUNK = 500
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+LAUNDRY_EXPORT_COLUMNS = ["id", "user", "dni", "items", "request_date", "return_date", "status"]
+DELIVERY_EXPORT_COLUMNS = ["id", "user", "dni", "contract_type", "items", "date"]
+
+def _report_page(page_fn, *args):
+    # Las consultas del reporte son ORM sincronas: corren en el threadpool con su propia sesion
+    # para no bloquear el event loop mientras se arma la pagina (o el reporte entero sin limit)
+    with SessionLocal() as db:
+        return page_fn(db, *args)
+
+def _iter_report(page_fn, filters, after=None, archived=False):
+    db = SessionLocal()
+    try:
+        while True:
+            rows, after = page_fn(db, *filters, limit=STREAM_CHUNK, after=after, archived=archived)
+            yield rows
+            if not after:
+                break
+            db.expunge_all()
+    finally:
+        db.close()
 
-    report_data.sort(key=lambda x: x['sort_date'], reverse=True)
+def _encode_export(chunks, columns, export_format):
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in chunks:
+            writer.writerows([row[c] for c in columns] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        for rows in chunks:
+            yield "".join(json.dumps({c: row[c] for c in columns}, ensure_ascii=False) + "\n" for row in rows)
+
+def _export_response(chunks, columns, export_format, filename):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be json, csv or ndjson")
+    return StreamingResponse(_encode_export(chunks, columns, export_format), media_type=EXPORT_FORMATS[export_format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'})
+
+@app.get("/api/laundry/report")
+async def get_laundry_report(request: Request, response: Response, dni: str = None, month: int = None, year: int = None, date_from: date = None, date_to: date = None,
+                             limit: int = None, after: str = None, format: str = "json", db: AsyncSession = Depends(get_async_db)):
+    filters = (dni, month, year, date_from, date_to)
+    etag, archived = await db.run_sync(report_etag, "laundry", request.url.query, filters)
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if format != "json":
+        if after: _decode_cursor(after)
+        export = _export_response(_iter_report(laundry_report_page, filters, after, archived), LAUNDRY_EXPORT_COLUMNS, format, "reporte_lavanderia")
+        export.headers.update(headers)
+        return export
+    response.headers.update(headers)
+    report_data, next_cursor = await run_in_threadpool(_report_page, laundry_report_page, dni, month, year, date_from, date_to, limit, after, archived)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
     return report_data
 
 @app.get("/api/delivery/report")
-def get_delivery_report(dni: str = None, month: int = None, year: int = None, db: Session = Depends(get_db)):
-    query = db.query(models.Delivery)
-    if dni: query = query.filter(models.Delivery.dni.contains(dni))
-    records = query.all()
-    report_data = []
-    for rec in records:
-        if year and rec.date.year != year: continue
-        if month and rec.date.month != month: continue
-        user = db.query(models.User).filter(models.User.dni == rec.dni).first()
-        if not user: continue
-        items_str = ", ".join([f"{i['qty']} {i['name']}" for i in json.loads(rec.items_json)])
-        report_data.append({"id": rec.id, "user": f"{user.name} {user.surname}", "dni": rec.dni, "contract_type": user.contract_type, "items": items_str, "date": rec.date.isoformat(), "sort_date": rec.date})
-    report_data.sort(key=lambda x: x['sort_date'], reverse=True)
-    return report_data
\ No newline at end of file
+async def get_delivery_report(request: Request, response: Response, dni: str = None, month: int = None, year: int = None, date_from: date = None, date_to: date = None,
+                              limit: int = None, after: str = None, format: str = "json", db: AsyncSession = Depends(get_async_db)):
+    filters = (dni, month, year, date_from, date_to)
+    etag, archived = await db.run_sync(report_etag, "delivery", request.url.query, filters)
+    headers = {"ETag": etag, "Cache-Control": REPORT_CACHE_CONTROL}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if format != "json":
+        if after: _decode_cursor(after)
+        export = _export_response(_iter_report(delivery_report_page, filters, after, archived), DELIVERY_EXPORT_COLUMNS, format, "reporte_entregas")
+        export.headers.update(headers)
+        return export
+    response.headers.update(headers)
+    report_data, next_cursor = await run_in_threadpool(_report_page, delivery_report_page, dni, month, year, date_from, date_to, limit, after, archived)
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return report_data
@@ -0,0 +1,147 @@
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+from database import async_engine, engine, write_engine
+
+# Metricas en memoria del proceso, expuestas en formato de texto de Prometheus (/metrics).
+# Con gunicorn cada worker tiene las suyas: Prometheus debe scrapear cada worker o agregar
+# por instancia. Sin dependencias: solo histogramas y contadores con etiquetas.
+
+logger = logging.getLogger(__name__)
+
+# Peticiones mas lentas que esto (ms) se registran con sus sentencias SQL; 0 lo desactiva
+SLOW_REQUEST_MS = float(os.environ.get("ROPERIA_SLOW_REQUEST_MS", "0"))
+MAX_LOGGED_STATEMENTS = 50
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._series.items())
+        for key, (counts, total, count) in items:
+            labels = ",".join(f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key))
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+HTTP_LATENCY = Histogram("roperia_http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta.", ("method", "route", "status"))
+SQL_STATEMENTS = Histogram("roperia_sql_statements_per_request", "Sentencias SQL ejecutadas por peticion.", ("method", "route"), COUNT_BUCKETS)
+SQL_TIME = Histogram("roperia_sql_duration_seconds_per_request", "Tiempo total en SQL por peticion.", ("method", "route"))
+PDF_RENDER = Histogram("roperia_pdf_generate_seconds", "Duracion del render de un acta vista desde el proceso principal (result=rendered|cached|failed).", ("result",))
+PDF_JOB = Histogram("roperia_pdf_job_seconds", "Tiempo de un acta en la cola de render, de submit a terminado.", ("outcome",))
+REGISTRY = (HTTP_LATENCY, SQL_STATEMENTS, SQL_TIME, PDF_RENDER, PDF_JOB)
+
+def render():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+# --- SQL POR PETICION ---
+# La peticion en curso vive en un ContextVar: los endpoints sync corren en el threadpool con
+# una copia del contexto y las lecturas async disparan los eventos desde el mismo contexto.
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "captured")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.captured = []
+
+_current = contextvars.ContextVar("roperia_request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("roperia_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["roperia_query_start"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.statements += 1
+    stats.sql_seconds += elapsed
+    if SLOW_REQUEST_MS and len(stats.captured) < MAX_LOGGED_STATEMENTS:
+        stats.captured.append((elapsed, statement))
+
+def _handle_error(context):
+    starts = context.connection.info.get("roperia_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+for _engine in {id(e): e for e in (engine, write_engine, async_engine.sync_engine)}.values():
+    event.listen(_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine, "handle_error", _handle_error)
+
+def _record(request, status, started, stats):
+    elapsed = time.perf_counter() - started
+    # Plantilla de la ruta (/api/users/{dni}), no la URL: evita una serie por DNI
+    route = getattr(request.scope.get("route"), "path", None) or "unmatched"
+    HTTP_LATENCY.observe(elapsed, method=request.method, route=route, status=status)
+    SQL_STATEMENTS.observe(stats.statements, method=request.method, route=route)
+    SQL_TIME.observe(stats.sql_seconds, method=request.method, route=route)
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        logger.warning("Peticion lenta %s %s -> %s: %.1f ms, %d sentencias SQL (%.1f ms)\n%s",
+                       request.method, request.url.path, status, elapsed * 1000, stats.statements, stats.sql_seconds * 1000,
+                       "\n".join(f"  {seconds * 1000:7.2f} ms  {' '.join(statement.split())[:500]}" for seconds, statement in stats.captured))
+
+async def middleware(request, call_next):
+    stats = RequestStats()
+    token = _current.set(stats)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        _record(request, 500, started, stats)
+        raise
+    finally:
+        _current.reset(token)
+
+    # Se registra al terminar de enviar el cuerpo: los StreamingResponse (exportaciones, SSE,
+    # ZIP del lote) hacen su trabajo y sus consultas mientras se transmiten. Las consultas
+    # del stream siguen sumando en `stats` (el contexto de la app se copio con el valor puesto).
+    body = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            _record(request, response.status_code, started, stats)
+
+    response.body_iterator = timed_body()
+    return response
@@ -0,0 +1,114 @@
+import argparse
+import json
+import logging
+
+from sqlalchemy import exists, inspect, text
+
+from database import SessionLocal, engine
+import models
+import entitlements
+import laundry_allocation
+import laundry_balance
+import rollups
+import user_search
+
+# Migraciones de datos idempotentes. Se ejecutan al arrancar la API (despues de create_all)
+# y tambien se pueden lanzar a mano: `python migrations.py`.
+
+LINE_ITEM_TABLES = (
+    (models.Delivery, models.DeliveryItem, "delivery_id"),
+    (models.Laundry, models.LaundryItem, "laundry_id"),
+    (models.LaundryReturn, models.LaundryReturnItem, "return_id"),
+)
+
+CHUNK_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+def _legacy_items(items_json):
+    """[(nombre, cantidad)] de un items_json heredado; None si no se puede leer."""
+    try:
+        return [(item['name'], int(item['qty'])) for item in json.loads(items_json or "[]")]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+def backfill_line_items(db):
+    """Crea las filas de detalle a partir de items_json para los registros que aun no las tienen.
+    Un items_json ilegible se registra y se saltea: no debe impedir que arranque la API."""
+    inserted = 0
+    for parent, item_model, fk_name in LINE_ITEM_TABLES:
+        fk = getattr(item_model, fk_name)
+        missing = (
+            db.query(parent.id, parent.dni, parent.date, parent.items_json)
+            .filter(~exists().where(fk == parent.id))
+            .order_by(parent.id)
+        )
+        rows = []
+        for parent_id, dni, date, items_json in missing.yield_per(CHUNK_SIZE):
+            items = _legacy_items(items_json)
+            if items is None:
+                logger.warning("items_json invalido en %s %s: %r", parent.__tablename__, parent_id, items_json)
+                continue
+            for name, qty in items:
+                rows.append({fk_name: parent_id, "dni": dni, "name": name, "qty": qty, "date": date})
+            if len(rows) >= CHUNK_SIZE:
+                db.execute(item_model.__table__.insert(), rows)
+                inserted += len(rows)
+                rows = []
+        if rows:
+            db.execute(item_model.__table__.insert(), rows)
+            inserted += len(rows)
+    db.commit()
+    return inserted
+
+def ensure_columns(db):
+    """create_all tampoco agrega columnas nuevas: ALTER TABLE para las que falten."""
+    bind = db.get_bind()
+    inspector = inspect(bind)
+    for table in models.Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=bind.dialect)
+                db.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    # Actas generadas antes de la cola de render
+    db.query(models.Delivery).filter(models.Delivery.pdf_status.is_(None)).update({"pdf_status": "ready"}, synchronize_session=False)
+    db.commit()
+
+def ensure_indexes(db):
+    """create_all no agrega indices nuevos a tablas que ya existen; esto si."""
+    bind = db.get_bind()
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+
+def run_migrations(db):
+    ensure_columns(db)
+    ensure_indexes(db)
+    backfill_line_items(db)
+    laundry_allocation.ensure_allocations(db)
+    laundry_balance.ensure_balances(db)
+    entitlements.ensure_entitlements(db)
+    user_search.ensure_index(db)
+    rollups.ensure_rollups(db)
+
+def main():
+    argparse.ArgumentParser(description="Aplica las migraciones de datos sobre roperia.db.").parse_args()
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        ensure_columns(db)
+        ensure_indexes(db)
+        print(f"Filas de detalle creadas: {backfill_line_items(db)}")
+        laundry_allocation.ensure_allocations(db)
+        laundry_balance.ensure_balances(db)
+        entitlements.ensure_entitlements(db)
+        user_search.ensure_index(db)
+        rollups.ensure_rollups(db)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
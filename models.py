@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, LargeBinary, Index, UniqueConstraint, ForeignKey, text
+from sqlalchemy.orm import relationship
 from database import Base
 
 class User(Base):
@@ -16,8 +17,19 @@ class Delivery(Base):
     id = Column(Integer, primary_key=True, index=True)
     dni = Column(String, index=True) # Linked to User DNI
     date = Column(DateTime)
-    items_json = Column(Text) # JSON string of items
+    items_json = Column(Text) # JSON string of items (kept for API compatibility, see DeliveryItem)
     pdf_path = Column(String)
+    pdf_status = Column(String, index=True) # "pending", "ready", "failed" (see pdf_actas)
+    pdf_attempts = Column(Integer, default=0)
+    pdf_error = Column(Text)
+    pdf_claimed_at = Column(DateTime) # when a worker last queued the render (see pdf_actas.PDF_LEASE)
+
+    items = relationship("DeliveryItem", order_by="DeliveryItem.id", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_deliveries_dni_date", "dni", "date"),
+        Index("ix_deliveries_date_id", "date", "id"),
+    )
 
 class Laundry(Base):
     __tablename__ = "laundry"
@@ -27,6 +39,13 @@ class Laundry(Base):
     date = Column(DateTime)
     items_json = Column(Text)
 
+    items = relationship("LaundryItem", order_by="LaundryItem.id", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_laundry_dni_date", "dni", "date"),
+        Index("ix_laundry_date_id", "date", "id"),
+    )
+
 class LaundryReturn(Base):
     __tablename__ = "laundry_returns"
 
@@ -35,3 +54,237 @@ class LaundryReturn(Base):
     date = Column(DateTime)
     items_json = Column(Text)
 
+    items = relationship("LaundryReturnItem", order_by="LaundryReturnItem.id", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_laundry_returns_dni_date", "dni", "date"),
+        Index("ix_laundry_returns_date_id", "date", "id"),
+    )
+
+# Line items: one row per item of a delivery / laundry send / laundry return.
+# dni and date are copied from the parent so per-worker, per-item queries hit a single index.
+
+class DeliveryItem(Base):
+    __tablename__ = "delivery_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+
+    __table_args__ = (Index("ix_delivery_items_dni_name_date", "dni", "name", "date"),)
+
+class LaundryItem(Base):
+    __tablename__ = "laundry_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    laundry_id = Column(Integer, ForeignKey("laundry.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+    returned = Column(Integer, default=0) # quantity already matched by returns (see LaundryAllocation)
+    last_return_date = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_laundry_items_dni_name_date", "dni", "name", "date"),
+        # Partial index: sends with garments still to be returned, in FIFO order
+        Index("ix_laundry_items_open", "dni", "name", "date", "id", sqlite_where=text("returned < qty")),
+    )
+
+class LaundryReturnItem(Base):
+    __tablename__ = "laundry_return_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    return_id = Column(Integer, ForeignKey("laundry_returns.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+
+    __table_args__ = (Index("ix_laundry_return_items_dni_name_date", "dni", "name", "date"),)
+
+# FIFO allocation of each returned quantity to the earliest open send of the same item,
+# computed once when the return is registered.
+class LaundryAllocation(Base):
+    __tablename__ = "laundry_allocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    return_item_id = Column(Integer, ForeignKey("laundry_return_items.id"), index=True)
+    laundry_item_id = Column(Integer, ForeignKey("laundry_items.id"), index=True)
+    laundry_id = Column(Integer, index=True)
+    return_id = Column(Integer, index=True)
+    qty = Column(Integer)
+    date = Column(DateTime) # return date
+
+class LaundryBalance(Base):
+    __tablename__ = "laundry_balances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dni = Column(String, index=True)
+    item_name = Column(String)
+    sent = Column(Integer, default=0)
+    returned = Column(Integer, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("dni", "item_name", name="uq_laundry_balances_dni_item"),
+        # Partial index: only rows with garments still at the laundry
+        Index("ix_laundry_balances_pending", "dni", sqlite_where=text("sent > returned")),
+    )
+
+# Yearly allotment per contract type and item, seeded from contracts.CONTRACT_ITEMS
+class EntitlementCatalog(Base):
+    __tablename__ = "entitlement_catalog"
+
+    id = Column(Integer, primary_key=True, index=True)
+    contract_type = Column(String)
+    item_name = Column(String)
+    qty = Column(Integer) # per period
+
+    __table_args__ = (UniqueConstraint("contract_type", "item_name", name="uq_entitlement_catalog_contract_item"),)
+
+# Quantity already issued to each worker per period (year), updated with every delivery
+class EntitlementLedger(Base):
+    __tablename__ = "entitlement_ledger"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dni = Column(String)
+    period = Column(String) # "2026"
+    item_name = Column(String)
+    issued = Column(Integer, default=0)
+
+    __table_args__ = (UniqueConstraint("dni", "period", "item_name", name="uq_entitlement_ledger_dni_period_item"),)
+
+# Monotonic counter per data set, bumped in the same transaction as every write that
+# changes it. Shared by all workers through the database (see data_version.py).
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+
+# Pre-aggregated totals for /api/analytics, updated in the same transaction as each write
+# (see rollups.py). period is "2026-03" for monthly metrics and "2026-W09" (ISO week) for weekly.
+class Rollup(Base):
+    __tablename__ = "rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    metric = Column(String) # "issued", "deliveries", "laundry_sent", "laundry_returned"
+    period = Column(String)
+    contract_type = Column(String, default="")
+    item_name = Column(String, default="")
+    value = Column(Integer, default=0)
+
+    __table_args__ = (UniqueConstraint("metric", "period", "contract_type", "item_name", name="uq_rollups_metric_period_contract_item"),)
+
+# Append-only feed of every write, for clients that keep a local copy (/api/changes).
+# AUTOINCREMENT keeps ids monotonic even after old events are pruned (see change_log.py).
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String) # "user", "delivery", "laundry", "laundry_return"
+    entity_id = Column(Integer)
+    dni = Column(String)
+    date = Column(DateTime)
+    payload = Column(Text) # JSON with the written data
+
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# Responses of POST requests sent with an Idempotency-Key header, replayed when a client
+# retries the same request (see idempotency.py). Rows expire after ROPERIA_IDEMPOTENCY_TTL_HOURS.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String) # sha256 of method, path, query string and body
+    status = Column(String) # "pending" while the first request runs, then "done"
+    status_code = Column(Integer)
+    headers = Column(Text) # JSON list of [name, value]
+    body = Column(LargeBinary) # NULL when the response was streamed or too large to store
+    created_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True)
+
+# --- Archive ---
+# Cold copies of deliveries and closed laundry cycles moved out of the hot tables by
+# archive.py. Same columns and same ids as the hot rows, so reports can UNION both tiers.
+
+class ArchivedDelivery(Base):
+    __tablename__ = "archived_deliveries"
+
+    id = Column(Integer, primary_key=True)
+    dni = Column(String, index=True)
+    date = Column(DateTime)
+    items_json = Column(Text)
+    pdf_path = Column(String)
+    pdf_status = Column(String)
+    pdf_attempts = Column(Integer, default=0)
+    pdf_error = Column(Text)
+    pdf_claimed_at = Column(DateTime)
+
+    items = relationship("ArchivedDeliveryItem", order_by="ArchivedDeliveryItem.id")
+
+    __table_args__ = (Index("ix_archived_deliveries_date_id", "date", "id"),)
+
+class ArchivedDeliveryItem(Base):
+    __tablename__ = "archived_delivery_items"
+
+    id = Column(Integer, primary_key=True)
+    delivery_id = Column(Integer, ForeignKey("archived_deliveries.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+
+class ArchivedLaundry(Base):
+    __tablename__ = "archived_laundry"
+
+    id = Column(Integer, primary_key=True)
+    dni = Column(String, index=True)
+    date = Column(DateTime)
+    items_json = Column(Text)
+
+    __table_args__ = (Index("ix_archived_laundry_date_id", "date", "id"),)
+
+class ArchivedLaundryItem(Base):
+    __tablename__ = "archived_laundry_items"
+
+    id = Column(Integer, primary_key=True)
+    laundry_id = Column(Integer, ForeignKey("archived_laundry.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+    returned = Column(Integer, default=0)
+    last_return_date = Column(DateTime)
+
+class ArchivedLaundryReturn(Base):
+    __tablename__ = "archived_laundry_returns"
+
+    id = Column(Integer, primary_key=True)
+    dni = Column(String, index=True)
+    date = Column(DateTime)
+    items_json = Column(Text)
+
+class ArchivedLaundryReturnItem(Base):
+    __tablename__ = "archived_laundry_return_items"
+
+    id = Column(Integer, primary_key=True)
+    return_id = Column(Integer, ForeignKey("archived_laundry_returns.id"), index=True)
+    dni = Column(String)
+    name = Column(String)
+    qty = Column(Integer)
+    date = Column(DateTime)
+
+class ArchivedLaundryAllocation(Base):
+    __tablename__ = "archived_laundry_allocations"
+
+    id = Column(Integer, primary_key=True)
+    return_item_id = Column(Integer)
+    laundry_item_id = Column(Integer)
+    laundry_id = Column(Integer)
+    return_id = Column(Integer, index=True)
+    qty = Column(Integer)
+    date = Column(DateTime)
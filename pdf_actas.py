@@ -0,0 +1,543 @@
+import asyncio
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import PIL
+from PIL import Image
+import reportlab
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+from sqlalchemy import or_
+
+from database import SessionLocal
+import metrics
+import models
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo locks dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Configuración de directorios para PDFs
+PDF_DIR = os.environ.get("ROPERIA_PDF_DIR", "deliveries_pdf")
+os.makedirs(PDF_DIR, exist_ok=True)
+
+# Procesos dedicados al render de actas. Con 0 se renderiza en el mismo hilo (desarrollo/tests).
+PDF_WORKERS = int(os.environ.get("ROPERIA_PDF_WORKERS", "2"))
+PDF_MAX_ATTEMPTS = int(os.environ.get("ROPERIA_PDF_MAX_ATTEMPTS", "3"))
+# Un acta pendiente reclamada hace mas que esto quedo huerfana (su worker murio) y se reencola
+PDF_LEASE = timedelta(seconds=float(os.environ.get("ROPERIA_PDF_LEASE_SECONDS", "300")))
+
+PDF_PENDING = "pending"
+PDF_READY = "ready"
+PDF_FAILED = "failed"
+
+# --- PLANTILLA DEL ACTA ---
+# Todo lo que no depende de la entrega (logo, titulo, recuadros, firmas) se prepara una
+# vez por proceso y se dibuja como un form XObject; cada acta solo estampa sus datos.
+
+# Nota: en Render la ruta debe ser relativa al servidor, ej: "frontend/logo.png"
+LOGO_PATH = "frontend/logo.png"
+LOGO_WIDTH = 120
+TEMPLATE_FORM = "actaTemplate"
+
+# Streams binarios en lugar de ASCII85: el codificador A85 de reportlab es Python puro
+# y era la mayor parte del tiempo de cada acta.
+rl_config.useA85 = 0
+
+ACTA_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.navy),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (1, 0), (1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.whitesmoke),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+# Resultado de _logo para un archivo que no se puede leer: el acta sale con texto de respaldo
+LOGO_UNREADABLE = "unreadable"
+
+@functools.lru_cache(maxsize=None)
+def _logo():
+    """Decodifica el logo una sola vez por proceso.
+
+    Se aplana sobre blanco y se guarda como JPEG en el directorio temporal: reportlab
+    incrusta un JPEG sin recomprimirlo, mientras que un PNG se decodifica y comprime de
+    nuevo en cada documento. Devuelve (ruta, ancho, alto, hash), None si no hay logo o
+    LOGO_UNREADABLE si no se puede leer: el fallo tambien queda cacheado (un solo log).
+    """
+    if not os.path.exists(LOGO_PATH):
+        return None
+    try:
+        return _convert_logo()
+    except Exception:
+        logger.exception("No se pudo cargar el logo %s", LOGO_PATH)
+        return LOGO_UNREADABLE
+
+def _convert_logo():
+    with open(LOGO_PATH, "rb") as f:
+        raw = f.read()
+    image = Image.open(io.BytesIO(raw))
+    iw, ih = image.size
+    digest = hashlib.sha256(raw).hexdigest()[:16]
+    cached = os.path.join(tempfile.gettempdir(), f"roperia-logo-{digest}.jpg")
+    if not os.path.exists(cached):
+        image = image.convert("RGBA")
+        flat = Image.new("RGB", image.size, "white")
+        flat.paste(image, mask=image.getchannel("A"))
+        tmp = f"{cached}.{os.getpid()}"
+        flat.save(tmp, "JPEG", quality=95)
+        os.replace(tmp, cached)
+    return cached, LOGO_WIDTH, LOGO_WIDTH * ih / float(iw), digest
+
+def _draw_template(c):
+    """Define (una vez por documento) el form con la parte fija del acta."""
+    width, height = letter
+    c.beginForm(TEMPLATE_FORM)
+
+    # --- Header ---
+    logo = _logo()
+    if logo == LOGO_UNREADABLE:
+        c.drawString(40, height - 100, "SODEXO")
+    elif logo:
+        logo_file, draw_width, draw_height, _ = logo
+        c.drawImage(logo_file, 40, height - 50 - draw_height, width=draw_width, height=draw_height, mask='auto', preserveAspectRatio=True)
+
+    c.setFont("Helvetica-Bold", 16)
+    c.drawCentredString(width / 2, height - 120, "ACTA DE ENTREGA DE UNIFORMES Y EPP")
+
+    y_info = height - 180
+    c.setLineWidth(1)
+    c.setStrokeColor(colors.lightgrey)
+    c.rect(50, y_info - 60, width - 100, 70, fill=0)
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(60, y_info - 20, "DATOS DEL TRABAJADOR:")
+
+    y_sig = 150
+    c.setFont("Helvetica", 9)
+    c.drawString(50, y_sig + 60, "Declaro haber recibido a mi entera satisfacción los bienes arriba descritos.")
+    c.line(100, y_sig, 250, y_sig)
+    c.drawCentredString(175, y_sig - 15, "ENTREGADO POR")
+    c.drawCentredString(175, y_sig - 30, "LOGÍSTICA / ROPERÍA")
+
+    c.line(350, y_sig, 500, y_sig)
+    c.drawCentredString(425, y_sig - 15, "RECIBIDO POR")
+
+    c.endForm()
+
+def draw_acta(c, delivery_id, user, items, delivery_date):
+    """Dibuja un acta en la pagina actual de `c` (una pagina por entrega)."""
+    width, height = letter
+    if not c.hasForm(TEMPLATE_FORM):
+        _draw_template(c)
+    c.doForm(TEMPLATE_FORM)
+
+    c.setFont("Helvetica", 10)
+    c.drawRightString(width - 50, height - 60, f"Acta N°: {delivery_id:06d}")
+    c.drawRightString(width - 50, height - 75, f"Fecha: {delivery_date.strftime('%Y-%m-%d')}")
+
+    y_info = height - 180
+    c.drawString(60, y_info - 40, f"Nombre Completo: {user.name} {user.surname}")
+    c.drawString(300, y_info - 40, f"DNI: {user.dni}")
+    c.drawString(60, y_info - 55, f"Contratación: {user.contract_type}    Talla: {user.size if hasattr(user, 'size') else '-'}")
+
+    y_table = y_info - 100
+    data = [["Item / Descripción", "Cantidad"]]
+    for item in items:
+        data.append([item['name'], str(item['qty'])])
+
+    table = Table(data, colWidths=[350, 100], style=ACTA_TABLE_STYLE)
+    w, h = table.wrap(width, height)
+    table.drawOn(c, 80, y_table - h)
+
+    y_sig = 150
+    c.setFont("Helvetica", 9)
+    c.drawCentredString(425, y_sig - 30, f"{user.name} {user.surname}")
+    c.drawCentredString(425, y_sig - 45, f"DNI: {user.dni}")
+
+# --- CACHE DE ACTAS EN DISCO ---
+# deliveries_pdf/ es solo una cache: el acta se identifica por el hash de lo que se imprime
+# (acta-<hash>.pdf), el render es determinista (invariant=1) y cualquier acta que falte se
+# vuelve a generar desde la base de datos, byte a byte igual. El directorio se limita a
+# ROPERIA_PDF_CACHE_MB y se desalojan primero las actas usadas hace mas tiempo (mtime).
+
+ACTA_TEMPLATE_VERSION = "1"  # subir si cambia el diseño del acta
+# Otra version de reportlab (o de Pillow, que convierte el logo) puede cambiar los bytes del
+# PDF: entra en la clave para que el ETag fuerte siga correspondiendo a un archivo exacto
+RENDERER_VERSION = f"reportlab {reportlab.Version}, Pillow {PIL.__version__}"
+PDF_CACHE_MAX_BYTES = int(float(os.environ.get("ROPERIA_PDF_CACHE_MB", "512")) * 1024 * 1024)
+EVICT_GRACE_SECONDS = 60  # no borrar actas recien servidas o generadas
+_LOCK_STRIPES = 64
+
+_stripe_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+_cache_lock = threading.Lock()
+_cache_bytes = None
+
+def _logo_digest():
+    logo = _logo()
+    return logo[3] if logo and logo != LOGO_UNREADABLE else logo
+
+def acta_key(delivery_id, user, items, delivery_date):
+    payload = json.dumps({
+        "template": ACTA_TEMPLATE_VERSION,
+        "renderer": RENDERER_VERSION,
+        "logo": _logo_digest(),
+        "id": delivery_id,
+        "user": [user.dni, user.name, user.surname, user.contract_type, getattr(user, 'size', None)],
+        "items": [[item['name'], item['qty']] for item in items],
+        "date": delivery_date.strftime('%Y-%m-%d'),
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+def acta_path(key):
+    return os.path.join(PDF_DIR, f"acta-{key}.pdf")
+
+def touch(path):
+    """Marca el acta como usada (LRU por mtime). False si ya no esta en disco."""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def _render_lock(key):
+    """Un solo render por acta: lock por hilo y, donde hay fcntl, tambien entre procesos."""
+    stripe = int(key[:8], 16) % _LOCK_STRIPES
+    with _stripe_locks[stripe]:
+        if fcntl is None:
+            yield
+            return
+        lock_dir = os.path.join(PDF_DIR, ".locks")
+        os.makedirs(lock_dir, exist_ok=True)
+        with open(os.path.join(lock_dir, f"{stripe:02d}.lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+def _scan_cache():
+    entries = []
+    for entry in os.scandir(PDF_DIR):
+        if entry.is_file() and entry.name.endswith(".pdf"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    return entries
+
+def _account(size):
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_cache())
+        else:
+            _cache_bytes += size
+        over_limit = _cache_bytes > PDF_CACHE_MAX_BYTES
+    if over_limit:
+        evict_cache()
+
+def evict_cache(max_bytes=None):
+    """Borra las actas menos usadas hasta dejar la cache por debajo del 90% del limite."""
+    global _cache_bytes
+    max_bytes = PDF_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = _scan_cache()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    now = time.time()
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes * 0.9:
+            break
+        if now - mtime < EVICT_GRACE_SECONDS:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    with _cache_lock:
+        _cache_bytes = total
+    return removed
+
+def generate_pdf(delivery_id, user, items, delivery_date):
+    # Corre en los procesos del pool: las metricas (PDF_RENDER, PDF_JOB) se miden en el padre
+    key = acta_key(delivery_id, user, items, delivery_date)
+    filepath = acta_path(key)
+    if touch(filepath):
+        return filepath
+
+    with _render_lock(key):
+        # Otro hilo o proceso pudo generarla mientras esperabamos el lock
+        if touch(filepath):
+            return filepath
+        tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        c = canvas.Canvas(tmp_path, pagesize=letter, invariant=1)
+        draw_acta(c, delivery_id, user, items, delivery_date)
+        c.save()
+        os.replace(tmp_path, filepath)
+
+    _account(os.path.getsize(filepath))
+    return filepath
+
+def render_acta(delivery_id, user_data, items, delivery_date):
+    """Punto de entrada del proceso hijo: solo recibe datos planos (serializables)."""
+    return generate_pdf(delivery_id, SimpleNamespace(**user_data), items, delivery_date)
+
+def render_key(delivery_id, user_data, items, delivery_date):
+    """acta_key con los argumentos de render_acta."""
+    return acta_key(delivery_id, SimpleNamespace(**user_data), items, delivery_date)
+
+def render_merged(batch):
+    """Todas las actas en un solo PDF (una pagina por entrega) para imprimir de una vez."""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    for delivery_id, data, items, delivery_date in batch:
+        draw_acta(c, delivery_id, SimpleNamespace(**data), items, delivery_date)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+class _ZipStream:
+    """Destino de zipfile que acumula lo escrito para ir entregandolo por trozos."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+def stream_zip(files):
+    """Genera un ZIP de [(nombre, ruta)] sin armarlo entero en memoria ni en disco."""
+    out = _ZipStream()
+    archive = zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED)  # los PDF ya van comprimidos
+    for arcname, path in files:
+        archive.write(path, arcname)
+        yield from out.drain()
+    archive.close()
+    yield from out.drain()
+
+def render_args(db, delivery):
+    """Argumentos de render_acta a partir de la fila; None si el trabajador ya no existe."""
+    user = db.query(models.User).filter(models.User.dni == delivery.dni).first()
+    if not user:
+        return None
+    return delivery.id, user_data(user), [{"name": i.name, "qty": i.qty} for i in delivery.items], delivery.date
+
+def _legacy_path(delivery):
+    """Ruta de un acta con nombre anterior al cache (sin hash) que sigue en disco, o None."""
+    path = delivery.pdf_path
+    if path and not os.path.basename(path).startswith("acta-") and touch(path):
+        return path
+    return None
+
+def delivery_etag(delivery, args):
+    """ETag fuerte del acta sin generarla ni leerla: su clave de cache (ver acta_key).
+    None para un acta anterior al cache, que se hashea al servirla (pdf_etag)."""
+    return None if _legacy_path(delivery) else f'"{render_key(*args)}"'
+
+async def ensure_delivery_pdf_async(db, delivery, args=None):
+    """Ruta del acta en disco, regenerandola si fue desalojada (o perdida en un redeploy); el
+    render va al pool sin bloquear el event loop. Con `args` (de render_args) sirve el acta de la clave actual, la misma de delivery_etag."""
+    if args is None:
+        if delivery.pdf_path and touch(delivery.pdf_path):
+            return delivery.pdf_path
+        args = await db.run_sync(lambda session: render_args(session, delivery))
+        if args is None:
+            return None
+    else:
+        legacy = _legacy_path(delivery)
+        if legacy:
+            return legacy
+    path = acta_path(render_key(*args))
+    if not touch(path):
+        path = await pdf_queue.render_async(args)
+    if path != delivery.pdf_path:
+        delivery.pdf_path = path
+        await db.commit()
+    return path
+
+def pdf_etag(path):
+    """ETag fuerte del acta. El nombre del cache ya es el hash de su contenido (ver acta_key);
+    las actas con nombre anterior al cache se hashean leyendo el archivo."""
+    name = os.path.basename(path)
+    if name.startswith("acta-") and name.endswith(".pdf"):
+        return f'"{name[len("acta-"):-len(".pdf")]}"'
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+def user_data(user):
+    return {"dni": user.dni, "name": user.name, "surname": user.surname, "contract_type": user.contract_type}
+
+def _update_delivery(delivery_id, **fields):
+    with SessionLocal() as db:
+        db.query(models.Delivery).filter(models.Delivery.id == delivery_id).update(fields, synchronize_session=False)
+        db.commit()
+
+def _orphaned(now):
+    return (models.Delivery.pdf_status == PDF_PENDING) & or_(models.Delivery.pdf_claimed_at.is_(None), models.Delivery.pdf_claimed_at <= now - PDF_LEASE)
+
+class PdfRenderQueue:
+    """Cola de render de actas sobre un pool de procesos.
+
+    El estado de cada acta vive en la fila de Delivery (pdf_status, pdf_attempts, pdf_error),
+    asi que cualquier worker de gunicorn puede responder por ella.
+    """
+
+    def __init__(self, workers=PDF_WORKERS, max_attempts=PDF_MAX_ATTEMPTS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def render(self, args):
+        """Future con la ruta del acta (ya resuelto si esta en cache o si no hay workers).
+
+        PDF_RENDER se observa aqui, en el proceso principal: lo observado dentro de los
+        procesos del pool no llega a /metrics. Incluye la espera por un proceso libre.
+        """
+        started = time.perf_counter()
+        future = Future()
+        path = acta_path(render_key(*args))
+        if touch(path):
+            # Ya en disco: ni siquiera se pasa por el pool
+            future.set_result(path)
+            metrics.PDF_RENDER.observe(time.perf_counter() - started, result="cached")
+            return future
+        if self.workers <= 0:
+            try:
+                future.set_result(render_acta(*args))
+            except Exception as e:
+                future.set_exception(e)
+        else:
+            future = self._get_executor().submit(render_acta, *args)
+        future.add_done_callback(lambda f: metrics.PDF_RENDER.observe(
+            time.perf_counter() - started, result="failed" if f.cancelled() or f.exception() else "rendered"))
+        return future
+
+    async def render_async(self, args):
+        """render esperado desde el event loop (sin workers, en un hilo aparte)."""
+        if self.workers <= 0:
+            return await asyncio.to_thread(lambda: self.render(args).result())
+        return await asyncio.wrap_future(self.render(args))
+
+    def submit(self, delivery_id, user_data, items, delivery_date, attempt=1):
+        _update_delivery(delivery_id, pdf_status=PDF_PENDING, pdf_attempts=attempt, pdf_claimed_at=datetime.now())
+        args = (delivery_id, user_data, items, delivery_date)
+        started = time.perf_counter()
+        self.render(args).add_done_callback(lambda f: self._on_result(f, args, attempt, started))
+
+    def submit_delivery(self, db, delivery):
+        """Reencola un acta a partir de la fila de la base de datos."""
+        args = render_args(db, delivery)
+        if args is None:
+            _update_delivery(delivery.id, pdf_status=PDF_FAILED, pdf_error="User not found")
+            return
+        self.submit(*args, attempt=(delivery.pdf_attempts or 0) + 1)
+
+    def render_many(self, batch):
+        """Renderiza varias actas en paralelo y espera: {delivery_id: ruta o excepcion}."""
+        pending = [(args, self.render(args)) for args in batch]
+        results = {}
+        for args, future in pending:
+            try:
+                results[args[0]] = future.result()
+            except Exception as e:
+                results[args[0]] = e
+        return results
+
+    def run(self, fn, *args):
+        """Ejecuta `fn` en el pool (o en linea si no hay workers) y espera el resultado."""
+        if self.workers <= 0:
+            return fn(*args)
+        return self._get_executor().submit(fn, *args).result()
+
+    def _on_result(self, future, args, attempt, started):
+        try:
+            path = future.result()
+        except Exception as e:
+            metrics.PDF_JOB.observe(time.perf_counter() - started, outcome="failed")
+            self._failed(args, attempt, e)
+        else:
+            metrics.PDF_JOB.observe(time.perf_counter() - started, outcome="ready")
+            self._done(args[0], path)
+
+    def _done(self, delivery_id, path):
+        _update_delivery(delivery_id, pdf_path=path, pdf_status=PDF_READY, pdf_error=None)
+
+    def _failed(self, args, attempt, error):
+        delivery_id = args[0]
+        logger.warning("Render del acta %s fallo (intento %s): %s", delivery_id, attempt, error)
+        if attempt < self.max_attempts:
+            self.submit(*args, attempt=attempt + 1)
+        else:
+            _update_delivery(delivery_id, pdf_status=PDF_FAILED, pdf_error=f"{type(error).__name__}: {error}")
+
+    def requeue_pending(self, delivery_id=None):
+        """Reencola las actas pendientes huerfanas (p. ej. tras un reinicio): al arrancar todas,
+        o solo `delivery_id`. Cada gunicorn worker lo corre al arrancar, asi que cada fila se
+        reclama con un UPDATE condicional y solo el worker que la gana la renderiza."""
+        with SessionLocal() as db:
+            expired = _orphaned(datetime.now())
+            pending = db.query(models.Delivery).filter(expired)
+            if delivery_id is not None:
+                pending = pending.filter(models.Delivery.id == delivery_id)
+            for delivery in pending.all():
+                if self._claim(db, delivery.id):
+                    self.submit_delivery(db, delivery)
+
+    def _claim(self, db, delivery_id):
+        now = datetime.now()
+        claimed = (db.query(models.Delivery).filter(models.Delivery.id == delivery_id, _orphaned(now))
+                   .update({"pdf_claimed_at": now}, synchronize_session=False))
+        db.commit()
+        return claimed == 1
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+pdf_queue = PdfRenderQueue()
@@ -0,0 +1,160 @@
+import argparse
+import json
+from datetime import date
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects.sqlite import insert
+
+from database import SessionLocal, engine
+import data_version
+import models
+
+# Totales pre-agregados para /api/analytics (tabla rollups). Los endpoints de escritura los
+# suman en su misma transaccion, asi que una consulta de tendencias lee unas pocas filas por
+# periodo sin importar el tamaño del historial. Para llenarlos desde el historial:
+#   python rollups.py --rebuild
+# El contrato es el del trabajador al momento de la escritura; el rebuild usa el actual.
+
+ISSUED = "issued"                      # prendas entregadas por mes, contrato y prenda
+DELIVERIES = "deliveries"              # entregas (actas) por semana ISO y contrato
+LAUNDRY_SENT = "laundry_sent"          # prendas enviadas a lavanderia por mes, contrato y prenda
+LAUNDRY_RETURNED = "laundry_returned"  # prendas devueltas por mes, contrato y prenda
+MONTHLY = (ISSUED, LAUNDRY_SENT, LAUNDRY_RETURNED)
+
+def month_of(value):
+    return value.strftime("%Y-%m")
+
+def week_of(value):
+    year, week, _ = value.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def _add(db, rows):
+    """Suma `value` a cada fila (metric, period, contract_type, item_name)."""
+    if not rows:
+        return
+    table = models.Rollup.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.metric, table.c.period, table.c.contract_type, table.c.item_name],
+        set_={"value": table.c.value + stmt.excluded.value},
+    )
+    db.execute(stmt, rows)
+
+def apply_deliveries(db, deliveries):
+    """`deliveries`: lista de (contrato, items, fecha)."""
+    rows = []
+    for contract_type, items, delivery_date in deliveries:
+        month = month_of(delivery_date)
+        rows += [{"metric": ISSUED, "period": month, "contract_type": contract_type, "item_name": item['name'], "value": item['qty']} for item in items]
+        rows.append({"metric": DELIVERIES, "period": week_of(delivery_date), "contract_type": contract_type, "item_name": "", "value": 1})
+    _add(db, rows)
+
+def apply_laundry(db, contract_type, items, event_date, metric):
+    """`metric`: LAUNDRY_SENT o LAUNDRY_RETURNED."""
+    month = month_of(event_date)
+    _add(db, [{"metric": metric, "period": month, "contract_type": contract_type, "item_name": item['name'], "value": item['qty']} for item in items])
+
+def compute_rollups(db):
+    """Recalcula todo desde el historial (caliente y archivado): {(metric, period, contrato, prenda): valor}."""
+    totals = {}
+
+    def add(metric, period, contract_type, item_name, value):
+        key = (metric, period, contract_type or "", item_name or "")
+        totals[key] = totals.get(key, 0) + (value or 0)
+
+    # Se agrupa por dia en SQL y se lleva a mes o semana ISO en Python
+    sources = (
+        (models.DeliveryItem, ISSUED), (models.ArchivedDeliveryItem, ISSUED),
+        (models.LaundryItem, LAUNDRY_SENT), (models.ArchivedLaundryItem, LAUNDRY_SENT),
+        (models.LaundryReturnItem, LAUNDRY_RETURNED), (models.ArchivedLaundryReturnItem, LAUNDRY_RETURNED),
+    )
+    for model, metric in sources:
+        day = func.date(model.date)
+        query = (
+            db.query(day, models.User.contract_type, model.name, func.sum(model.qty))
+            .outerjoin(models.User, models.User.dni == model.dni)
+            .group_by(day, models.User.contract_type, model.name)
+        )
+        for day_value, contract_type, name, qty in query:
+            add(metric, month_of(date.fromisoformat(day_value)), contract_type, name, qty)
+    for model in (models.Delivery, models.ArchivedDelivery):
+        day = func.date(model.date)
+        query = (
+            db.query(day, models.User.contract_type, func.count(model.id))
+            .outerjoin(models.User, models.User.dni == model.dni)
+            .group_by(day, models.User.contract_type)
+        )
+        for day_value, contract_type, count in query:
+            add(DELIVERIES, week_of(date.fromisoformat(day_value)), contract_type, "", count)
+    return totals
+
+def rebuild_rollups(db):
+    totals = compute_rollups(db)
+    db.query(models.Rollup).delete(synchronize_session=False)
+    if totals:
+        db.execute(models.Rollup.__table__.insert(), [
+            {"metric": metric, "period": period, "contract_type": contract_type, "item_name": item_name, "value": value}
+            for (metric, period, contract_type, item_name), value in totals.items()
+        ])
+    data_version.bump(db)
+    db.commit()
+    return len(totals)
+
+def ensure_rollups(db):
+    """Primer arranque sobre una base existente: llena los rollups si estan vacios."""
+    if db.query(models.Rollup.id).first() is None and (
+            db.query(models.DeliveryItem.id).first() is not None or db.query(models.LaundryItem.id).first() is not None):
+        rebuild_rollups(db)
+
+def analytics_query(date_from=None, date_to=None, contract_type=None):
+    """Filas de rollups que cubren [date_from, date_to] (periodos completos que tocan el rango)."""
+    monthly = [models.Rollup.metric.in_(MONTHLY)]
+    weekly = [models.Rollup.metric == DELIVERIES]
+    if date_from:
+        monthly.append(models.Rollup.period >= month_of(date_from))
+        weekly.append(models.Rollup.period >= week_of(date_from))
+    if date_to:
+        monthly.append(models.Rollup.period <= month_of(date_to))
+        weekly.append(models.Rollup.period <= week_of(date_to))
+    query = select(models.Rollup.metric, models.Rollup.period, models.Rollup.contract_type, models.Rollup.item_name, models.Rollup.value).where(
+        or_(and_(*monthly), and_(*weekly)))
+    if contract_type:
+        query = query.where(models.Rollup.contract_type == contract_type)
+    return query.order_by(models.Rollup.metric, models.Rollup.period, models.Rollup.contract_type, models.Rollup.item_name)
+
+def shape(rows):
+    """Respuesta de /api/analytics a partir de las filas de analytics_query."""
+    issued, deliveries, laundry = [], [], {}
+    for metric, period, contract_type, item_name, value in rows:
+        if metric == ISSUED:
+            issued.append({"period": period, "contract_type": contract_type, "item": item_name, "qty": value})
+        elif metric == DELIVERIES:
+            deliveries.append({"period": period, "contract_type": contract_type, "deliveries": value})
+        else:
+            entry = laundry.setdefault((period, item_name), {"period": period, "item": item_name, "sent": 0, "returned": 0})
+            entry["sent" if metric == LAUNDRY_SENT else "returned"] += value
+    return {"issued_by_month": issued, "deliveries_by_week": deliveries,
+            "laundry_by_month": [laundry[key] for key in sorted(laundry)]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye los rollups de /api/analytics desde el historial.")
+    parser.add_argument("--rebuild", action="store_true", help="reemplaza los rollups por los recalculados")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            print(f"Rollups reconstruidos: {rebuild_rollups(db)} filas")
+        else:
+            expected = compute_rollups(db)
+            stored = {(r.metric, r.period, r.contract_type, r.item_name): r.value for r in db.query(models.Rollup)}
+            drift = sorted(key for key in set(expected) | set(stored) if expected.get(key, 0) != stored.get(key, 0))
+            print(json.dumps({"rows": len(stored), "drift": [list(key) for key in drift[:100]], "drift_count": len(drift)}, ensure_ascii=False, indent=2))
+            if drift:
+                raise SystemExit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
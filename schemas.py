@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date, datetime
 
 class UserBase(BaseModel):
@@ -27,6 +27,15 @@ class DeliveryCreate(DeliveryBase):
     items: List[Item]
     date: datetime
 
+class DeliveryBatchEntry(DeliveryBase):
+    items: Optional[List[Item]] = None # None: items por defecto segun el tipo de contrato
+    date: Optional[datetime] = None
+
+class DeliveryBatchCreate(BaseModel):
+    deliveries: List[DeliveryBatchEntry]
+    date: Optional[datetime] = None # fecha por defecto para todas las entregas
+    output: Literal["zip", "pdf"] = "zip" # "zip" (un PDF por acta) o "pdf" (un solo PDF para imprimir)
+
 class Delivery(DeliveryBase):
     id: int
     date: datetime
@@ -0,0 +1,196 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, func, text
+
+from contracts import CONTRACT_TYPES, determine_items
+from database import SessionLocal, engine
+import data_version
+import entitlements
+import models
+import rollups
+
+# Generador de datos sinteticos reproducible (misma semilla = misma base) para medir la API
+# con volumenes reales. Escribe en ROPERIA_DATABASE_URL (por defecto roperia.db):
+#   ROPERIA_DATABASE_URL=sqlite:///./bench.db python synthetic_data.py --users 50000
+# Con los valores por defecto salen ~50k trabajadores, ~100k entregas y ~1M de envios y
+# devoluciones de lavanderia. Tambien llena las tablas derivadas (asignacion FIFO y saldos)
+# igual que lo harian los endpoints, asi que la base queda lista sin migraciones.
+
+CHUNK_SIZE = 10000
+FIRST_DNI = 70000000
+
+# Proporcion de trabajadores por tipo de contrato (solo "Regular Otro sindicato" usa lavanderia)
+CONTRACT_WEIGHTS = {"Regular Otro sindicato": 0.5, "Regular PYA": 0.3, "Temporal": 0.2}
+LAUNDRY_GARMENTS = ("Chaqueta", "Pantalon", "Polo", "Polera")
+NAMES = ("Andres", "Maria", "Jose", "Rosa", "Luis", "Carmen", "Jorge", "Ana", "Carlos", "Lucia", "Miguel", "Elena")
+SURNAMES = ("Bedoya", "Quispe", "Flores", "Garcia", "Rojas", "Torres", "Huaman", "Vargas", "Mendoza", "Castillo")
+
+class _Writer:
+    """Acumula filas por tabla y las inserta por bloques (executemany)."""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        rows = self.rows.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= CHUNK_SIZE:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for target in ([model] if model else list(self.rows)):
+            rows = self.rows.get(target)
+            if rows:
+                self.db.execute(target.__table__.insert(), rows)
+                self.counts[target.__tablename__] = self.counts.get(target.__tablename__, 0) + len(rows)
+                self.rows[target] = []
+
+class _Ids:
+    def __init__(self, db):
+        self.next = {m: (db.query(func.max(m.id)).scalar() or 0) + 1 for m in (
+            models.User, models.Delivery, models.DeliveryItem, models.Laundry, models.LaundryItem,
+            models.LaundryReturn, models.LaundryReturnItem, models.LaundryAllocation)}
+
+    def __call__(self, model):
+        value = self.next[model]
+        self.next[model] += 1
+        return value
+
+def _random_dates(rng, count, start, days):
+    return sorted(start + timedelta(seconds=rng.randrange(days * 86400)) for _ in range(count))
+
+def _laundry_history(rng, writer, ids, dni, sends, return_ratio):
+    """Envios y devoluciones de un trabajador, con la asignacion FIFO ya resuelta."""
+    events = []
+    for send_date in sends:
+        garments = rng.sample(LAUNDRY_GARMENTS, rng.randint(1, 3))
+        items = [{"name": name, "qty": rng.randint(1, 3)} for name in garments]
+        events.append((send_date, 0, items))
+        if rng.random() < return_ratio:
+            returned = [{"name": i["name"], "qty": rng.randint(1, i["qty"]) if rng.random() < 0.2 else i["qty"]} for i in items]
+            events.append((send_date + timedelta(days=rng.randint(1, 7), hours=rng.randint(0, 8)), 1, returned))
+    events.sort(key=lambda e: (e[0], e[1]))
+
+    open_items = {}
+    balances = {}
+    send_rows = {}
+    for event_date, is_return, items in events:
+        items_json = json.dumps(items)
+        if not is_return:
+            laundry_id = ids(models.Laundry)
+            writer.add(models.Laundry, {"id": laundry_id, "dni": dni, "date": event_date, "items_json": items_json})
+            for item in items:
+                row = {"id": ids(models.LaundryItem), "laundry_id": laundry_id, "dni": dni, "name": item["name"], "qty": item["qty"],
+                       "date": event_date, "returned": 0, "last_return_date": None}
+                send_rows[row["id"]] = row
+                open_items.setdefault(item["name"], []).append(row)
+                balances.setdefault(item["name"], [0, 0])[0] += item["qty"]
+            continue
+
+        return_id = ids(models.LaundryReturn)
+        writer.add(models.LaundryReturn, {"id": return_id, "dni": dni, "date": event_date, "items_json": items_json})
+        for item in items:
+            return_item_id = ids(models.LaundryReturnItem)
+            writer.add(models.LaundryReturnItem, {"id": return_item_id, "return_id": return_id, "dni": dni, "name": item["name"],
+                                                  "qty": item["qty"], "date": event_date})
+            balances.setdefault(item["name"], [0, 0])[1] += item["qty"]
+            remaining = item["qty"]
+            queue = open_items.get(item["name"], [])
+            while remaining > 0 and queue:
+                send = queue[0]
+                take = min(remaining, send["qty"] - send["returned"])
+                send["returned"] += take
+                send["last_return_date"] = event_date
+                writer.add(models.LaundryAllocation, {"id": ids(models.LaundryAllocation), "return_item_id": return_item_id,
+                                                      "laundry_item_id": send["id"], "laundry_id": send["laundry_id"],
+                                                      "return_id": return_id, "qty": take, "date": event_date})
+                remaining -= take
+                if send["returned"] >= send["qty"]:
+                    queue.pop(0)
+
+    # Los envios se escriben al final, con lo devuelto ya calculado
+    for row in send_rows.values():
+        writer.add(models.LaundryItem, row)
+    for name, (sent, returned) in balances.items():
+        writer.add(models.LaundryBalance, {"dni": dni, "item_name": name, "sent": sent, "returned": returned})
+
+def next_dni(db):
+    """Primer DNI libre para agregar trabajadores: despues del mayor DNI numerico de la base."""
+    highest = db.query(func.max(cast(models.User.dni, Integer))).scalar() or 0
+    return max(FIRST_DNI, highest + 1)
+
+def generate(db, users=50000, deliveries_per_user=2, laundry_per_user=40, return_ratio=0.9,
+             start=datetime(2024, 1, 1), days=730, seed=42, first_dni=None):
+    rng = random.Random(seed)
+    first_dni = next_dni(db) if first_dni is None else first_dni
+    writer = _Writer(db)
+    ids = _Ids(db)
+    contract_types = list(CONTRACT_WEIGHTS)
+    weights = [CONTRACT_WEIGHTS[c] for c in contract_types]
+    assert set(contract_types) == set(CONTRACT_TYPES)
+
+    for i in range(users):
+        dni = f"{first_dni + i:08d}"
+        contract_type = rng.choices(contract_types, weights)[0]
+        writer.add(models.User, {"id": ids(models.User), "dni": dni, "name": rng.choice(NAMES), "surname": rng.choice(SURNAMES),
+                                 "contract_type": contract_type})
+
+        items = determine_items(contract_type)
+        for delivery_date in _random_dates(rng, rng.randint(1, 2 * deliveries_per_user - 1), start, days):
+            delivery_id = ids(models.Delivery)
+            # Sin acta en disco: se genera bajo demanda la primera vez que se pide
+            writer.add(models.Delivery, {"id": delivery_id, "dni": dni, "date": delivery_date, "items_json": json.dumps(items),
+                                         "pdf_path": "", "pdf_status": "ready", "pdf_attempts": 0})
+            for item in items:
+                writer.add(models.DeliveryItem, {"id": ids(models.DeliveryItem), "delivery_id": delivery_id, "dni": dni,
+                                                 "name": item["name"], "qty": item["qty"], "date": delivery_date})
+
+        if contract_type == "Regular Otro sindicato":
+            sends = _random_dates(rng, rng.randint(laundry_per_user // 2, laundry_per_user * 3 // 2), start, days)
+            _laundry_history(rng, writer, ids, dni, sends, return_ratio)
+
+    writer.flush()
+    data_version.bump(db, data_version.STATS, data_version.USERS)
+    db.commit()
+    # Las entregas sinteticas no pasan por el control de cupos: el ledger refleja lo entregado
+    entitlements.seed_catalog(db)
+    writer.counts["entitlement_ledger"] = entitlements.rebuild_ledger(db)
+    writer.counts["rollups"] = rollups.rebuild_rollups(db)
+    return writer.counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Llena la base (ROPERIA_DATABASE_URL) con datos sinteticos reproducibles.")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--deliveries-per-user", type=int, default=2)
+    parser.add_argument("--laundry-per-user", type=int, default=40, help="envios de lavanderia promedio por trabajador con lavanderia")
+    parser.add_argument("--return-ratio", type=float, default=0.9)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--append", action="store_true", help="agrega aunque la base ya tenga trabajadores")
+    parser.add_argument("--first-dni", type=int, help="DNI del primer trabajador (por defecto, el siguiente al mayor de la base)")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not args.append and db.query(models.User.id).first() is not None:
+            raise SystemExit("La base ya tiene trabajadores: usa --append o apunta ROPERIA_DATABASE_URL a otra base")
+        # Carga masiva: sin fsync por commit; la base es desechable hasta que termina
+        db.execute(text("PRAGMA synchronous=OFF"))
+        started = time.perf_counter()
+        counts = generate(db, args.users, args.deliveries_per_user, args.laundry_per_user, args.return_ratio,
+                          days=args.days, seed=args.seed, first_dni=args.first_dni)
+        db.execute(text("PRAGMA synchronous=NORMAL"))
+    finally:
+        db.close()
+    print(json.dumps(counts, indent=2))
+    print(f"{sum(counts.values())} filas en {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
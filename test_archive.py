@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+from conftest import seed
+from database import SessionLocal
+import archive
+import laundry_balance
+import models
+
+def close_cycles(client, n_users):
+    for i in range(n_users):
+        client.post("/api/laundry/return", json={"dni": f"{10000000 + i}", "items": [{"name": "Polo", "qty": 1}, {"name": "Pantalon", "qty": 1}]})
+
+def test_archive_moves_closed_cycles_and_reports_read_both_tiers(client):
+    seed(client, 6)
+    close_cycles(client, 5)  # el ultimo trabajador queda con un envio abierto
+    with SessionLocal() as db:
+        db.query(models.Delivery).update({"pdf_status": "ready"})
+        db.commit()
+    paths = ("/api/laundry/report", "/api/delivery/report", "/api/stats")
+    before = {path: client.get(path).json() for path in paths}
+
+    with SessionLocal() as db:
+        counts = archive.archive(db, datetime.now() + timedelta(days=1))
+        # La ultima fila de cada tabla no se archiva (SQLite reutilizaria su id): la ultima
+        # devolucion es del trabajador 4, que queda en caliente con su ciclo completo
+        assert counts == {**counts, "deliveries": 5, "laundry": 4, "laundry_returns": 8}
+        assert db.query(models.Laundry).count() == 2 and db.query(models.LaundryReturn).count() == 3
+        assert db.query(models.LaundryAllocation).count() == 4
+        assert laundry_balance.verify_balances(db) == []
+
+    assert {path: client.get(path).json() for path in paths} == before
+    rows = client.get("/api/laundry/report", params={"limit": 2}).json()
+    assert len(rows) == 2
+    assert client.get("/api/delivery/report", params={"dni": "10000003"}).json()[0]["items"] == "2 Toallas"
+    # Un rango posterior al archivo no lo lee
+    assert client.get("/api/delivery/report", params={"date_from": "2027-01-01"}).json() == []
+
+def test_archived_delivery_pdf_and_new_ids(client):
+    seed(client, 3)
+    with SessionLocal() as db:
+        db.query(models.Delivery).update({"pdf_status": "ready"})
+        db.commit()
+        archive.archive(db, datetime.now() + timedelta(days=1))
+        archived_ids = [i for (i,) in db.query(models.ArchivedDelivery.id)]
+    assert archived_ids == [1, 2]
+    response = client.get("/api/deliveries/1/pdf")
+    assert response.status_code == 200 and response.headers["content-type"] == "application/pdf"
+    created = client.post("/api/deliveries", json={"dni": "10000000", "items": [{"name": "Guantes", "qty": 1}], "date": datetime.now().isoformat()}).json()
+    assert created["delivery_id"] not in archived_ids
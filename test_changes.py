@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+import change_log
+
+def test_change_feed_returns_deltas_and_balances(client):
+    cursor = client.get("/api/changes").json()["cursor"]
+    assert cursor == 0
+    client.post("/api/users", json={"dni": "20000001", "name": "Ana", "surname": "Rojas", "contract_type": "Regular Otro sindicato"})
+    client.post("/api/deliveries", json={"dni": "20000001", "items": [{"name": "Guantes", "qty": 1}], "date": "2026-02-03T10:00:00"})
+    client.post("/api/laundry", json={"dni": "20000001", "items": [{"name": "Polo", "qty": 2}]})
+    client.post("/api/laundry/return", json={"dni": "20000001", "items": [{"name": "Polo", "qty": 2}]})
+
+    body = client.get("/api/changes", params={"since": cursor}).json()
+    assert [e["kind"] for e in body["events"]] == ["user", "delivery", "laundry", "laundry_return"]
+    assert body["events"][0]["data"]["name"] == "Ana" and body["events"][1]["data"]["items"] == [{"name": "Guantes", "qty": 1}]
+    assert body["balances"] == {"20000001": [{"name": "Polo", "sent": 2, "returned": 2, "pending": 0}]}
+    assert body["cursor"] == body["events"][-1]["id"] and not body["has_more"]
+    assert client.get("/api/changes", params={"since": body["cursor"]}).json()["events"] == []
+
+    first = client.get("/api/changes", params={"since": cursor, "limit": 3}).json()
+    assert first["has_more"] and [e["kind"] for e in first["events"]] == ["user", "delivery", "laundry"]
+    assert [e["kind"] for e in client.get("/api/changes", params={"since": first["cursor"]}).json()["events"]] == ["laundry_return"]
+
+def test_pruned_cursor_is_rejected(client):
+    for i in range(3):
+        client.post("/api/users", json={"dni": f"2000000{i}", "name": "N", "surname": "S", "contract_type": "Temporal"})
+    with SessionLocal() as db:
+        assert change_log.prune(db, datetime.now() + timedelta(days=1)) == 2
+    assert client.get("/api/changes", params={"since": 0}).status_code == 410
+    assert [e["dni"] for e in client.get("/api/changes", params={"since": 2}).json()["events"]] == ["20000002"]
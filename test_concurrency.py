@@ -0,0 +1,84 @@
+import multiprocessing
+import threading
+import time
+
+from fastapi import HTTPException
+import pytest
+
+from conftest import seed
+import database
+from database import SessionLocal, engine, write_engine
+import main
+import models
+import schemas
+
+# Prueba de estres: varios procesos (como los workers de gunicorn) y varios hilos por proceso
+# registran envios y devoluciones de lavanderia sobre el mismo archivo SQLite a la vez.
+PROCESSES = 4
+THREADS = 2
+WRITES = 40
+DNIS = [f"{10000000 + i}" for i in range(PROCESSES * THREADS)]
+
+def _write_many(dni, errors):
+    for i in range(WRITES):
+        try:
+            if i % 2 == 0:
+                main.create_laundry(schemas.LaundryCreate(dni=dni, items=[{"name": "Polo", "qty": 1}]))
+            else:
+                main.create_laundry_return(schemas.LaundryReturnCreate(dni=dni, items=[{"name": "Polo", "qty": 1}]))
+        except Exception as e:
+            errors.append(repr(e))
+
+def _worker(dnis, results):
+    # Conexiones heredadas del padre: cada proceso abre las suyas
+    engine.dispose(close=False)
+    write_engine.dispose(close=False)
+    errors = []
+    threads = [threading.Thread(target=_write_many, args=(dni, errors)) for dni in dnis]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    results.put(errors)
+
+def _assert_consistent(expected_writes):
+    db = SessionLocal()
+    try:
+        assert db.query(models.Laundry).count() + db.query(models.LaundryReturn).count() == expected_writes
+        balances = db.query(models.LaundryBalance).filter(models.LaundryBalance.item_name == "Polo").all()
+        assert {(b.sent, b.returned) for b in balances} == {(2 + WRITES // 2, 1 + WRITES // 2)}
+    finally:
+        db.close()
+
+def test_concurrent_writers_do_not_lock(client):
+    seed(client, len(DNIS))
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    start = time.perf_counter()
+    procs = [ctx.Process(target=_worker, args=(DNIS[p * THREADS:(p + 1) * THREADS], results)) for p in range(PROCESSES)]
+    for p in procs: p.start()
+    errors = [e for _ in procs for e in results.get(timeout=120)]
+    for p in procs: p.join()
+    elapsed = time.perf_counter() - start
+
+    total = PROCESSES * THREADS * WRITES
+    print(f"\n{total} escrituras en {elapsed:.2f}s ({total / elapsed:.0f}/s), {len(errors)} errores")
+    assert errors == []
+    _assert_consistent(total + 2 * len(DNIS))
+
+def test_group_commit_batches_writes(client, monkeypatch):
+    seed(client, len(DNIS))
+    queue = database.GroupCommitQueue(wait_ms=20)
+    monkeypatch.setattr(database, "group_commit", queue)
+    commits = []
+    monkeypatch.setattr(queue, "_commit", lambda batch, original=queue._commit: (commits.append(len(batch)), original(batch)))
+
+    errors = []
+    threads = [threading.Thread(target=_write_many, args=(dni, errors)) for dni in DNIS]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert errors == []
+    _assert_consistent(len(DNIS) * WRITES + 2 * len(DNIS))
+    assert len(commits) < len(DNIS) * WRITES  # varias escrituras por transaccion
+
+    # Un trabajo que falla no arrastra a los demas del mismo lote
+    with pytest.raises(HTTPException):
+        main.create_laundry(schemas.LaundryCreate(dni="no-existe", items=[{"name": "Polo", "qty": 1}]))
@@ -0,0 +1,80 @@
+import io
+import os
+import re
+import zipfile
+
+from conftest import seed
+from database import SessionLocal
+import models
+import pdf_actas
+
+BATCH = {"deliveries": [{"dni": "10000000", "items": [{"name": "Guantes", "qty": 1}]}, {"dni": "10000001"}, {"dni": "10000002", "date": "2026-02-10T08:00:00"}],
+         "date": "2026-02-04T10:00:00"}
+
+def test_batch_zip_has_one_acta_per_delivery(client):
+    seed(client, 3)
+    response = client.post("/api/deliveries/batch", json=BATCH)
+    assert response.status_code == 200 and response.headers["content-type"] == "application/zip"
+    ids = [int(i) for i in response.headers["X-Delivery-Ids"].split(",")]
+    assert "X-Pending-Deliveries" not in response.headers
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        assert names == [f"acta_{i:06d}.pdf" for i in ids]
+        assert all(archive.read(name).startswith(b"%PDF") for name in names)
+    with SessionLocal() as db:
+        deliveries = {d.id: d for d in db.query(models.Delivery).filter(models.Delivery.id.in_(ids))}
+        assert [deliveries[i].pdf_status for i in ids] == [pdf_actas.PDF_READY] * 3
+        assert [deliveries[i].date.day for i in ids] == [4, 4, 10]
+        # Sin items: los por defecto del contrato
+        assert [item.name for item in deliveries[ids[0]].items] == ["Guantes"] and len(deliveries[ids[1]].items) > 1
+
+def test_batch_merged_pdf_has_one_page_per_delivery(client):
+    seed(client, 3)
+    response = client.post("/api/deliveries/batch", json={**BATCH, "output": "pdf"})
+    assert response.status_code == 200 and response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF")
+    assert len(re.findall(rb"/Type /Page\b(?!s)", response.content)) == len(response.headers["X-Delivery-Ids"].split(",")) == 3
+
+    # Las actas individuales no se escriben en el lote: se generan al pedirlas
+    ids = [int(i) for i in response.headers["X-Delivery-Ids"].split(",")]
+    with SessionLocal() as db:
+        paths = [db.get(models.Delivery, i).pdf_path for i in ids]
+        assert [db.get(models.Delivery, i).pdf_status for i in ids] == [pdf_actas.PDF_READY] * 3
+    assert not any(os.path.exists(path) for path in paths)
+    acta = client.get(f"/api/deliveries/{ids[0]}/pdf")
+    assert acta.status_code == 200 and acta.content.startswith(b"%PDF") and os.path.exists(paths[0])
+
+def test_batch_rejects_unknown_output(client):
+    seed(client, 1)
+    response = client.post("/api/deliveries/batch", json={"deliveries": [{"dni": "10000000"}], "output": "docx"})
+    assert response.status_code == 422
+    with SessionLocal() as db:
+        assert db.query(models.Delivery).count() == 1
+
+def test_batch_unknown_dni_creates_nothing(client):
+    seed(client, 1)
+    response = client.post("/api/deliveries/batch", json={"deliveries": [{"dni": "10000000"}, {"dni": "99999999"}, {"dni": "88888888"}]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == {"message": "User not found", "dnis": ["88888888", "99999999"]}
+    with SessionLocal() as db:
+        assert db.query(models.Delivery).count() == 1  # la del seed
+
+def test_batch_failed_render_is_reported_as_pending(client, monkeypatch):
+    seed(client, 3)
+    render_acta = pdf_actas.render_acta
+
+    def failing_render(delivery_id, *args):
+        if delivery_id == failing:
+            raise RuntimeError("sin espacio en disco")
+        return render_acta(delivery_id, *args)
+    with SessionLocal() as db:
+        failing = db.query(models.Delivery.id).order_by(models.Delivery.id.desc()).first()[0] + 2
+    monkeypatch.setattr(pdf_actas, "render_acta", failing_render)
+
+    response = client.post("/api/deliveries/batch", json=BATCH)
+    assert response.status_code == 200 and response.headers["X-Pending-Deliveries"] == str(failing)
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert len(archive.namelist()) == 2 and f"acta_{failing:06d}.pdf" not in archive.namelist()
+    with SessionLocal() as db:
+        # Sin workers los reintentos corren en linea y se agotan
+        assert db.get(models.Delivery, failing).pdf_status == pdf_actas.PDF_FAILED
@@ -0,0 +1,42 @@
+from test_query_counts import count_statements
+
+USER = {"dni": "46544993", "name": "Andres", "surname": "Bedoya", "contract_type": "Temporal"}
+
+def deliver(client, items, date="2026-03-01T00:00:00"):
+    return client.post("/api/deliveries", json={"dni": USER["dni"], "items": items, "date": date})
+
+def remaining(client, period="2026"):
+    items = client.get(f"/api/users/{USER['dni']}/entitlements", params={"period": period}).json()["items"]
+    return {item["name"]: item["remaining"] for item in items}
+
+def test_delivery_updates_ledger_and_rejects_over_issue(client):
+    client.post("/api/users", json=USER)
+    assert remaining(client)["Candado"] == 1
+
+    assert deliver(client, [{"name": "Candado", "qty": 1}, {"name": "Guantes", "qty": 5}]).status_code == 200
+    assert remaining(client)["Candado"] == 0
+
+    rejected = deliver(client, [{"name": "Candado", "qty": 1}])
+    assert rejected.status_code == 409
+    assert rejected.json()["detail"]["items"] == [{"name": "Candado", "allowance": 1, "issued": 2}]
+    assert remaining(client)["Candado"] == 0  # el rechazo no deja rastro en el ledger
+    assert len(client.get("/api/delivery/report").json()) == 1
+
+    # Otro periodo tiene su propio cupo
+    assert deliver(client, [{"name": "Candado", "qty": 1}], "2027-01-10T00:00:00").status_code == 200
+    assert remaining(client, "2027")["Candado"] == 0
+
+def test_batch_default_items_respect_quota(client):
+    client.post("/api/users", json=USER)
+    batch = {"deliveries": [{"dni": USER["dni"]}], "date": "2026-03-01T00:00:00"}
+    assert client.post("/api/deliveries/batch", json=batch).status_code == 200
+    assert set(remaining(client).values()) == {0}
+    assert client.post("/api/deliveries/batch", json=batch).status_code == 409
+
+def test_entitlements_lookup_is_constant(client):
+    client.post("/api/users", json=USER)
+    for year in range(2020, 2026):
+        deliver(client, [{"name": "Par de zapatos", "qty": 1}], f"{year}-05-01T00:00:00")
+    with count_statements() as statements:
+        client.get(f"/api/users/{USER['dni']}/entitlements", params={"period": "2026"})
+    assert len(statements) == 2
@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+import change_log
+import event_stream
+import main
+
+async def next_message(stream, event):
+    while True:
+        chunk = await asyncio.wait_for(stream.__anext__(), 5)
+        if chunk.startswith(f"event: {event}\n"):
+            return chunk
+
+def test_stream_replays_from_cursor_then_pushes_new_events(client):
+    client.post("/api/users", json={"dni": "30000001", "name": "Ana", "surname": "Rojas", "contract_type": "Regular Otro sindicato"})
+
+    async def scenario():
+        broadcaster = event_stream.Broadcaster(main.current_stats, poll_seconds=0.01)
+        stream = event_stream.stream(broadcaster, since=0)
+        try:
+            replayed = await next_message(stream, "changes")
+            assert "id: 1\n" in replayed and '"kind": "user"' in replayed
+            assert '"users_count": 1' in await next_message(stream, "stats")
+            await asyncio.to_thread(client.post, "/api/laundry", json={"dni": "30000001", "items": [{"name": "Polo", "qty": 2}]})
+            pushed = await next_message(stream, "changes")
+            assert "id: 2\n" in pushed and '"pending": 2' in pushed
+            assert '"laundry_active_count": 1' in await next_message(stream, "stats")
+        finally:
+            await stream.aclose()
+            await broadcaster.close()
+
+    asyncio.run(scenario())
+
+def test_stream_without_cursor_starts_at_latest_and_expired_cursor_resets(client):
+    client.post("/api/users", json={"dni": "30000002", "name": "Luis", "surname": "Flores", "contract_type": "Temporal"})
+
+    async def scenario():
+        broadcaster = event_stream.Broadcaster(main.current_stats, poll_seconds=0.01)
+        stream = event_stream.stream(broadcaster)
+        assert "id: 1\n" in await next_message(stream, "ready")
+        await stream.aclose()
+        client.post("/api/users", json={"dni": "30000003", "name": "Rosa", "surname": "Vargas", "contract_type": "Temporal"})
+        with SessionLocal() as db:
+            change_log.prune(db, datetime.now() + timedelta(days=1))
+        stream = event_stream.stream(broadcaster, since=0)
+        assert "Cursor expired" in await next_message(stream, "reset")
+        await stream.aclose()
+        await broadcaster.close()
+
+    asyncio.run(scenario())
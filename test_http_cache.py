@@ -0,0 +1,67 @@
+import os
+
+from conftest import seed
+import pdf_actas
+from test_query_counts import count_statements
+
+def test_stats_etag_and_invalidation(client):
+    seed(client, 3)
+    first = client.get("/api/stats")
+    etag = first.headers["etag"]
+    assert first.json()["laundry_total_count"] == 3
+
+    with count_statements() as statements:
+        cached = client.get("/api/stats", headers={"If-None-Match": etag})
+    assert cached.status_code == 304 and cached.headers["etag"] == etag
+    assert len(statements) == 1  # solo la lectura de la version
+
+    client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 1}]})
+    changed = client.get("/api/stats", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["laundry_total_count"] == 4
+
+def test_pdf_etag_and_range(client, monkeypatch):
+    client.post("/api/users", json={"dni": "46544993", "name": "Andres", "surname": "Bedoya", "contract_type": "Temporal"})
+    delivery_id = client.post("/api/deliveries", json={"dni": "46544993", "items": [{"name": "Candado", "qty": 1}], "date": "2026-03-01T00:00:00"}).json()["delivery_id"]
+    url = f"/api/deliveries/{delivery_id}/pdf"
+    full = client.get(url)
+    etag = full.headers["etag"]
+    assert full.status_code == 200 and not etag.startswith("W/") and full.headers["cache-control"] == "private, no-cache"
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    part = client.get(url, headers={"Range": "bytes=0-99", "If-Range": etag})
+    assert part.status_code == 206 and part.content == full.content[:100]
+    assert client.get(url, headers={"Range": "bytes=0-99", "If-Range": '"otro"'}).status_code == 200
+
+    # Acta desalojada: el 304 sale de la clave sin volver a generarla
+    for name in os.listdir(pdf_actas.PDF_DIR):
+        if name.endswith(".pdf"):
+            os.remove(os.path.join(pdf_actas.PDF_DIR, name))
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert not any(name.endswith(".pdf") for name in os.listdir(pdf_actas.PDF_DIR))
+    assert client.get(url).content == full.content
+
+    # Otra version del renderer: el ETag cambia aunque la entrega sea la misma
+    monkeypatch.setattr(pdf_actas, "RENDERER_VERSION", "reportlab 0.0")
+    upgraded = client.get(url, headers={"If-None-Match": etag})
+    assert upgraded.status_code == 200 and upgraded.headers["etag"] != etag
+
+def test_report_etags_follow_filtered_rows(client):
+    seed(client, 3)
+    for path in ("/api/laundry/report", "/api/delivery/report"):
+        first = client.get(path)
+        assert client.get(path, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+        assert client.get(path, params={"limit": 1}).headers["etag"] != first.headers["etag"]
+
+    laundry_etag = client.get("/api/laundry/report").headers["etag"]
+    delivery_etag = client.get("/api/delivery/report").headers["etag"]
+    client.post("/api/laundry/return", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 1}]})
+    assert client.get("/api/laundry/report", headers={"If-None-Match": laundry_etag}).status_code == 200
+    assert client.get("/api/delivery/report", headers={"If-None-Match": delivery_etag}).status_code == 304
+    client.post("/api/deliveries", json={"dni": "10000000", "items": [{"name": "Candado", "qty": 1}], "date": "2026-05-01T00:00:00"})
+    assert client.get("/api/delivery/report", headers={"If-None-Match": delivery_etag}).status_code == 200
+    # El ETag se valida con lecturas por clave primaria, sin contar las filas del filtro
+    march = client.get("/api/delivery/report", params={"month": 3}).headers["etag"]
+    with count_statements() as statements:
+        assert client.get("/api/delivery/report", params={"month": 3}, headers={"If-None-Match": march}).status_code == 304
+    assert not any("count(" in statement.lower() for statement in statements)
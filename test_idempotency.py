@@ -0,0 +1,74 @@
+import threading
+import time
+
+from conftest import seed
+from database import SessionLocal
+import laundry_balance
+import models
+import pdf_actas
+
+DELIVERY = {"dni": "10000000", "items": [{"name": "Guantes", "qty": 1}], "date": "2026-03-02T09:00:00"}
+
+def test_retried_delivery_replays_response_without_second_write_or_render(client, monkeypatch):
+    seed(client, 1)
+    submitted = []
+    monkeypatch.setattr(pdf_actas.pdf_queue, "submit", lambda *args, **kwargs: submitted.append(args[0]))
+
+    first = client.post("/api/deliveries", json=DELIVERY, headers={"Idempotency-Key": "kiosko-1-0001"})
+    retry = client.post("/api/deliveries", json=DELIVERY, headers={"Idempotency-Key": "kiosko-1-0001"})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json() and retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert len(submitted) == 1
+    with SessionLocal() as db:
+        assert db.query(models.Delivery).filter(models.Delivery.dni == "10000000").count() == 2  # la del seed y una nueva
+
+    other = client.post("/api/deliveries", json={**DELIVERY, "items": [{"name": "Casco", "qty": 1}]}, headers={"Idempotency-Key": "kiosko-1-0001"})
+    assert other.status_code == 422
+    assert client.post("/api/deliveries", json=DELIVERY, headers={"Idempotency-Key": "kiosko-1-0002"}).json()["delivery_id"] != first.json()["delivery_id"]
+
+def test_concurrent_duplicate_waits_for_first_request(client, monkeypatch):
+    seed(client, 1)
+    apply_items = laundry_balance.apply_items
+
+    def slow_apply_items(*args, **kwargs):
+        time.sleep(0.3)
+        return apply_items(*args, **kwargs)
+    monkeypatch.setattr(laundry_balance, "apply_items", slow_apply_items)
+
+    responses = []
+    def send():
+        responses.append(client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 3}]},
+                                     headers={"Idempotency-Key": "kiosko-2-0001"}))
+    # Un solo event loop para las tres peticiones, como en un worker
+    with client:
+        threads = [threading.Thread(target=send) for _ in range(3)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sorted(r.headers.get("Idempotent-Replayed", "") for r in responses) == ["", "true", "true"]
+    with SessionLocal() as db:
+        assert db.query(models.Laundry).filter(models.Laundry.dni == "10000000").count() == 2
+        balance = db.query(models.LaundryBalance).filter(models.LaundryBalance.dni == "10000000", models.LaundryBalance.item_name == "Polo").one()
+        assert balance.sent == 5
+
+def test_error_responses_are_not_stored_so_a_corrected_retry_runs(client):
+    headers = {"Idempotency-Key": "kiosko-3-0001"}
+    assert client.post("/api/deliveries", json=DELIVERY, headers=headers).status_code == 404
+    seed(client, 1)
+    retry = client.post("/api/deliveries", json=DELIVERY, headers=headers)
+    assert retry.status_code == 200 and "Idempotent-Replayed" not in retry.headers
+
+def test_streamed_batch_is_not_buffered_and_retry_does_not_repeat_it(client):
+    seed(client, 2)
+    batch = {"deliveries": [{"dni": "10000000", "items": [{"name": "Guantes", "qty": 1}]}, {"dni": "10000001", "items": [{"name": "Casco", "qty": 1}]}],
+             "date": "2026-02-04T10:00:00"}
+    first = client.post("/api/deliveries/batch", json=batch, headers={"Idempotency-Key": "kiosko-4-0001"})
+    assert first.status_code == 200 and first.content.startswith(b"PK")
+    retry = client.post("/api/deliveries/batch", json=batch, headers={"Idempotency-Key": "kiosko-4-0001"})
+    assert retry.status_code == 409 and retry.headers["X-Delivery-Ids"] == first.headers["X-Delivery-Ids"]
+    with SessionLocal() as db:
+        assert db.query(models.Delivery).count() == 4
+        assert db.query(models.IdempotencyKey).one().body is None
@@ -0,0 +1,42 @@
+import sys
+
+import pytest
+
+from conftest import seed
+from database import SessionLocal
+import laundry_balance
+import models
+
+def status(client, dni):
+    return {row["name"]: (row["sent"], row["returned"]) for row in client.get(f"/api/laundry/{dni}/status").json()}
+
+def test_verify_reports_drift_and_rebuild_fixes_it(client, monkeypatch, capsys):
+    seed(client, 3)
+    with SessionLocal() as db:
+        assert laundry_balance.verify_balances(db) == []
+
+        # Desfase: un saldo alterado, uno perdido y uno sin historial
+        balance = lambda dni, name: db.query(models.LaundryBalance).filter_by(dni=dni, item_name=name).one()
+        balance("10000000", "Polo").sent = 7
+        db.delete(balance("10000001", "Pantalon"))
+        db.add(models.LaundryBalance(dni="10000002", item_name="Toalla", sent=1, returned=0))
+        db.commit()
+
+        assert laundry_balance.verify_balances(db) == [
+            {"dni": "10000000", "item_name": "Polo", "expected_sent": 2, "expected_returned": 1, "stored_sent": 7, "stored_returned": 1},
+            {"dni": "10000001", "item_name": "Pantalon", "expected_sent": 1, "expected_returned": 0, "stored_sent": 0, "stored_returned": 0},
+            {"dni": "10000002", "item_name": "Toalla", "expected_sent": 0, "expected_returned": 0, "stored_sent": 1, "stored_returned": 0},
+        ]
+    assert status(client, "10000000")["Polo"] == (7, 1)
+
+    # La CLI falla con desfase y --rebuild lo corrige
+    monkeypatch.setattr(sys, "argv", ["laundry_balance.py"])
+    with pytest.raises(SystemExit) as exit_info:
+        laundry_balance.main()
+    assert exit_info.value.code == 1 and "3 diferencias encontradas" in capsys.readouterr().out
+    monkeypatch.setattr(sys, "argv", ["laundry_balance.py", "--rebuild"])
+    laundry_balance.main()
+
+    with SessionLocal() as db:
+        assert laundry_balance.verify_balances(db) == []
+    assert [status(client, f"{10000000 + i}") for i in range(3)] == [{"Polo": (2, 1), "Pantalon": (1, 0)}] * 3
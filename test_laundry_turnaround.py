@@ -0,0 +1,46 @@
+import pandas as pd
+
+from conftest import seed
+from database import SessionLocal
+import laundry_turnaround
+import models
+
+def allocations(frame):
+    return sorted(frame.groupby(["send_id", "return_id"])["qty"].sum().items())
+
+def test_vectorized_match_equals_persisted_fifo(client):
+    seed(client, 3)
+    # Devolucion de mas (se descarta) y un envio posterior que no debe cubrirse con ese exceso
+    client.post("/api/laundry/return", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 3}]})
+    client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 2}]})
+    client.post("/api/laundry", json={"dni": "10000001", "items": [{"name": "Polo", "qty": 1}]})
+    client.post("/api/laundry/return", json={"dni": "10000001", "items": [{"name": "Polo", "qty": 2}, {"name": "Pantalon", "qty": 1}]})
+    with SessionLocal() as db:
+        sends, returns = laundry_turnaround.load_history(db)
+        persisted = pd.DataFrame([(a.laundry_item_id, a.return_item_id, a.qty) for a in db.query(models.LaundryAllocation)],
+                                 columns=["send_id", "return_id", "qty"])
+    vectorized = laundry_turnaround.match(sends, returns)
+    assert allocations(vectorized) == allocations(persisted) == allocations(laundry_turnaround.match_loop(sends, returns))
+
+def test_turnaround_endpoint(client):
+    seed(client, 3)
+    body = client.get("/api/laundry/turnaround", params={"sla_days": 0}).json()
+    assert [(row["item"], row["pieces"]) for row in body["by_item"]] == [("Polo", 3)]
+    assert body["by_item"][0]["p50_days"] >= 0 and len(body["by_month"]) == 1
+    # Con SLA de 0 dias todo lo pendiente esta vencido: 1 Polo y 1 Pantalon por trabajador
+    assert [(row["dni"], row["pending"], row["user"]) for row in sorted(body["overdue"], key=lambda r: r["dni"])] == [
+        (f"{10000000 + i}", 2, f"Nombre{i} Apellido{i}") for i in range(3)]
+    assert client.get("/api/laundry/turnaround").json()["overdue"] == []
+    assert client.get("/api/laundry/turnaround", params={"date_from": "2099-01-01"}).json()["by_item"] == []
+
+def test_turnaround_with_empty_history_and_sends_without_returns(client):
+    body = client.get("/api/laundry/turnaround", params={"sla_days": 0}).json()
+    assert body["by_item"] == body["by_month"] == body["overdue"] == []
+
+    client.post("/api/users", json={"dni": "10000000", "name": "Ana", "surname": "Rojas", "contract_type": "Regular Otro sindicato"})
+    client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 2}]})
+    body = client.get("/api/laundry/turnaround", params={"sla_days": 0}).json()
+    assert body["by_item"] == [] and [(row["dni"], row["pending"]) for row in body["overdue"]] == [("10000000", 2)]
+    with SessionLocal() as db:
+        sends, returns = laundry_turnaround.load_history(db)
+    assert laundry_turnaround.match(sends, returns).empty and laundry_turnaround.match(sends.iloc[:0], returns).empty
@@ -0,0 +1,68 @@
+from datetime import datetime
+import logging
+import os
+import time
+
+from conftest import seed
+import main
+import metrics
+import pdf_actas
+
+def test_metrics_endpoint_reports_routes_sql_and_pdf(client):
+    seed(client, 2)
+    client.get("/api/users/10000000")
+    client.post("/api/users", json={"dni": "46544993", "name": "Andres", "surname": "Bedoya", "contract_type": "Temporal"})
+    client.post("/api/deliveries", json={"dni": "46544993", "items": [{"name": "Candado", "qty": 1}], "date": "2026-03-01T00:00:00"})
+    body = client.get("/metrics").text
+
+    assert 'roperia_http_request_duration_seconds_count{method="GET",route="/api/users/{dni}",status="200"}' in body
+    assert "10000000" not in body  # la etiqueta es la plantilla de la ruta
+    sql_count = next(line for line in body.splitlines()
+                     if line.startswith('roperia_sql_statements_per_request_sum{method="GET",route="/api/users/{dni}"}'))
+    assert float(sql_count.split()[-1]) >= 1
+    assert 'roperia_pdf_generate_seconds_count{result="rendered"}' in body
+    assert 'roperia_pdf_job_seconds_count{outcome="ready"}' in body
+
+def test_slow_request_log_includes_statements(client, monkeypatch, caplog):
+    seed(client, 2)
+    monkeypatch.setattr(metrics, "SLOW_REQUEST_MS", 0.001)
+    with caplog.at_level(logging.WARNING, logger="metrics"):
+        client.get("/api/laundry/report")
+    message = next(r.getMessage() for r in caplog.records if r.name == "metrics")
+    assert "/api/laundry/report" in message and "SELECT" in message
+
+def series(histogram, **labels):
+    """(count, sum) de una serie, para medir diferencias entre tests."""
+    key = tuple(str(labels.get(label, "")) for label in histogram.labels)
+    counts, total, count = histogram._series.get(key, [[], 0.0, 0])
+    return count, total
+
+def test_streamed_export_is_measured_until_the_body_is_sent(client, monkeypatch):
+    seed(client, 4)
+    monkeypatch.setattr(main, "STREAM_CHUNK", 1)
+    _, before = series(metrics.SQL_STATEMENTS, method="GET", route="/api/delivery/report")
+    response = client.get("/api/delivery/report", params={"format": "csv"})
+    assert response.status_code == 200 and len(response.text.splitlines()) == 5
+    _, after = series(metrics.SQL_STATEMENTS, method="GET", route="/api/delivery/report")
+    # Un bloque (y su consulta) por entrega mas el ETag: antes solo se contaba el ETag
+    assert after - before >= 6
+
+def test_pdf_render_is_observed_in_the_parent_with_a_process_pool(client):
+    seed(client, 1)
+    queue = pdf_actas.PdfRenderQueue(workers=1)
+    args = (999, {"dni": "10000000", "name": "Nombre0", "surname": "Apellido0", "contract_type": "Regular Otro sindicato"},
+            [{"name": "Toallas", "qty": 2}], datetime(2026, 3, 1))
+    rendered, _ = series(metrics.PDF_RENDER, result="rendered")
+    cached, _ = series(metrics.PDF_RENDER, result="cached")
+    try:
+        path = queue.render(args).result(timeout=30)
+        assert queue.render(args).result() == path and os.path.exists(path)
+    finally:
+        queue.shutdown()
+    # El callback que observa corre justo despues de despertar a quien espera el resultado
+    for _ in range(100):
+        if series(metrics.PDF_RENDER, result="rendered")[0] == rendered + 1:
+            break
+        time.sleep(0.01)
+    assert series(metrics.PDF_RENDER, result="rendered")[0] == rendered + 1
+    assert series(metrics.PDF_RENDER, result="cached")[0] == cached + 1
@@ -0,0 +1,39 @@
+from datetime import datetime
+import logging
+
+from database import SessionLocal
+import migrations
+import models
+
+LEGACY = {
+    1: '[{"name": "Polo", "qty": 2}, {"name": "Pantalon", "qty": "1"}]',
+    2: "[]",
+    3: "",
+    4: None,
+    5: '[{"name": "Polo", "qty": 2',
+    6: '[{"name": "Polo"}]',
+    7: '{"name": "Polo", "qty": 2}',
+}
+
+def test_backfill_line_items_from_legacy_items_json(client, caplog):
+    date = datetime(2024, 6, 3, 9, 30)
+    with SessionLocal() as db:
+        # Filas como las de la base original: solo items_json, sin detalle
+        for model in (models.Delivery, models.Laundry, models.LaundryReturn):
+            db.execute(model.__table__.insert(), [{"id": parent_id, "dni": f"4000000{parent_id}", "date": date, "items_json": items_json}
+                                                  for parent_id, items_json in LEGACY.items()])
+        db.commit()
+
+        with caplog.at_level(logging.WARNING, logger="migrations"):
+            assert migrations.backfill_line_items(db) == 6
+        # Los ilegibles se saltean avisando, sin cortar la migracion
+        assert sorted(record.getMessage().split(":")[0] for record in caplog.records) == sorted(
+            f"items_json invalido en {table} {parent_id}" for table in ("deliveries", "laundry", "laundry_returns") for parent_id in (5, 6, 7))
+
+        for item_model, fk_name in ((models.DeliveryItem, "delivery_id"), (models.LaundryItem, "laundry_id"), (models.LaundryReturnItem, "return_id")):
+            items = db.query(item_model).order_by(item_model.id).all()
+            assert [(getattr(i, fk_name), i.dni, i.name, i.qty, i.date) for i in items] == [
+                (1, "40000001", "Polo", 2, date), (1, "40000001", "Pantalon", 1, date)]
+
+        # Idempotente: una segunda pasada no duplica nada
+        assert migrations.backfill_line_items(db) == 0
@@ -0,0 +1,59 @@
+import os
+
+import pdf_actas
+
+from conftest import seed
+
+def create_delivery(client, dni="10000000"):
+    response = client.post("/api/deliveries", json={"dni": dni, "items": [{"name": "Toallas", "qty": 2}], "date": "2026-03-01T10:00:00"})
+    assert response.status_code == 200
+    return response.json()["delivery_id"]
+
+def test_missing_acta_is_regenerated_byte_identical(client):
+    seed(client, 1)
+    delivery_id = create_delivery(client)
+    first = client.get(f"/api/deliveries/{delivery_id}/pdf")
+    assert first.status_code == 200 and first.content.startswith(b"%PDF")
+
+    # Redeploy con disco efimero: la cache desaparece
+    for name in os.listdir(pdf_actas.PDF_DIR):
+        if name.endswith(".pdf"):
+            os.remove(os.path.join(pdf_actas.PDF_DIR, name))
+
+    second = client.get(f"/api/deliveries/{delivery_id}/pdf")
+    assert second.status_code == 200
+    assert second.content == first.content
+
+def test_eviction_removes_least_recently_used(client):
+    seed(client, 3)
+    ids = [create_delivery(client, f"1000000{i}") for i in range(3)]
+    for delivery_id in ids:
+        assert client.get(f"/api/deliveries/{delivery_id}/pdf").status_code == 200
+    files = sorted((os.path.getmtime(os.path.join(pdf_actas.PDF_DIR, n)), n) for n in os.listdir(pdf_actas.PDF_DIR) if n.endswith(".pdf"))
+    for age, (_, name) in zip((300, 200, 100), files):
+        path = os.path.join(pdf_actas.PDF_DIR, name)
+        os.utime(path, (os.path.getatime(path) - age, os.path.getmtime(path) - age))
+
+    size = os.path.getsize(os.path.join(pdf_actas.PDF_DIR, files[0][1]))
+    assert pdf_actas.evict_cache(max_bytes=size * 2) == 2
+    remaining = [n for n in os.listdir(pdf_actas.PDF_DIR) if n.endswith(".pdf")]
+    assert remaining == [files[2][1]]
+    # Las actas desalojadas siguen disponibles
+    assert client.get(f"/api/deliveries/{ids[0]}/pdf").status_code == 200
+
+def test_corrupt_logo_falls_back_to_text(client, monkeypatch, tmp_path, caplog):
+    corrupt = tmp_path / "logo.png"
+    corrupt.write_bytes(b"no es una imagen")
+    monkeypatch.setattr(pdf_actas, "LOGO_PATH", str(corrupt))
+    pdf_actas._logo.cache_clear()
+    try:
+        seed(client, 2)
+        for dni in ("10000000", "10000001"):
+            delivery_id = create_delivery(client, dni)
+            response = client.get(f"/api/deliveries/{delivery_id}/pdf")
+            assert response.status_code == 200 and response.content.startswith(b"%PDF")
+        # El fallo queda cacheado: el archivo se intenta leer (y se registra) una sola vez
+        assert [r.getMessage() for r in caplog.records if r.name == "pdf_actas"] == [f"No se pudo cargar el logo {corrupt}"]
+        assert pdf_actas._logo.cache_info().misses == 1
+    finally:
+        pdf_actas._logo.cache_clear()
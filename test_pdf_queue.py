@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import time
+
+import pytest
+
+from conftest import seed
+from database import SessionLocal
+import models
+import pdf_actas
+
+DELIVERY = {"dni": "10000000", "items": [{"name": "Toallas", "qty": 2}], "date": "2026-03-01T10:00:00"}
+
+@pytest.fixture
+def async_queue(monkeypatch):
+    # La cola en modo asincrono (workers > 0) con hilos en vez de procesos, para poder
+    # reemplazar render_acta desde el test
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pdf_actas.pdf_queue, "workers", 1)
+    monkeypatch.setattr(pdf_actas.pdf_queue, "_get_executor", lambda: executor)
+    yield pdf_actas.pdf_queue
+    executor.shutdown(wait=True)
+
+def wait_for_status(delivery_id, status):
+    for _ in range(200):
+        with SessionLocal() as db:
+            delivery = db.get(models.Delivery, delivery_id)
+            if delivery.pdf_status == status:
+                return delivery
+        time.sleep(0.025)
+    raise AssertionError(f"el acta {delivery_id} no llego a {status}")
+
+def test_pending_acta_answers_202_until_rendered(client, async_queue, monkeypatch):
+    seed(client, 1)
+    release = threading.Event()
+    render_acta = pdf_actas.render_acta
+
+    def slow_render(*args):
+        release.wait(5)
+        return render_acta(*args)
+    monkeypatch.setattr(pdf_actas, "render_acta", slow_render)
+
+    created = client.post("/api/deliveries", json=DELIVERY).json()
+    assert created["pdf_status"] == pdf_actas.PDF_PENDING
+    pending = client.get(created["pdf_url"])
+    assert pending.status_code == 202 and pending.headers["Retry-After"] == "1"
+    assert pending.json() == {"delivery_id": created["delivery_id"], "pdf_status": pdf_actas.PDF_PENDING, "pdf_attempts": 1}
+    assert client.get("/api/pdf/status").json()["pending"] == 1
+
+    release.set()
+    wait_for_status(created["delivery_id"], pdf_actas.PDF_READY)
+    ready = client.get(created["pdf_url"])
+    assert ready.status_code == 200 and ready.content.startswith(b"%PDF")
+
+def test_failed_render_is_retried_then_reported_and_resubmitted(client, async_queue, monkeypatch):
+    seed(client, 1)
+    render_acta = pdf_actas.render_acta
+    calls = []
+
+    def failing_render(*args):
+        calls.append(args[0])
+        raise OSError("disco lleno")
+    monkeypatch.setattr(pdf_actas, "render_acta", failing_render)
+
+    delivery_id = client.post("/api/deliveries", json=DELIVERY).json()["delivery_id"]
+    failed = wait_for_status(delivery_id, pdf_actas.PDF_FAILED)
+    assert calls == [delivery_id] * async_queue.max_attempts
+    assert (failed.pdf_attempts, failed.pdf_error) == (async_queue.max_attempts, "OSError: disco lleno")
+    status = client.get("/api/pdf/status").json()
+    assert (status["pending"], status["failed"]) == (0, 1)
+    assert status["failures"] == [{"delivery_id": delivery_id, "dni": "10000000", "attempts": async_queue.max_attempts, "error": "OSError: disco lleno"}]
+
+    # Pedir el acta fallida la reencola; con el render sano termina lista
+    monkeypatch.setattr(pdf_actas, "render_acta", render_acta)
+    assert client.get(f"/api/deliveries/{delivery_id}/pdf").status_code in (200, 202)
+    wait_for_status(delivery_id, pdf_actas.PDF_READY)
+    assert client.get(f"/api/deliveries/{delivery_id}/pdf").content.startswith(b"%PDF")
+    assert client.get("/api/pdf/status").json()["failed"] == 0
+
+def test_orphaned_pending_acta_is_claimed_by_one_worker(client, monkeypatch):
+    seed(client, 1)
+    with SessionLocal() as db:
+        delivery = db.query(models.Delivery).first()
+        delivery.pdf_status, delivery.pdf_claimed_at = pdf_actas.PDF_PENDING, datetime(2026, 1, 1)
+        db.commit()
+        delivery_id = delivery.id
+    renders = []
+    render_acta = pdf_actas.render_acta
+    monkeypatch.setattr(pdf_actas, "render_acta", lambda *args: renders.append(args[0]) or render_acta(*args))
+
+    # Dos workers que arrancan a la vez: solo uno gana el UPDATE condicional
+    workers = [pdf_actas.PdfRenderQueue(workers=0), pdf_actas.PdfRenderQueue(workers=0)]
+    with SessionLocal() as db:
+        assert [worker._claim(db, delivery_id) for worker in workers] == [True, False]
+    # Recien reclamada: ningun worker la reencola hasta que venza el lease
+    for worker in workers:
+        worker.requeue_pending()
+    assert renders == []
+
+    with SessionLocal() as db:
+        db.get(models.Delivery, delivery_id).pdf_claimed_at = datetime(2026, 1, 1)
+        db.commit()
+    for worker in workers:
+        worker.requeue_pending()
+    assert renders == [delivery_id]
+    assert wait_for_status(delivery_id, pdf_actas.PDF_READY).pdf_attempts == 1
+
+def test_requesting_an_orphaned_pending_acta_requeues_it(client):
+    seed(client, 1)
+    with SessionLocal() as db:
+        delivery = db.query(models.Delivery).first()
+        delivery.pdf_status, delivery.pdf_claimed_at = pdf_actas.PDF_PENDING, None
+        db.commit()
+        delivery_id = delivery.id
+    response = client.get(f"/api/deliveries/{delivery_id}/pdf")
+    assert response.status_code == 200 and response.content.startswith(b"%PDF")
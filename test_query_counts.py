@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from conftest import seed
+from database import async_engine, engine
+
+# Limite de sentencias SQL por peticion, independiente del volumen de datos
+MAX_STATEMENTS = 6
+
+@contextmanager
+def count_statements():
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    # Las lecturas async pasan por async_engine; se cuentan ambos
+    engines = (engine, async_engine.sync_engine)
+    for target in engines:
+        event.listen(target, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for target in engines:
+            event.remove(target, "before_cursor_execute", before_cursor_execute)
+
+@pytest.mark.parametrize("path", ["/api/laundry", "/api/laundry/report", "/api/delivery/report", "/api/stats"])
+def test_statement_count_does_not_grow_with_data(client, path):
+    counts = []
+    for start, n_users in ((0, 2), (2, 30)):
+        seed(client, n_users, start)
+        with count_statements() as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        counts.append(len(statements))
+        assert len(statements) <= MAX_STATEMENTS, statements
+    assert counts[0] == counts[1]
+
+def test_reports_include_user_data(client):
+    seed(client, 3)
+    laundry = client.get("/api/laundry").json()
+    assert [row["user_name"] for row in laundry] == ["Nombre0", "Nombre1", "Nombre2"]
+    report = client.get("/api/laundry/report").json()
+    assert {row["user"] for row in report} == {"Nombre0 Apellido0", "Nombre1 Apellido1", "Nombre2 Apellido2"}
+    assert {row["status"] for row in report} == {"Parcial"}
+    deliveries = client.get("/api/delivery/report").json()
+    assert len(deliveries) == 3 and deliveries[0]["contract_type"] == "Regular Otro sindicato"
@@ -0,0 +1,89 @@
+import asyncio
+import csv
+import io
+import json
+
+from conftest import seed
+import main
+
+def fetch_all_pages(client, path, limit, **params):
+    rows, after = [], None
+    while True:
+        response = client.get(path, params={**params, "limit": limit, **({"after": after} if after else {})})
+        assert response.status_code == 200
+        rows += response.json()
+        after = response.headers.get("x-next-cursor")
+        if not after:
+            return rows
+
+def test_keyset_pages_match_full_report(client):
+    seed(client, 30)
+    for path in ("/api/delivery/report", "/api/laundry/report"):
+        full = client.get(path).json()
+        assert len(full) == 30
+        assert [row["id"] for row in fetch_all_pages(client, path, 7)] == [row["id"] for row in full]
+
+def test_delivery_report_date_filters(client):
+    seed(client, 30)
+    assert len(client.get("/api/delivery/report", params={"year": 2025}).json()) == 18
+    assert len(client.get("/api/delivery/report", params={"year": 2026, "month": 3}).json()) == 1
+    assert len(client.get("/api/delivery/report", params={"month": 3}).json()) == 3
+    rows = client.get("/api/delivery/report", params={"date_from": "2025-11-01", "date_to": "2026-01-15"}).json()
+    assert [row["date"][:7] for row in rows] == ["2026-01", "2025-12", "2025-11"]
+    assert fetch_all_pages(client, "/api/delivery/report", 5, year=2026) == client.get("/api/delivery/report", params={"year": 2026}).json()
+
+def test_invalid_cursor_is_rejected(client):
+    assert client.get("/api/delivery/report", params={"after": "nope"}).status_code == 400
+
+def test_streaming_exports_match_json_report(client, monkeypatch):
+    monkeypatch.setattr(main, "STREAM_CHUNK", 7)
+    seed(client, 30)
+    for path in ("/api/delivery/report", "/api/laundry/report"):
+        ids = [str(row["id"]) for row in client.get(path).json()]
+        ndjson = client.get(path, params={"format": "ndjson"})
+        assert ndjson.headers["content-type"] == "application/x-ndjson"
+        assert [str(json.loads(line)["id"]) for line in ndjson.text.splitlines()] == ids
+        rows = list(csv.DictReader(io.StringIO(client.get(path, params={"format": "csv"}).text)))
+        assert [row["id"] for row in rows] == ids
+
+def test_returns_are_allocated_fifo(client):
+    from database import SessionLocal
+    import laundry_allocation
+    seed(client, 1)
+    client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 2}]})
+    client.post("/api/laundry/return", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 2}, {"name": "Pantalon", "qty": 1}]})
+    expected = [(row["items"], row["status"]) for row in client.get("/api/laundry/report").json()]
+    assert expected == [("2 Polo", "Parcial"), ("2 Polo, 1 Pantalon", "Entregado")]
+    with SessionLocal() as db:
+        assert laundry_allocation.backfill_allocations(db) == 4
+    assert [(row["items"], row["status"]) for row in client.get("/api/laundry/report").json()] == expected
+
+def test_repeated_item_in_one_return_is_allocated_across_sends(client):
+    from database import SessionLocal
+    import laundry_allocation
+    import models
+    seed(client, 1)
+    client.post("/api/laundry", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 1}]})
+    client.post("/api/laundry/return", json={"dni": "10000000", "items": [{"name": "Polo", "qty": 1}, {"name": "Polo", "qty": 1}]})
+    expected = [(row["items"], row["status"]) for row in client.get("/api/laundry/report").json()]
+    assert expected == [("1 Polo", "Entregado"), ("2 Polo, 1 Pantalon", "Parcial")]
+    with SessionLocal() as db:
+        assert db.query(models.LaundryAllocation).filter(models.LaundryAllocation.qty <= 0).count() == 0
+        assert sorted(a.qty for a in db.query(models.LaundryAllocation)) == [1, 1, 1]
+        assert laundry_allocation.backfill_allocations(db) == 3
+    assert [(row["items"], row["status"]) for row in client.get("/api/laundry/report").json()] == expected
+
+def test_report_pages_are_built_off_the_event_loop(client, monkeypatch):
+    seed(client, 3)
+    loops = []
+    for name in ("laundry_report_page", "delivery_report_page"):
+        def page(db, *args, build=getattr(main, name)):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return build(db, *args)
+        monkeypatch.setattr(main, name, page)
+    assert len(client.get("/api/laundry/report").json()) == 3
+    assert len(client.get("/api/delivery/report").json()) == 3
+    assert loops == [None, None]
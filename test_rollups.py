@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from conftest import seed
+from database import SessionLocal
+import models
+import rollups
+
+def stored_rollups():
+    with SessionLocal() as db:
+        return {(r.metric, r.period, r.contract_type, r.item_name): r.value for r in db.query(models.Rollup)}
+
+def test_write_endpoints_keep_rollups_equal_to_rebuild(client):
+    seed(client, 4)
+    with SessionLocal() as db:
+        # seed escribe las entregas sin pasar por la API
+        rollups.rebuild_rollups(db)
+    client.post("/api/deliveries", json={"dni": "10000001", "items": [{"name": "Guantes", "qty": 3}], "date": "2026-02-03T10:00:00"})
+    client.post("/api/deliveries/batch", json={"deliveries": [{"dni": "10000002", "items": [{"name": "Guantes", "qty": 1}]}], "date": "2026-02-04T10:00:00"})
+    client.post("/api/laundry/return", json={"dni": "10000003", "items": [{"name": "Pantalon", "qty": 1}]})
+    with SessionLocal() as db:
+        assert stored_rollups() == rollups.compute_rollups(db)
+
+def test_analytics_serves_ranges_from_rollups(client):
+    seed(client, 24)
+    with SessionLocal() as db:
+        rollups.rebuild_rollups(db)
+    response = client.get("/api/analytics", params={"date_from": "2025-03-01", "date_to": "2025-04-30"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["issued_by_month"] == [
+        {"period": "2025-03", "contract_type": "Regular Otro sindicato", "item": "Toallas", "qty": 2},
+        {"period": "2025-04", "contract_type": "Regular Otro sindicato", "item": "Toallas", "qty": 2},
+    ]
+    assert [row["period"] for row in body["deliveries_by_week"]] == [rollups.week_of(datetime(2025, 3, 15)), rollups.week_of(datetime(2025, 4, 15))]
+    assert body["laundry_by_month"] == []
+
+    month = rollups.month_of(datetime.now())
+    laundry = client.get("/api/analytics", params={"date_from": datetime.now().date().isoformat()}).json()["laundry_by_month"]
+    assert laundry == [{"period": month, "item": "Pantalon", "sent": 24, "returned": 0}, {"period": month, "item": "Polo", "sent": 48, "returned": 24}]
+    assert client.get("/api/analytics", params={"contract_type": "Temporal"}).json()["issued_by_month"] == []
+
+    cached = client.get("/api/analytics", params={"date_from": "2025-03-01"}, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 200
+    etag = client.get("/api/analytics").headers["etag"]
+    assert client.get("/api/analytics", headers={"If-None-Match": etag}).status_code == 304
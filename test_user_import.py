@@ -0,0 +1,51 @@
+import io
+
+from openpyxl import Workbook
+
+from database import SessionLocal
+import models
+import user_import
+
+CSV = """dni;nombre;apellido;contrato
+10000001;Ana;Rojas;Temporal
+10000002;;Flores;Temporal
+10000003;Luis;Vargas;Indefinido
+10000004;Rosa;Quispe;Regular PYA
+10000005;Jose;Torres;Regular Otro sindicato
+"""
+
+def upload(client, content, filename):
+    return client.post("/api/users/import", files={"file": (filename, content)})
+
+def test_csv_import_reports_bad_rows_and_saves_the_rest(client):
+    report = upload(client, CSV.encode(), "planilla.csv").json()
+    assert (report["processed"], report["created"], report["updated"], report["error_count"]) == (5, 3, 0, 2)
+    assert [(e["row"], e["dni"], e["error"]) for e in report["errors"]] == [
+        (3, "10000002", "name vacio"), (4, "10000003", "contract_type invalido: 'Indefinido'")]
+    assert client.get("/api/users/10000004").json()["contract_type"] == "Regular PYA"
+
+def test_import_across_chunks_updates_existing_and_inserts_new(client):
+    upload(client, CSV.encode(), "planilla.csv")
+    rows = "dni,name,surname,contract_type\n" + "".join(f"{10000001 + i},Nuevo{i},Apellido,Temporal\n" for i in range(7)) + ",Sin,Dni,Temporal\n"
+    report = user_import.import_users(user_import.iter_rows(io.StringIO(rows), "planilla.csv", chunk_size=3), chunk_size=3)
+    # 10000001, 10000004 y 10000005 ya existian; el error esta en el ultimo bloque (fila 9)
+    assert (report["processed"], report["created"], report["updated"]) == (8, 4, 3)
+    assert [(e["row"], e["error"]) for e in report["errors"]] == [(9, "dni vacio")]
+    with SessionLocal() as db:
+        assert db.query(models.User).count() == 7
+        assert db.query(models.User).filter(models.User.dni == "10000005").one().name == "Nuevo4"
+
+def test_xlsx_import_and_invalid_workbook(client):
+    workbook = Workbook()
+    workbook.active.append(["DNI", "Nombres", "Apellidos", "Tipo de contrato"])
+    workbook.active.append([10000001, "Ana", "Rojas", "Temporal"])
+    workbook.active.append([10000002, "Luis", "Vargas", "Regular PYA"])
+    content = io.BytesIO()
+    workbook.save(content)
+    report = upload(client, content.getvalue(), "planilla.xlsx").json()
+    assert (report["created"], report["error_count"]) == (2, 0)
+    assert client.get("/api/users/10000001").json()["name"] == "Ana"
+
+    response = upload(client, b"dni,name\n1,2\n", "planilla.xlsx")
+    assert response.status_code == 400 and "Excel" in response.json()["detail"]
+    assert upload(client, b"dni;nombre\n1;Ana\n", "planilla.csv").status_code == 400
@@ -0,0 +1,60 @@
+from datetime import datetime
+import io
+
+from sqlalchemy import select
+
+from conftest import seed
+from database import SessionLocal
+import models
+import user_search
+
+def search(client, q):
+    response = client.get("/api/users/search", params={"q": q})
+    assert response.status_code == 200
+    return [user["dni"] for user in response.json()]
+
+def test_search_by_dni_name_and_surname(client):
+    seed(client, 12)
+    client.post("/api/users", json={"dni": "46544993", "name": "Andres", "surname": "Bedoya", "contract_type": "Temporal"})
+    assert search(client, "ndre") == ["46544993"]
+    assert search(client, "BEDOY") == ["46544993"]
+    assert search(client, "544") == ["46544993"]
+    assert search(client, "1000001") == ["10000010", "10000011"]
+    assert search(client, "46") == ["46544993"]  # corto: prefijo de DNI
+    assert client.get("/api/users/46544993").status_code == 200
+
+def test_index_follows_import_upserts(client):
+    client.post("/api/users", json={"dni": "46544993", "name": "Andres", "surname": "Bedoya", "contract_type": "Temporal"})
+    csv = "dni,name,surname,contract_type\n46544993,Andrea,Quispe,Temporal\n"
+    client.post("/api/users/import", files={"file": ("u.csv", io.BytesIO(csv.encode()), "text/csv")})
+    assert search(client, "Quispe") == ["46544993"]
+    assert search(client, "Bedoya") == []
+
+def test_report_dni_filter_uses_substring(client):
+    seed(client, 12)
+    for path in ("/api/delivery/report", "/api/laundry/report"):
+        assert {row["dni"] for row in client.get(path, params={"dni": "1000001"}).json()} == {"10000010", "10000011"}
+        assert len(client.get(path, params={"dni": "1"}).json()) == 12
+
+def test_like_wildcards_are_literal_and_orphan_rows_match_the_dni_filter(client):
+    seed(client, 3)
+    client.post("/api/users", json={"dni": "46544993", "name": "50%_off", "surname": "Bedoya", "contract_type": "Temporal"})
+    assert search(client, "%") == [] and search(client, "_") == []
+    assert search(client, "50") == ["46544993"]
+    assert client.get("/api/laundry/report", params={"dni": "_"}).json() == []
+
+    # Envio de un DNI sin trabajador (p.ej. cargado antes del padron)
+    with SessionLocal() as db:
+        db.add(models.Laundry(dni="77700001", date=datetime(2026, 1, 5), items_json="[]",
+                              items=[models.LaundryItem(dni="77700001", name="Polo", qty=1, date=datetime(2026, 1, 5))]))
+        db.commit()
+    rows = client.get("/api/laundry/report", params={"dni": "777"}).json()
+    assert [(row["dni"], row["user"]) for row in rows] == [("77700001", "Desconocido")]
+    assert [(row["dni"], row["user"]) for row in client.get("/api/laundry/report", params={"dni": "77"}).json()] == [("77700001", "Desconocido")]
+
+    # Al darlo de alta deja de ser huerfano y el filtro lo encuentra por users_fts
+    client.post("/api/users", json={"dni": "77700001", "name": "Luis", "surname": "Rojas", "contract_type": "Temporal"})
+    with SessionLocal() as db:
+        assert db.execute(select(user_search.orphan_dnis.c.dni).where(user_search.orphan_dnis.c.dni == "77700001")).all() == []
+    rows = client.get("/api/laundry/report", params={"dni": "777"}).json()
+    assert [(row["dni"], row["user"]) for row in rows] == [("77700001", "Luis Rojas")]
@@ -0,0 +1,186 @@
+import argparse
+import csv
+import json
+import os
+import zipfile
+from functools import partial
+
+import pandas as pd
+from sqlalchemy.dialects.sqlite import insert
+
+from contracts import CONTRACT_TYPES
+import change_log
+import data_version
+from database import engine, run_write
+import models
+
+# Importacion masiva de trabajadores desde CSV o Excel. El archivo se lee por bloques y
+# cada bloque se guarda con un upsert (executemany) en su propia transaccion, de modo que
+# la memoria no depende del tamaño del archivo y una fila mala no aborta el resto.
+#   python user_import.py planilla.xlsx
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Nombres de columna aceptados (en minusculas) para cada campo
+COLUMN_ALIASES = {
+    "dni": ("dni", "documento"),
+    "name": ("name", "nombre", "nombres"),
+    "surname": ("surname", "apellido", "apellidos"),
+    "contract_type": ("contract_type", "contrato", "tipo_contrato", "tipo de contrato"),
+}
+
+def _column_map(header):
+    normalized = {str(col).strip().lower(): col for col in header if col is not None}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[field] = normalized[alias]
+                break
+    missing = [field for field in COLUMN_ALIASES if field not in mapping]
+    if missing:
+        raise ValueError(f"Faltan columnas: {', '.join(missing)}")
+    return mapping
+
+def _iter_csv(fileobj, chunk_size):
+    sample = fileobj.read(4096)
+    fileobj.seek(0)
+    if isinstance(sample, bytes):
+        sample = sample.decode("utf-8-sig", errors="replace")
+    try:
+        sep = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except csv.Error:
+        sep = ","
+    reader = pd.read_csv(fileobj, sep=sep, dtype=str, keep_default_na=False, encoding="utf-8-sig", chunksize=chunk_size)
+    mapping = None
+    for chunk in reader:
+        if mapping is None:
+            mapping = _column_map(chunk.columns)
+        columns = [mapping[field] for field in COLUMN_ALIASES]
+        for values in chunk[columns].itertuples(index=False, name=None):
+            yield dict(zip(COLUMN_ALIASES, values))
+
+def _iter_xlsx(fileobj):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ValueError("Para importar Excel se necesita openpyxl (pip install openpyxl)")
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError(f"Archivo Excel invalido: {e}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        mapping = _column_map(header)
+        positions = {field: list(header).index(col) for field, col in mapping.items()}
+        for values in rows:
+            yield {field: values[pos] if pos < len(values) else None for field, pos in positions.items()}
+    finally:
+        workbook.close()
+
+def iter_rows(fileobj, filename, chunk_size=CHUNK_SIZE):
+    """Filas del archivo como dicts {dni, name, surname, contract_type}, sin cargarlo entero."""
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return _iter_xlsx(fileobj)
+    if ext in ("", ".csv", ".txt"):
+        return _iter_csv(fileobj, chunk_size)
+    raise ValueError(f"Formato no soportado: {ext}")
+
+def _clean(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel guarda los DNI como numeros
+    return str(value).strip()
+
+def validate_row(row):
+    """Devuelve (fila_normalizada, error)."""
+    user = {field: _clean(row.get(field)) for field in COLUMN_ALIASES}
+    for field in COLUMN_ALIASES:
+        if not user[field]:
+            return None, f"{field} vacio"
+    if user["contract_type"] not in CONTRACT_TYPES:
+        return None, f"contract_type invalido: {user['contract_type']!r}"
+    return user, None
+
+def _upsert(db, users):
+    """Inserta o actualiza un bloque (dentro de run_write). Devuelve (creados, actualizados)."""
+    dnis = {u["dni"] for u in users}
+    existing = {dni for (dni,) in db.query(models.User.dni).filter(models.User.dni.in_(dnis))}
+    table = models.User.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.dni],
+        set_={"name": stmt.excluded.name, "surname": stmt.excluded.surname, "contract_type": stmt.excluded.contract_type},
+    )
+    db.execute(stmt, users)
+    change_log.record(db, *(change_log.event(change_log.USER, u["dni"], payload=u) for u in users))
+    data_version.bump(db, data_version.STATS, data_version.USERS)
+    return len(dnis - existing), len(dnis & existing)
+
+def import_users(rows, chunk_size=CHUNK_SIZE):
+    report = {"processed": 0, "created": 0, "updated": 0, "error_count": 0, "errors": []}
+
+    def error(line, dni, message):
+        report["error_count"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": line, "dni": dni, "error": message})
+
+    def flush(chunk):
+        try:
+            # Un bloque por transaccion de escritura: si falla, solo se pierde ese bloque
+            created, updated = run_write(partial(_upsert, users=[user for _, user in chunk]))
+        except Exception as e:
+            for line, user in chunk:
+                error(line, user["dni"], f"error al guardar: {e}")
+            return
+        report["created"] += created
+        report["updated"] += updated
+
+    chunk = []
+    rows = iter(rows)
+    line = 1  # la fila 1 es la cabecera
+    while True:
+        line += 1
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        except ValueError as e:
+            if not report["processed"]:
+                raise  # cabecera invalida o archivo ilegible
+            # El archivo se corta a mitad: lo ya guardado queda guardado
+            error(line, None, str(e))
+            break
+        report["processed"] += 1
+        user, message = validate_row(row)
+        if message:
+            error(line, _clean(row.get("dni")) or None, message)
+            continue
+        chunk.append((line, user))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa trabajadores desde un CSV o Excel (upsert por DNI).")
+    parser.add_argument("path")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    with open(args.path, "rb") as f:
+        report = import_users(iter_rows(f, args.path, args.chunk_size), args.chunk_size)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
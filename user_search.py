@@ -0,0 +1,112 @@
+from sqlalchemy import column, func, or_, select, table, text, union_all
+
+import models
+
+# Busqueda de trabajadores por DNI, nombre o apellido con un indice FTS5 trigram (busca
+# subcadenas, no solo prefijos). users_fts es una tabla de contenido externo sobre users: solo
+# guarda el indice y los triggers la mantienen al dia con cada alta, cambio o upsert.
+# Trigram necesita al menos 3 caracteres; para consultas mas cortas se busca por prefijo.
+# El filtro dni de los reportes resuelve la subcadena en users_fts y filtra con dni IN (...), asi
+# SQLite busca en los indices dni de deliveries y laundry en vez de recorrer las tablas. Los DNI
+# con envios pero sin trabajador (p.ej. cargados antes del padron) se guardan en orphan_dnis, con
+# su propio indice trigram; los triggers la mantienen: se agrega al registrar un envio de un DNI
+# desconocido y se quita cuando ese DNI se da de alta.
+
+MIN_TRIGRAM = 3
+
+users_fts = table("users_fts", column("rowid"), column("users_fts"), column("rank"))
+orphan_dnis = table("orphan_dnis", column("id"), column("dni"))
+orphan_dnis_fts = table("orphan_dnis_fts", column("rowid"), column("orphan_dnis_fts"))
+
+_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(dni, name, surname, content='users', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ai AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts(rowid, dni, name, surname) VALUES (new.id, new.dni, new.name, new.surname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_ad AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, dni, name, surname) VALUES ('delete', old.id, old.dni, old.name, old.surname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_au AFTER UPDATE ON users BEGIN
+        INSERT INTO users_fts(users_fts, rowid, dni, name, surname) VALUES ('delete', old.id, old.dni, old.name, old.surname);
+        INSERT INTO users_fts(rowid, dni, name, surname) VALUES (new.id, new.dni, new.name, new.surname);
+    END""",
+)
+
+_ORPHAN_DDL = (
+    "CREATE TABLE IF NOT EXISTS orphan_dnis (id INTEGER PRIMARY KEY, dni TEXT NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS orphan_dnis_fts USING fts5(dni, content='orphan_dnis', content_rowid='id', tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_ai AFTER INSERT ON orphan_dnis BEGIN
+        INSERT INTO orphan_dnis_fts(rowid, dni) VALUES (new.id, new.dni);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_ad AFTER DELETE ON orphan_dnis BEGIN
+        INSERT INTO orphan_dnis_fts(orphan_dnis_fts, rowid, dni) VALUES ('delete', old.id, old.dni);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_laundry_ai AFTER INSERT ON laundry
+        WHEN NOT EXISTS (SELECT 1 FROM users WHERE dni = new.dni) BEGIN
+        INSERT OR IGNORE INTO orphan_dnis(dni) VALUES (new.dni);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_users_ai AFTER INSERT ON users BEGIN
+        DELETE FROM orphan_dnis WHERE dni = new.dni;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_users_au AFTER UPDATE OF dni ON users BEGIN
+        DELETE FROM orphan_dnis WHERE dni = new.dni;
+        INSERT OR IGNORE INTO orphan_dnis(dni) SELECT old.dni WHERE old.dni IS NOT new.dni;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS orphan_dnis_users_ad AFTER DELETE ON users BEGIN
+        INSERT OR IGNORE INTO orphan_dnis(dni) VALUES (old.dni);
+    END""",
+)
+
+def ensure_index(db):
+    """Crea los indices y sus triggers; reconstruye users_fts si no cubre las mismas filas que
+    users y carga orphan_dnis la primera vez."""
+    created = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'orphan_dnis'")).first() is None
+    for statement in _DDL + _ORPHAN_DDL:
+        db.execute(text(statement))
+    if created:
+        for source in (models.Laundry, models.ArchivedLaundry):
+            unknown = select(source.dni).distinct().where(~select(models.User.id).where(models.User.dni == source.dni).exists())
+            db.execute(orphan_dnis.insert().prefix_with("OR IGNORE").from_select(["dni"], unknown))
+    indexed = db.execute(text("SELECT count(*), max(id) FROM users_fts_docsize")).one()
+    expected = db.query(func.count(models.User.id), func.max(models.User.id)).one()
+    if tuple(indexed) != tuple(expected):
+        db.execute(text("INSERT INTO users_fts(users_fts) VALUES ('rebuild')"))
+    db.commit()
+
+def _phrase(q, column_name=None):
+    phrase = '"' + q.replace('"', '""') + '"'
+    return f"{column_name} : {phrase}" if column_name else phrase
+
+def escape_like(q):
+    """`q` literal dentro de un patron LIKE ... ESCAPE '\\' (sin comodines % ni _)."""
+    return q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_query(q, limit=20):
+    """Trabajadores cuyo DNI, nombre o apellido contiene `q`, los mas relevantes primero."""
+    q = q.strip()
+    if len(q) >= MIN_TRIGRAM:
+        matches = select(users_fts.c.rowid, users_fts.c.rank).where(users_fts.c.users_fts.op("MATCH")(_phrase(q))).subquery()
+        return (select(models.User).join(matches, matches.c.rowid == models.User.id)
+                .order_by(matches.c.rank, models.User.id).limit(limit))
+    # DNI por rango sobre el indice unico; nombres por prefijo (se corta en `limit`)
+    prefix = escape_like(q) + "%"
+    return (select(models.User)
+            .where(or_(models.User.dni.between(q, q + "\uffff"), models.User.name.like(prefix, escape="\\"),
+                       models.User.surname.like(prefix, escape="\\")))
+            .order_by(models.User.dni).limit(limit))
+
+def dni_subquery(q):
+    """DNIs (con o sin trabajador) que contienen `q`, para filtrar reportes con dni IN (...)."""
+    if len(q) >= MIN_TRIGRAM:
+        user_rowids = select(users_fts.c.rowid).where(users_fts.c.users_fts.op("MATCH")(_phrase(q, "dni")))
+        orphan_rowids = select(orphan_dnis_fts.c.rowid).where(orphan_dnis_fts.c.orphan_dnis_fts.op("MATCH")(_phrase(q)))
+        return union_all(select(models.User.dni).where(models.User.id.in_(user_rowids)),
+                         select(orphan_dnis.c.dni).where(orphan_dnis.c.id.in_(orphan_rowids)))
+    # Menos de 3 caracteres: LIKE sobre users y orphan_dnis, que son chicas
+    pattern = f"%{escape_like(q)}%"
+    return union_all(select(models.User.dni).where(models.User.dni.like(pattern, escape="\\")),
+                     select(orphan_dnis.c.dni).where(orphan_dnis.c.dni.like(pattern, escape="\\")))
+
+def dni_filter(dni_column, q):
+    """Condicion de reporte: el DNI de la fila contiene `q`, resuelto sobre los indices."""
+    return dni_column.in_(dni_subquery(q))